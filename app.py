@@ -1,5 +1,9 @@
+import atexit
 import os
 import re
+import shutil
+import tempfile
+import time
 import gradio as gr
 from dotenv import load_dotenv
 
@@ -8,10 +12,9 @@ from research_agent.prompts import Prompts
 from research_agent.tools import AITools
 from research_agent.rag_pipeline import RAGPipeline
 from research_agent.agent import ResearchAgent
-from research_agent.export import export_to_pdf
-
-# Load environment variables from .env file
-load_dotenv()
+from research_agent.export import EXPORT_FORMATS, ExportError, export_service, prune_download_dirs
+from research_agent.jobs import JobScheduler
+from research_agent import tracing
 
 # --- CSS for a professional, ChatGPT-inspired look ---
 CSS = """
@@ -35,11 +38,23 @@ footer { display: none !important; }
 
 # --- Global Variables ---
 agent_instance: ResearchAgent = None
-IS_PROCESSING = False # Lock to prevent concurrent runs
+job_scheduler: JobScheduler = None
+ACTIVE_JOBS = {} # Gradio session hash -> id of the report job it is following
+EXPORT_DOWNLOADS_DIR: str = None # Created on the first export, removed at exit
+STARTUP_TIMINGS = {} # Cold-start and first-report latency, in seconds
+EXPORT_FORMAT_LABELS = {"PDF": "pdf", "HTML": "html", "Word (DOCX)": "docx", "Markdown bundle": "md"}
+
+def downloads_dir() -> str:
+    """The temp directory holding per-download export copies."""
+    global EXPORT_DOWNLOADS_DIR
+    if EXPORT_DOWNLOADS_DIR is None:
+        EXPORT_DOWNLOADS_DIR = tempfile.mkdtemp(prefix="report-exports-")
+        atexit.register(shutil.rmtree, EXPORT_DOWNLOADS_DIR, ignore_errors=True)
+    return EXPORT_DOWNLOADS_DIR
 
 def initialize_agent():
     """Initialize all components of the research agent from environment variables."""
-    global agent_instance
+    global agent_instance, job_scheduler
     google_key = os.environ.get("GOOGLE_API_KEY")
     tavily_key = os.environ.get("TAVILY_API_KEY")
 
@@ -52,103 +67,196 @@ def initialize_agent():
         api_keys = {"google": google_key, "tavily": tavily_key}
         tools = AITools(config=config, api_keys=api_keys)
         rag_pipeline = RAGPipeline(config=config)
+        if config.WARM_UP_MODELS:
+            rag_pipeline.warm_up(background=True)
+        # One agent serves every session: runs keep their state locally and share the models and caches.
         agent_instance = ResearchAgent(config=config, tools=tools, rag=rag_pipeline, prompts=prompts)
+        job_scheduler = JobScheduler(max_workers=config.MAX_CONCURRENT_REPORTS)
+        if config.METRICS_PORT:
+            tracing.metrics.serve(config.METRICS_PORT)
+            print(f"-> Serving Prometheus metrics on :{config.METRICS_PORT}/metrics")
         print("✅ Agent initialized successfully.")
         return True
     except Exception as e:
         print(f"🔴 Failed to initialize agent. Error: {str(e)}")
         return False
 
-agent_initialized = initialize_agent()
-
 # --- Gradio Application Logic ---
-with gr.Blocks(css=CSS, theme=gr.themes.Base()) as app:
-    gr.Markdown("<h1>Mini DeepSearch Agent</h1>")
-    gr.Markdown("<p class='sub-header'>Your AI partner for in-depth research and analysis.</p>")
-
-    if not agent_initialized:
-        gr.Markdown("## 🔴 Agent Initialization Failed!")
-        gr.Markdown("Please ensure `GOOGLE_API_KEY` and `TAVILY_API_KEY` are set in your environment and restart.")
-    else:
-        # State variables
-        agent_state = gr.State("INITIAL")
-        initial_topic_state = gr.State("")
-        final_report_md = gr.State("")
-        report_topic = gr.State("")
-
-        # UI Components
-        chatbot = gr.Chatbot(elem_id="chatbot", bubble_full_width=False, height=650, value=[(None, "Agent initialized. Please enter your research topic to begin.")])
-        with gr.Row(elem_id="chat-input-container"):
-            chat_input = gr.Textbox(placeholder="What would you like to research?", interactive=True, visible=True, show_label=False, scale=8)
-            submit_button = gr.Button("Submit", elem_id="submit-button", visible=True, scale=1)
+def build_app(agent_initialized: bool) -> gr.Blocks:
+    """Builds the chat UI. Nothing is launched until main()."""
+    with gr.Blocks(css=CSS, theme=gr.themes.Base()) as app:
+        gr.Markdown("<h1>Mini DeepSearch Agent</h1>")
+        gr.Markdown("<p class='sub-header'>Your AI partner for in-depth research and analysis.</p>")
+
+        if not agent_initialized:
+            gr.Markdown("## 🔴 Agent Initialization Failed!")
+            gr.Markdown("Please ensure `GOOGLE_API_KEY` and `TAVILY_API_KEY` are set in your environment and restart.")
+        else:
+            # State variables
+            agent_state = gr.State("INITIAL")
+            initial_topic_state = gr.State("")
+            final_report_md = gr.State("")
+            report_topic = gr.State("")
+
+            # UI Components
+            chatbot = gr.Chatbot(elem_id="chatbot", bubble_full_width=False, height=650, value=[(None, "Agent initialized. Please enter your research topic to begin.")])
+            with gr.Row(elem_id="chat-input-container"):
+                chat_input = gr.Textbox(placeholder="What would you like to research?", interactive=True, visible=True, show_label=False, scale=8)
+                submit_button = gr.Button("Submit", elem_id="submit-button", visible=True, scale=1)
         
-        with gr.Row():
-            pdf_button = gr.Button("Download Report as PDF", visible=False)
-            pdf_file = gr.File(label="Download PDF", visible=False)
-
-        # --- Chat Logic ---
-        def chat_step_wrapper(user_input, history, current_agent_state, topic_state):
-            global IS_PROCESSING
-            if IS_PROCESSING:
-                # Prevent multiple requests from running at once.
-                # Yielding from an empty list exits the generator cleanly.
-                yield from []
-                return
-
-            IS_PROCESSING = True
-            # This is the first update to the UI. It now yields 8 values, matching the outputs.
-            # The two empty strings are for the final_report_md and report_topic states.
-            yield history, current_agent_state, topic_state, gr.update(interactive=False), "", "", gr.update(visible=False), gr.update(visible=False)
+            with gr.Accordion("Resume a saved run", open=False, elem_classes="accordion"):
+                with gr.Row():
+                    run_id_input = gr.Textbox(label="Run ID", scale=3)
+                    section_input = gr.Number(label="Section to regenerate (blank = resume)", precision=0, scale=2)
+                    refresh_research_input = gr.Checkbox(label="Redo its research", scale=1)
+                resume_button = gr.Button("Resume / Regenerate")
+
+            with gr.Row():
+                cancel_button = gr.Button("Cancel Report")
+                export_format = gr.Dropdown(list(EXPORT_FORMAT_LABELS), value="PDF", label="Export format", scale=1)
+                pdf_button = gr.Button("Download Report", visible=False)
+                pdf_file = gr.File(label="Download", visible=False)
+
+            # --- Chat Logic ---
+            def chat_step_wrapper(user_input, history, current_agent_state, topic_state, request: gr.Request):
+                # This is the first update to the UI. It now yields 8 values, matching the outputs.
+                # The two empty strings are for the final_report_md and report_topic states.
+                yield history, current_agent_state, topic_state, gr.update(interactive=False), "", "", gr.update(visible=False), gr.update(visible=False)
             
-            try:
-                yield from chat_step(user_input, history, current_agent_state, topic_state)
-            except Exception as e:
-                error_message = f"An error occurred: {str(e)}"
-                history.append((user_input, error_message))
-                yield history, "INITIAL", "", gr.update(interactive=True, placeholder="Let's try again."), None, None, gr.update(visible=False), gr.update(visible=False)
-            finally:
-                IS_PROCESSING = False
-
-        def chat_step(user_input, history, current_agent_state, topic_state):
-            history = history or []
-            history.append((user_input, None))
-            # This first yield now includes the correct number of values.
-            yield history, current_agent_state, topic_state, gr.update(interactive=False, placeholder="Thinking..."), "", "", gr.update(visible=False), gr.update(visible=False)
-
-            if current_agent_state == "INITIAL":
-                questions = agent_instance.get_clarifying_questions(user_input)
-                history[-1] = (user_input, "To give you the best report, could you answer these questions for me?\n\n" + questions)
-                yield history, "CLARIFYING", user_input, gr.update(interactive=True, placeholder="Provide your answers..."), "", "", gr.update(visible=False), gr.update(visible=False)
-
-            elif current_agent_state == "CLARIFYING":
-                report_generator = agent_instance.run(user_request=topic_state, user_answers=user_input)
+                try:
+                    yield from chat_step(user_input, history, current_agent_state, topic_state, request.session_hash)
+                except Exception as e:
+                    error_message = f"An error occurred: {str(e)}"
+                    history.append((user_input, error_message))
+                    yield history, "INITIAL", "", gr.update(interactive=True, placeholder="Let's try again."), None, None, gr.update(visible=False), gr.update(visible=False)
+
+            def chat_step(user_input, history, current_agent_state, topic_state, session_id):
+                history = history or []
+                history.append((user_input, None))
+                # This first yield now includes the correct number of values.
+                yield history, current_agent_state, topic_state, gr.update(interactive=False, placeholder="Thinking..."), "", "", gr.update(visible=False), gr.update(visible=False)
+
+                if current_agent_state == "INITIAL":
+                    questions = agent_instance.get_clarifying_questions(user_input)
+                    history[-1] = (user_input, "To give you the best report, could you answer these questions for me?\n\n" + questions)
+                    yield history, "CLARIFYING", user_input, gr.update(interactive=True, placeholder="Provide your answers..."), "", "", gr.update(visible=False), gr.update(visible=False)
+
+                elif current_agent_state == "CLARIFYING":
+                    yield from follow_report(lambda: agent_instance.run(user_request=topic_state, user_answers=user_input), user_input, history, topic_state, session_id)
+
+            def follow_report(make_stream, user_input, history, topic_state, session_id):
+                # The report runs on the shared worker pool; this session only follows its own job.
+                job = job_scheduler.submit(make_stream)
+                ACTIVE_JOBS[session_id] = job.id
                 stream_content = ""
-                for update in report_generator:
-                    stream_content = update
-                    history[-1] = (user_input, stream_content)
-                    # The report topic state is now correctly passed as topic_state
-                    yield history, "GENERATING", topic_state, gr.update(interactive=False), stream_content, topic_state, gr.update(visible=False), gr.update(visible=False)
+                # Token streaming produces far more updates than the browser needs; cap re-renders per second.
+                min_frame_interval = 1.0 / agent_instance.config.UI_STREAM_FPS
+                last_render, pending = 0.0, False
+                try:
+                    # Polling at the frame interval means a skipped update is shown once the stream pauses.
+                    for kind, payload in job_scheduler.stream(job.id, poll_interval=min_frame_interval):
+                        if kind == "queued":
+                            history[-1] = (user_input, f"⏳ Your report is queued (position {payload}). It will start as soon as a worker is free.")
+                            yield history, "GENERATING", topic_state, gr.update(interactive=False), "", topic_state, gr.update(visible=False), gr.update(visible=False)
+                        elif kind in ("update", "idle"):
+                            if kind == "update":
+                                stream_content, pending = payload, True
+                                history[-1] = (user_input, stream_content)
+                            now = time.monotonic()
+                            if not pending or now - last_render < min_frame_interval:
+                                continue
+                            last_render, pending = now, False
+                            # The report topic state is now correctly passed as topic_state
+                            yield history, "GENERATING", topic_state, gr.update(interactive=False), stream_content, topic_state, gr.update(visible=False), gr.update(visible=False)
+                        elif kind == "failed":
+                            raise RuntimeError(payload)
+                        elif kind == "cancelled":
+                            history[-1] = (user_input, stream_content + "\n\n---\n**Report generation cancelled.**")
+                            yield history, "INITIAL", "", gr.update(interactive=True, placeholder="Report cancelled. What's next?"), "", "", gr.update(visible=False), gr.update(visible=False)
+                            return
+                finally:
+                    ACTIVE_JOBS.pop(session_id, None)
+
+                report_seconds = job.finished_at - job.started_at
+                if "first_report" not in STARTUP_TIMINGS:
+                    STARTUP_TIMINGS["first_report"] = report_seconds
+                    model_loads = ", ".join(f"{kind} {seconds:.2f}s" for kind, _, seconds in agent_instance.rag.registry.load_times())
+                    print(f"-> First report completed in {report_seconds:.2f}s (model loads: {model_loads or 'none'})")
+                else:
+                    print(f"-> Report completed in {report_seconds:.2f}s")
                 
                 yield history, "INITIAL", "", gr.update(interactive=True, placeholder="Research complete. What's next?"), stream_content, topic_state, gr.update(visible=True), gr.update(visible=False)
+
+            def resume_step(run_id, section_number, refresh_research, history, request: gr.Request):
+                run_id = (run_id or "").strip()
+                history = history or []
+                try:
+                    checkpoint = agent_instance.load_run(run_id)
+                    if section_number:
+                        if not 1 <= section_number <= len(checkpoint.get("sections") or []):
+                            raise ValueError(f"Run {run_id} has no section {int(section_number)}.")
+                        label = f"Regenerate section {int(section_number)} of run {run_id}"
+                        make_stream = lambda: agent_instance.regenerate_section(run_id, int(section_number) - 1, refresh_research)
+                    else:
+                        label = f"Resume run {run_id}"
+                        make_stream = lambda: agent_instance.resume(run_id)
+                except ValueError as e:
+                    gr.Warning(str(e))
+                    return
+                history.append((label, None))
+                try:
+                    yield from follow_report(make_stream, label, history, checkpoint.get("user_request"), request.session_hash)
+                except Exception as e:
+                    history[-1] = (label, f"An error occurred: {str(e)}")
+                    yield history, "INITIAL", "", gr.update(interactive=True), None, None, gr.update(visible=False), gr.update(visible=False)
+
+            def cancel_report(request: gr.Request):
+                job_id = ACTIVE_JOBS.get(request.session_hash)
+                if job_id and job_scheduler.cancel(job_id):
+                    gr.Info("Cancelling report...")
         
-        def export_report_to_pdf(markdown_content, topic):
-            if not markdown_content or not topic: 
-                gr.Warning("Cannot export an empty report.")
-                return gr.update(visible=False)
+            async def export_report(markdown_content, topic, format_label):
+                if not markdown_content or not topic: 
+                    gr.Warning("Cannot export an empty report.")
+                    return gr.update(visible=False)
             
-            cleaned_topic = re.sub(r'[^\w\s-]', '', topic).strip()
-            cleaned_topic = re.sub(r'[-\s]+', '_', cleaned_topic)
-            pdf_filename = f"{cleaned_topic}_Report.pdf"
-            success = export_to_pdf(markdown_content, pdf_filename)
-            if success:
-                return gr.update(value=pdf_filename, visible=True)
-            else:
-                gr.Warning("Failed to create PDF. Is Pandoc installed on your system?")
-                return gr.update(visible=False)
-
-        # --- Event Listeners ---
-        chat_input.submit(chat_step_wrapper, [chat_input, chatbot, agent_state, initial_topic_state], [chatbot, agent_state, initial_topic_state, chat_input, final_report_md, report_topic, pdf_button, pdf_file]).then(lambda: gr.update(value=""), None, [chat_input], queue=False)
-        submit_button.click(chat_step_wrapper, [chat_input, chatbot, agent_state, initial_topic_state], [chatbot, agent_state, initial_topic_state, chat_input, final_report_md, report_topic, pdf_button, pdf_file]).then(lambda: gr.update(value=""), None, [chat_input], queue=False)
-        pdf_button.click(export_report_to_pdf, [final_report_md, report_topic], [pdf_file])
-
-app.launch(debug=True, share=True) 
\ No newline at end of file
+                cleaned_topic = re.sub(r'[^\w\s-]', '', topic).strip()
+                cleaned_topic = re.sub(r'[-\s]+', '_', cleaned_topic)
+                fmt = EXPORT_FORMAT_LABELS[format_label]
+                # Each download gets its own directory, so two users exporting the same topic never share a file.
+                prune_download_dirs(downloads_dir(), AgentConfig.EXPORT_DOWNLOAD_TTL_SECONDS)
+                output_path = os.path.join(tempfile.mkdtemp(prefix="report-", dir=downloads_dir()), f"{cleaned_topic}_Report.{EXPORT_FORMATS[fmt]['extension']}")
+                try:
+                    result = await export_service.aexport(markdown_content, fmt, output_path, options={"title": topic} if fmt == "html" else None)
+                except ExportError as e:
+                    print(f"🔴 Export failed: {e}")
+                    gr.Warning(f"Failed to create the {format_label} export. {str(e).splitlines()[0]}")
+                    return gr.update(visible=False)
+                print(f"-> Export ready in {result['wall_seconds']:.2f}s ({'cached' if result['cached'] else 'rendered'} {fmt})")
+                return gr.update(value=result["path"], visible=True)
+
+            # --- Event Listeners ---
+            chat_input.submit(chat_step_wrapper, [chat_input, chatbot, agent_state, initial_topic_state], [chatbot, agent_state, initial_topic_state, chat_input, final_report_md, report_topic, pdf_button, pdf_file]).then(lambda: gr.update(value=""), None, [chat_input], queue=False)
+            submit_button.click(chat_step_wrapper, [chat_input, chatbot, agent_state, initial_topic_state], [chatbot, agent_state, initial_topic_state, chat_input, final_report_md, report_topic, pdf_button, pdf_file]).then(lambda: gr.update(value=""), None, [chat_input], queue=False)
+            pdf_button.click(export_report, [final_report_md, report_topic, export_format], [pdf_file])
+            resume_button.click(resume_step, [run_id_input, section_input, refresh_research_input, chatbot], [chatbot, agent_state, initial_topic_state, chat_input, final_report_md, report_topic, pdf_button, pdf_file])
+            cancel_button.click(cancel_report, None, None, queue=False)
+
+    return app
+
+def main():
+    started = time.perf_counter()
+    # Load environment variables from .env file
+    load_dotenv()
+    agent_initialized = initialize_agent()
+    app = build_app(agent_initialized)
+    STARTUP_TIMINGS["cold_start"] = time.perf_counter() - started
+    print(f"-> Cold start: UI ready in {STARTUP_TIMINGS['cold_start']:.2f}s")
+
+    # Concurrency is bounded by the job scheduler, so Gradio must not serialise the chat events itself.
+    app.queue(default_concurrency_limit=None)
+    app.launch(debug=True, share=True)
+
+if __name__ == "__main__":
+    main()
+ 
\ No newline at end of file
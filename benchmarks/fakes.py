@@ -0,0 +1,139 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from research_agent import tracing
+from research_agent.config import AgentConfig
+from research_agent.models import ModelRegistry
+from research_agent.search import AsyncSearcher, FakeSearchProvider
+from research_agent.tools import AITools
+
+WORDS = ("market growth policy energy battery supply chain research data model network climate water farm city "
+         "health vaccine trial patient revenue cost price investment risk regulation technology software hardware "
+         "chip factory export import labour wage inflation survey study report analysis trend forecast region").split()
+
+def _rng(*parts: Any) -> random.Random:
+    return random.Random(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest())
+
+def synthetic_page(seed: str, paragraphs: int = 12) -> str:
+    """Deterministic page text with some navigation noise, for the ingestion and RAG stages."""
+    rng = _rng(seed)
+    lines = ["Home", "About us", "Accept all cookies"]
+    for _ in range(paragraphs):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "." for _ in range(rng.randint(3, 6))]
+        lines.append(" ".join(sentences))
+    return "\n".join(lines + ["All rights reserved."])
+
+class SyntheticSearchProvider(FakeSearchProvider):
+    """FakeSearchProvider whose synthetic results carry full raw page content."""
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        results = await super().search(query, num_results)
+        return [dict(r, raw_content=r.get('raw_content') or synthetic_page(r['url'])) for r in results]
+
+class FakeAITools(AITools):
+    """Deterministic stand-in for AITools: canned or synthetic LLM responses and search results with set latencies.
+
+    `recorded` maps sha256(prompt) to a response and takes precedence over the synthetic ones.
+    Every LLM call is logged in `calls` with its kind and prompt size.
+    """
+    def __init__(self, config: AgentConfig, num_sections: int = 6, llm_latency: float = 0.0, stream_chunk_latency: float = 0.0,
+                 search_latency: float = 0.0, recorded: Optional[Dict[str, str]] = None):
+        self.config = config
+        self.num_sections = num_sections
+        self.llm_latency = llm_latency
+        self.stream_chunk_latency = stream_chunk_latency
+        self.recorded = recorded or {}
+        self.searcher = AsyncSearcher(SyntheticSearchProvider(latency=search_latency), config)
+        self.llm_cache = None
+        self.calls: List[Dict[str, Any]] = []
+        self._calls_lock = threading.Lock()
+
+    @classmethod
+    def from_recording(cls, path: str, config: AgentConfig, **kwargs) -> "FakeAITools":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(config, recorded=json.load(f), **kwargs)
+
+    def _respond(self, prompt: str, kind: str) -> str:
+        with self._calls_lock:
+            self.calls.append({"kind": kind, "writer": "Source [" in prompt, "prompt_chars": len(prompt), "prompt_tokens": len(prompt) // 4})
+        with tracing.span("llm", mode=kind):
+            time.sleep(self.llm_latency)
+            text = self._synthesize(prompt)
+            self._record_usage(prompt, text)
+        return text
+
+    def _synthesize(self, prompt: str) -> str:
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if key in self.recorded: return self.recorded[key]
+        rng = _rng(prompt)
+        if "clarifying questions" in prompt:
+            return "1. What time period?\n2. Which regions?\n3. What depth of analysis?"
+        if "Synthesized Topic String" in prompt:
+            return "The Economics of Grid-Scale Battery Storage"
+        if "Summarize the following report section" in prompt:
+            return " ".join(rng.choice(WORDS) for _ in range(40)).capitalize() + "."
+        if "sub-topics or key questions" in prompt:
+            return "\n".join(f"- {' '.join(rng.choice(WORDS) for _ in range(6))}" for _ in range(4))
+        num_sources = len(re.findall(r"Source \[\d+\]", prompt))
+        if num_sources:
+            paragraphs = []
+            for _ in range(4):
+                sentences = [" ".join(rng.choice(WORDS) for _ in range(15)).capitalize() + f" [Source {rng.randint(1, num_sources)}]." for _ in range(4)]
+                paragraphs.append(" ".join(sentences))
+            return "\n\n".join(paragraphs)
+        return "OK"
+
+    def text_completion(self, prompt: str, temperature: float, use_cache: bool = True) -> str:
+        return self._respond(prompt, "text")
+
+    def stream_completion(self, prompt: str, temperature: float, use_cache: bool = True) -> Iterator[str]:
+        text = self._respond(prompt, "stream")
+        for start in range(0, len(text), 40):
+            if start: time.sleep(self.stream_chunk_latency)
+            yield text[start:start + 40]
+
+    def json_completion(self, prompt: str) -> Dict[str, Any]:
+        text = self._respond(prompt, "json")
+        if text != "OK": return json.loads(text)
+        if '"expansions"' in prompt:
+            count = len(re.findall(r"^\d+\. ", prompt, re.MULTILINE))
+            return {"expansions": [{"section": i + 1, "sub_topics": [f"aspect {j} of section {i + 1}" for j in range(3)]} for i in range(count)]}
+        return {"sections": [{"title": f"Section {i + 1}: {WORDS[i % len(WORDS)].title()}", "description": f"Covers the {WORDS[i % len(WORDS)]} dimension of the topic."} for i in range(self.num_sections)]}
+
+class HashingEmbedder:
+    """Bag-of-words hashing embedder with the sentence-transformers encode API. No model download needed."""
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16) % self.dim] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+class OverlapReranker:
+    """Token-overlap scorer with the CrossEncoder predict API."""
+    def predict(self, pairs, show_progress_bar: bool = False) -> np.ndarray:
+        scores = []
+        for query, passage in pairs:
+            q, p = set(re.findall(r"\w+", query.lower())), set(re.findall(r"\w+", passage.lower()))
+            scores.append(len(q & p) / max(1, len(q)))
+        return np.asarray(scores, dtype=np.float32)
+
+class FakeModelRegistry(ModelRegistry):
+    """Registry serving the hashing embedder and overlap re-ranker, for fully offline runs."""
+    def embedding_model(self, name: str, backend: str = "torch", **options):
+        return self._get("embedding", "hashing", HashingEmbedder)
+
+    def reranker(self, name: str, backend: str = "torch", **options):
+        return self._get("reranker", "overlap", OverlapReranker)
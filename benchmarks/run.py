@@ -0,0 +1,258 @@
+"""Offline benchmarks: ResearchAgent.run end to end against FakeAITools, plus RAGPipeline stage microbenchmarks
+(including chunk splitting time and retained memory against the previous LangChain-based path).
+
+    python -m benchmarks.run --fake-models --baseline benchmarks/baseline.json
+    python -m benchmarks.run --fake-models --update-baseline
+
+Results are written as JSON. When a baseline is given, any *_seconds metric that is more than
+--tolerance slower (and at least --min-delta seconds slower, to ride out timer noise), or any prompt-token metric that grew,
+counts as a regression and the exit code is 1.
+"""
+import argparse
+import functools
+import inspect
+import json
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from research_agent.agent import ResearchAgent
+from research_agent.chunks import ChunkStore
+from research_agent.config import AgentConfig
+from research_agent.models import model_registry
+from research_agent.prompts import Prompts
+from research_agent.rag_pipeline import RAGPipeline
+
+from .fakes import FakeAITools, FakeModelRegistry, synthetic_page
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+class StageTimer:
+    """Accumulates call counts and time spent in wrapped methods. Concurrent stages can sum to more than wall time."""
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self._lock = threading.Lock()
+
+    def _record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage]["calls"] += 1
+            self.stages[stage]["seconds"] += seconds
+
+    def wrap(self, obj: Any, method: str, stage: str):
+        original = getattr(obj, method)
+        if inspect.isgeneratorfunction(original):
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    yield from original(*args, **kwargs)
+                finally:
+                    self._record(stage, time.perf_counter() - started)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self._record(stage, time.perf_counter() - started)
+        setattr(obj, method, timed)
+
+def make_config(cache_dir: str, retrieval_mode: str) -> AgentConfig:
+    config = AgentConfig()
+    config.EMBEDDING_CACHE_DIR = cache_dir # Fresh cache: measure cold encoding
+    config.WARM_UP_MODELS = False
+    config.RETRIEVAL_MODE = retrieval_mode
+    return config
+
+def bench_end_to_end(args, registry) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        config = make_config(cache_dir, args.retrieval_mode)
+        tools = FakeAITools(config, num_sections=args.sections, llm_latency=args.llm_latency, stream_chunk_latency=args.stream_chunk_latency, search_latency=args.search_latency)
+        rag = RAGPipeline(config, registry=registry)
+        rag.warm_up(background=False) # Model load time is not part of a report
+        agent = ResearchAgent(config, tools, rag, Prompts())
+
+        timer = StageTimer()
+        timer.wrap(tools, "search", "search")
+        for method in ("text_completion", "stream_completion", "json_completion"):
+            timer.wrap(tools, method, "llm")
+        timer.wrap(rag, "index_documents", "index")
+        timer.wrap(rag, "embed_texts", "encode")
+        timer.wrap(rag, "rerank_scores", "rerank")
+
+        started = time.perf_counter()
+        first_update = None
+        for update in agent.run("grid batteries", "Focus on economics."):
+            if first_update is None: first_update = time.perf_counter() - started
+        wall = time.perf_counter() - started
+
+    prompt_tokens = [call["prompt_tokens"] for call in tools.calls]
+    writer_tokens = [call["prompt_tokens"] for call in tools.calls if call["writer"]]
+    return {
+        "wall_seconds": wall,
+        "first_update_seconds": first_update,
+        "stages": {stage: {"calls": int(v["calls"]), "seconds": v["seconds"]} for stage, v in timer.stages.items()},
+        "llm_calls": len(tools.calls),
+        "prompt_tokens": {"total": sum(prompt_tokens), "max": max(prompt_tokens, default=0), "writer_total": sum(writer_tokens)},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def retained_mb(build: Callable[[], Any]) -> float:
+    """Memory still allocated by build() once it returns, i.e. what its result keeps alive."""
+    tracemalloc.start()
+    try:
+        kept = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return current / (1024 * 1024)
+
+def bench_chunking(rag: RAGPipeline, size: int) -> Dict[str, Any]:
+    """Compares the previous chunking path (LangChain splitter, one dict and string per chunk) with offsets into a ChunkStore."""
+    make_documents = lambda: [{"source": f"https://example.com/doc/{i}", "content": synthetic_page(f"doc-{size}-{i}", paragraphs=20)} for i in range(size)]
+    legacy_splitter = RecursiveCharacterTextSplitter(chunk_size=rag.text_splitter.chunk_size, chunk_overlap=rag.text_splitter.chunk_overlap)
+    legacy = lambda documents: [{"source": d["source"], "content": c} for d in documents for c in legacy_splitter.split_text(d["content"])]
+    def compact(documents):
+        store = ChunkStore()
+        for d in documents: store.add_document(d["source"], d["content"], rag.text_splitter.split_offsets(d["content"]))
+        return store
+
+    documents = make_documents()
+    started = time.perf_counter()
+    legacy_chunks = legacy(documents)
+    legacy_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    store = compact(documents)
+    compact_seconds = time.perf_counter() - started
+    # Documents are built inside the measurement, so the legacy path is charged only for the chunks it keeps
+    # and the compact path for the page text it holds on to.
+    return {"legacy_chunks": len(legacy_chunks), "chunks": len(store),
+            "legacy_split_seconds": legacy_seconds, "split_seconds": compact_seconds,
+            "legacy_retained_mb": retained_mb(lambda: legacy(make_documents())), "retained_mb": retained_mb(lambda: compact(make_documents()))}
+
+def bench_rag(args, registry) -> Dict[str, Any]:
+    """Times each RAG stage separately over synthetic corpora of increasing size."""
+    results = {}
+    query = "battery storage market growth and price risk"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        config = make_config(cache_dir, args.retrieval_mode)
+        config.EMBEDDING_CACHE_ENABLED = False # Measure the encoder, not the cache
+        rag = RAGPipeline(config, registry=registry)
+        rag.warm_up(background=False)
+        for size in args.sizes:
+            documents = [{"source": f"https://example.com/doc/{i}", "content": synthetic_page(f"doc-{size}-{i}", paragraphs=20)} for i in range(size)]
+
+            chunking = bench_chunking(rag, size)
+            chunks = [{"source": d["source"], "content": c} for d in documents for c in rag.text_splitter.split_text(d["content"])]
+
+            started = time.perf_counter()
+            embeddings = rag.embed_texts([c["content"] for c in chunks])
+            encoding = time.perf_counter() - started
+
+            started = time.perf_counter()
+            corpus = rag.new_corpus()
+            corpus.add(chunks, embeddings)
+            indices = corpus.search(rag.embed_texts([query]), config.CHUNKS_TO_RETRIEVE)
+            faiss_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            rag.rerank_scores(query, [corpus.chunks[i]["content"] for i in indices])
+            rerank = time.perf_counter() - started
+
+            started = time.perf_counter()
+            rag.run(documents, query, config.CHUNKS_TO_USE_FOR_WRITING)
+            total = time.perf_counter() - started
+
+            results[str(size)] = {"documents": size, "chunks": len(chunks), "chunking": chunking, "encoding_seconds": encoding,
+                                  "faiss_seconds": faiss_seconds, "rerank_seconds": rerank, "run_seconds": total}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta: float) -> List[str]:
+    """Returns a description of every metric that regressed against the baseline."""
+    if baseline.get("meta", {}).get("mode") != results["meta"]["mode"]:
+        print(f"Warning: Baseline was recorded with mode '{baseline.get('meta', {}).get('mode')}', skipping comparison.")
+        return []
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for key, old in sorted(previous.items()):
+        new = current.get(key)
+        if new is None: continue
+        if key.endswith("_seconds") and new > old * (1 + tolerance) and new - old > min_delta:
+            regressions.append(f"{key}: {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+        elif ".prompt_tokens." in key and new > old:
+            regressions.append(f"{key}: {old} -> {new} tokens")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks for the research agent.")
+    parser.add_argument("--fake-models", action="store_true", help="Use hashing/overlap stand-ins instead of the real embedding and re-ranking models")
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--stream-chunk-latency", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="Documents per RAG microbenchmark corpus")
+    parser.add_argument("--retrieval-mode", default=AgentConfig.RETRIEVAL_MODE, choices=["dense", "hybrid", "lexical_prefilter"])
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--skip-rag", action="store_true")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline path instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    registry = FakeModelRegistry() if args.fake_models else model_registry
+    results: Dict[str, Any] = {"meta": {
+        "mode": "fake-models" if args.fake_models else "real-models",
+        "python": platform.python_version(), "machine": platform.machine(), "timestamp": time.time(),
+        "params": {"sections": args.sections, "llm_latency": args.llm_latency, "search_latency": args.search_latency, "sizes": args.sizes, "retrieval_mode": args.retrieval_mode},
+    }}
+    if not args.skip_e2e:
+        print("-> Running end-to-end benchmark...")
+        results["end_to_end"] = bench_end_to_end(args, registry)
+    if not args.skip_rag:
+        print("-> Running RAG microbenchmarks...")
+        results["rag"] = bench_rag(args, registry)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"-> Wrote results to {args.output}")
+
+    baseline_path = args.baseline or "benchmarks/baseline.json"
+    if args.update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"-> Updated baseline {baseline_path}")
+        return 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta)
+        for line in regressions: print(f"🔴 REGRESSION {line}")
+        if regressions: return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
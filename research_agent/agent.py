@@ -1,10 +1,22 @@
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 
 from .config import AgentConfig
 from .prompts import Prompts
 from .tools import AITools
 from .rag_pipeline import RAGPipeline
+from .corpus import ReportCorpus, SectionScopes
+from .citations import CitationRemapper
+from .context import ReportContext, estimate_tokens
+from .ingest import DocumentIngestor
+from .scheduler import SectionScheduler
+from .runs import Run, RunStore
+from .verification import CitationVerifier, parse_verification_response
+from . import tracing
 
 class Section(BaseModel):
     title: str = Field(description="The title of the report section.")
@@ -12,10 +24,21 @@ class Section(BaseModel):
 
 class ResearchAgent:
     def __init__(self, config: AgentConfig, tools: AITools, rag: RAGPipeline, prompts: Prompts):
+        if config.ADAPTIVE_RETRIEVAL and config.ADAPTIVE_MAX_ROUNDS < 1:
+            raise ValueError(f"ADAPTIVE_MAX_ROUNDS must be at least 1, got {config.ADAPTIVE_MAX_ROUNDS}")
         self.config = config
         self.tools = tools
         self.rag = rag
         self.prompts = prompts
+        self.scheduler = SectionScheduler(config)
+        self.run_store = RunStore(config.RUN_STORE_DIR) if config.RUN_STORE_ENABLED else None
+        self.verifier = None
+        if config.VERIFY_CITATIONS:
+            self.verifier = CitationVerifier(self._score_claims, config.VERIFY_SUPPORT_THRESHOLD, config.VERIFY_REJECT_THRESHOLD, config.VERIFY_ACTION,
+                                             self._escalate_claim if config.VERIFY_ESCALATE_TO_LLM else None, config.VERIFY_MAX_ESCALATIONS)
+        search_cache = getattr(tools.searcher, "cache", None)
+        if search_cache is not None and config.SEARCH_CACHE_SEMANTIC and search_cache.embed is None:
+            search_cache.embed = rag.embed_texts # The cache belongs to the tools, the embedding model to the RAG pipeline
 
     def get_clarifying_questions(self, initial_topic: str) -> str:
         """Generates clarifying questions for the user."""
@@ -27,15 +50,23 @@ class ResearchAgent:
         """Creates a detailed research brief."""
         print("\n--- Step 1: Constructing Detailed Research Brief ---")
         prompt = self.prompts.BRIEF_CONSTRUCTOR.format(initial_topic=initial_topic, user_answers=user_answers)
-        brief = self.tools.text_completion(prompt, 0.2).strip()
+        with tracing.span("brief"):
+            brief = self.tools.text_completion(prompt, 0.2).strip()
         print(f"--> Final Research Brief: **{brief}**")
         return brief
 
-    def _plan_and_expand_outline(self, detailed_topic: str) -> List[Section]:
-        """Creates and then refines the report outline."""
+    def _new_ingestor(self) -> DocumentIngestor:
+        return DocumentIngestor(self.config.USE_RAW_CONTENT, self.config.MAX_DOCUMENT_BYTES, self.config.NEAR_DUPLICATE_MAX_DISTANCE, self.config.MIN_DOCUMENT_CHARS)
+
+    def _plan_and_expand_outline(self, detailed_topic: str, corpus: Optional[ReportCorpus] = None, ingestor: Optional[DocumentIngestor] = None) -> List[Section]:
+        """Creates and then refines the report outline. Planning research is added to the corpus, in every section's scope, when one is given."""
         print("\n--- Step 2 & 3: Planning and Expanding Outline ---")
         print("-> Performing broad research for planning...")
         planning_research = self.tools.search([detailed_topic], self.config.INITIAL_SEARCH_RESULTS)
+        if corpus is not None:
+            planning_documents = list(ingestor.ingest(planning_research)) if ingestor is not None else planning_research
+            with self.scheduler.limit("rag"):
+                corpus.share(self.rag.index_documents(corpus, planning_documents))
         planning_context = "\n\n".join(item['content'] for item in planning_research)
         
         print("-> Generating initial plan...")
@@ -45,28 +76,128 @@ class ResearchAgent:
         if not initial_sections: return []
         
         print("-> Expanding outline for depth...")
-        expanded_sections = []
-        for section in initial_sections:
-            expansion_prompt = self.prompts.OUTLINE_EXPANDER.format(section_title=section.title, section_description=section.description)
-            sub_topics_text = self.tools.text_completion(expansion_prompt, 0.6)
-            section.description += "\n\nKey areas to investigate:\n" + sub_topics_text
-            expanded_sections.append(section)
-            print(f"--> Refined section: {section.title}")
-        return expanded_sections
+        mode = self.config.OUTLINE_EXPANSION_MODE
+        expansions = self._expand_outline_batched(initial_sections) if mode == "batched" else [None] * len(initial_sections)
+        pending = [i for i, text in enumerate(expansions) if text is None]
+        if mode == "sequential":
+            for i in pending: expansions[i] = self._expand_section(initial_sections[i])
+        elif pending:
+            # Each expansion is an independent request; a failure only affects its own section.
+            with ThreadPoolExecutor(max_workers=self.config.OUTLINE_EXPANSION_WORKERS, thread_name_prefix="expand") as executor:
+                for i, text in zip(pending, executor.map(tracing.bind(lambda i: self._expand_section(initial_sections[i])), pending)):
+                    expansions[i] = text
 
-    def _write_and_verify_section(self, detailed_topic: str, section: Section, previous_sections_context: str) -> tuple[str, dict, list]:
-        """Runs the full RAG and writing process for a single section."""
+        for section, sub_topics_text in zip(initial_sections, expansions):
+            if sub_topics_text:
+                section.description += "\n\nKey areas to investigate:\n" + sub_topics_text
+                print(f"--> Refined section: {section.title}")
+            else:
+                print(f"--> Could not expand section, keeping original description: {section.title}")
+        return initial_sections
+
+    def _expand_section(self, section: Section) -> Optional[str]:
+        """Generates sub-topics for one section. Returns None on failure."""
+        expansion_prompt = self.prompts.OUTLINE_EXPANDER.format(section_title=section.title, section_description=section.description)
+        try:
+            with tracing.span("expand", section=section.title), self.scheduler.limit("llm"):
+                sub_topics_text = self.tools.text_completion(expansion_prompt, 0.6)
+        except Exception as e:
+            print(f"Warning: Outline expansion failed for '{section.title}'. Error: {e}")
+            return None
+        return None if sub_topics_text.startswith("[Error") else sub_topics_text
+
+    def _expand_outline_batched(self, sections: List[Section]) -> List[Optional[str]]:
+        """Expands every section in a single JSON call. Sections missing from the response come back as None."""
+        outline = "\n".join(f"{i+1}. {s.title}: {s.description}" for i, s in enumerate(sections))
+        with tracing.span("expand", sections=len(sections)), self.scheduler.limit("llm"):
+            response = self.tools.json_completion(self.prompts.OUTLINE_EXPANDER_BATCH.format(outline=outline))
+        expansions = [None] * len(sections)
+        for item in response.get("expansions", []):
+            try:
+                index = int(item["section"]) - 1
+                sub_topics = item["sub_topics"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(sections) and sub_topics:
+                expansions[index] = "\n".join(f"- {t}" for t in sub_topics) if isinstance(sub_topics, list) else str(sub_topics)
+        return expansions
+
+    def _research_section(self, detailed_topic: str, section: Section, corpus: Optional[ReportCorpus] = None, ingestor: Optional[DocumentIngestor] = None,
+                          use_cache: bool = True, scopes: Optional[SectionScopes] = None, section_index: int = 0) -> tuple[list, list]:
+        """Runs the search and RAG stages for a single section. use_cache=False skips the search cache.
+
+        Safe to run concurrently: with `scopes`, the section retrieves from the corpus's shared (planning)
+        chunks, the first-round chunks of the sections before it and its own, whatever other sections have
+        indexed so far; without, from the shared chunks and its own.
+        """
         print(f"\n--- Processing Section: {section.title} ---")
         
         section_queries = [f"{detailed_topic} - {section.title}"] + section.description.split('\n')[-4:]
         section_queries = [q[:400] for q in section_queries if q]
-        section_research = self.tools.search(section_queries, self.config.DEEP_DIVE_SEARCH_RESULTS)
-        
-        top_chunks_with_meta = self.rag.run(section_research, section.description, self.config.CHUNKS_TO_USE_FOR_WRITING)
-        
-        if not top_chunks_with_meta:
-            return f"## {section.title}\n\nNo relevant research material could be found for this section.\n\n", {}, []
+        with tracing.span("research", section=section.title):
+            if self.config.ADAPTIVE_RETRIEVAL:
+                return self._research_section_adaptive(section, section_queries, corpus if corpus is not None else self.rag.new_corpus(), ingestor, use_cache, scopes, section_index)
+            with self.scheduler.limit("search"):
+                section_research = self.tools.search(section_queries, self.config.DEEP_DIVE_SEARCH_RESULTS, use_cache)
             
+            section_documents = list(ingestor.ingest(section_research)) if ingestor is not None else section_research
+            tracing.record(documents=len(section_documents))
+            
+            scope = self._section_scope(corpus, scopes, section_index) # May wait for earlier sections, so taken outside the RAG slot
+            with self.scheduler.limit("rag"):
+                top_chunks_with_meta = self.rag.run(section_documents, section.description, self.config.CHUNKS_TO_USE_FOR_WRITING, corpus=corpus, scope=scope)
+            if scopes is not None: scopes.pass_on(section_index, scope)
+            tracing.record(chunks=len(top_chunks_with_meta))
+        return section_queries, top_chunks_with_meta
+
+    def _research_section_adaptive(self, section: Section, section_queries: List[str], corpus: ReportCorpus, ingestor: Optional[DocumentIngestor],
+                                   use_cache: bool = True, scopes: Optional[SectionScopes] = None, section_index: int = 0) -> tuple[list, list]:
+        """Searches and retrieves in rounds of growing budget, stopping once the re-ranked chunks cover the section well.
+
+        Only chunks scoring above ADAPTIVE_SCORE_CUTOFF go to the writer (at least ADAPTIVE_MIN_CHUNKS).
+        Returns the queries actually searched and the chunks for the writer.
+        """
+        config = self.config
+        initial, rest = section_queries[:config.ADAPTIVE_INITIAL_QUERIES], section_queries[config.ADAPTIVE_INITIAL_QUERIES:]
+        rounds = [(initial, config.ADAPTIVE_INITIAL_RESULTS, config.ADAPTIVE_INITIAL_RETRIEVE)]
+        if rest: rounds.append((rest, config.DEEP_DIVE_SEARCH_RESULTS, config.CHUNKS_TO_RETRIEVE))
+        if config.ADAPTIVE_INITIAL_RESULTS < config.DEEP_DIVE_SEARCH_RESULTS: # Same queries, deeper results; seen URLs are skipped at ingestion
+            rounds.append((initial, config.DEEP_DIVE_SEARCH_RESULTS, 2 * config.CHUNKS_TO_RETRIEVE))
+
+        used_queries, scope, score_cache, ranked, relevant = [], None, {}, [], []
+        searches = results = round_number = 0
+        top_score = 0.0
+        for round_number, (queries, num_results, retrieve_k) in enumerate(rounds[:config.ADAPTIVE_MAX_ROUNDS], 1):
+            with self.scheduler.limit("search"):
+                research = self.tools.search(queries, num_results, use_cache)
+            used_queries += [q for q in queries if q not in used_queries]
+            searches, results = searches + len(queries), results + len(research)
+            documents = list(ingestor.ingest(research)) if ingestor is not None else research
+            if scope is None: scope = self._section_scope(corpus, scopes, section_index) # After the first search, so it overlaps earlier sections' work
+            with self.scheduler.limit("rag"):
+                ranked = self.rag.run_scored(documents, section.description, retrieve_k, corpus, retrieve_k=retrieve_k, score_cache=score_cache, scope=scope)
+            if round_number == 1 and scopes is not None: scopes.pass_on(section_index, scope)
+            probabilities = np.array([score for _, score in ranked]) # Re-ranker probabilities
+            relevant = [meta for (meta, _), p in zip(ranked, probabilities) if p >= config.ADAPTIVE_SCORE_CUTOFF]
+            top_score = float(probabilities[0]) if probabilities.size else 0.0
+            if len(relevant) >= config.ADAPTIVE_MIN_RELEVANT and len({m['source'] for m in relevant}) >= config.ADAPTIVE_MIN_SOURCES and top_score >= config.ADAPTIVE_MIN_TOP_SCORE:
+                break
+
+        top_chunks = relevant[:config.CHUNKS_TO_USE_FOR_WRITING]
+        if len(top_chunks) < config.ADAPTIVE_MIN_CHUNKS:
+            top_chunks = [meta for meta, _ in ranked[:config.ADAPTIVE_MIN_CHUNKS]] # Weak material beats none; verification flags what it can't support
+        print(f"--> Adaptive retrieval for '{section.title}': {round_number} round(s), {searches} searches, {results} results, "
+              f"{len(score_cache)} chunks re-ranked, {len(relevant)} above cutoff (top score {top_score:.2f}), {len(top_chunks)} sent to the writer")
+        tracing.record(search_rounds=round_number, documents=results, chunks=len(top_chunks), reranked=len(score_cache))
+        return used_queries, top_chunks
+
+    def _section_scope(self, corpus: Optional[ReportCorpus], scopes: Optional[SectionScopes] = None, section_index: int = 0) -> Optional[List[int]]:
+        """The chunk ids a section starts out retrieving from; its own chunks are added as it indexes them."""
+        if corpus is None: return None
+        if self.config.RESTRICT_RETRIEVAL_TO_SECTION_SOURCES: return []
+        return scopes.take(section_index) if scopes is not None else list(corpus.shared)
+
+    def _build_writer_prompt(self, detailed_topic: str, section: Section, top_chunks_with_meta: list, previous_sections_context: str) -> tuple[str, dict]:
         context_for_llm, cited_sources = "", {}
         for i, item in enumerate(top_chunks_with_meta):
             source_url = item['source']
@@ -74,20 +205,150 @@ class ResearchAgent:
             cited_sources[i+1] = source_url
 
         writer_prompt = f"{self.prompts.WRITER_SYSTEM}\n\n{self.prompts.SECTION_WRITER.format(topic=detailed_topic, section_title=section.title, previous_sections_context=previous_sections_context, research=context_for_llm)}"
+        return writer_prompt, cited_sources
+
+    def _write_section(self, detailed_topic: str, section: Section, top_chunks_with_meta: list, previous_sections_context: str, use_cache: bool = True) -> tuple[str, dict]:
+        """Writes a single section from its retrieved chunks. use_cache=False asks the LLM for a new draft even if this prompt was answered before."""
+        if not top_chunks_with_meta:
+            return f"## {section.title}\n\nNo relevant research material could be found for this section.\n\n", {}
+            
+        writer_prompt, cited_sources = self._build_writer_prompt(detailed_topic, section, top_chunks_with_meta, previous_sections_context)
         
-        draft_content = self.tools.text_completion(writer_prompt, self.config.WRITER_TEMPERATURE)
+        with self.scheduler.limit("llm"):
+            draft_content = self.tools.text_completion(writer_prompt, self.config.WRITER_TEMPERATURE, use_cache)
         
+        return draft_content, cited_sources
+
+    def _stream_section(self, detailed_topic: str, section: Section, top_chunks_with_meta: list, previous_sections_context: str, use_cache: bool = True) -> tuple[Iterator[str], dict]:
+        """Streaming variant of _write_section: returns an iterator of draft text chunks and the local source map."""
+        if not top_chunks_with_meta:
+            return iter([f"## {section.title}\n\nNo relevant research material could be found for this section.\n\n"]), {}
+
+        writer_prompt, cited_sources = self._build_writer_prompt(detailed_topic, section, top_chunks_with_meta, previous_sections_context)
+
+        def stream():
+            with self.scheduler.limit("llm"):
+                yield from self.tools.stream_completion(writer_prompt, self.config.WRITER_TEMPERATURE, use_cache)
+        return stream(), cited_sources
+
+    def _score_claims(self, pairs: list):
+        with self.scheduler.limit("rag"):
+            return self.rag.verify_scores(pairs)
+
+    def _escalate_claim(self, sentence: str, research_context: str) -> Optional[str]:
+        """Asks the LLM to fact-check one claim the local verifier was unsure about. Returns None if it holds up."""
+        prompt = self.prompts.VERIFICATION_PROMPT.format(section_text=sentence, research_context=research_context)
+        with self.scheduler.limit("llm"):
+            return parse_verification_response(self.tools.text_completion(prompt, 0.0))
+
+    def _verify_section(self, section: Section, draft: str, top_chunks_with_meta: list) -> str:
+        """Checks the draft's cited claims against the chunks they cite (draft still uses local [Source N] numbers)."""
+        if self.verifier is None or not top_chunks_with_meta or "[Error: LLM call failed." in draft:
+            return draft
+        sources = {i + 1: item['content'] for i, item in enumerate(top_chunks_with_meta)}
+        with tracing.span("verify", section=section.title):
+            checked, stats = self.verifier.verify(draft, sources)
+            tracing.record(**{f"claims_{key}": value for key, value in stats.items()})
+        print(f"--> Verified {stats['checked']} cited claims: {stats['supported']} supported, {stats['corrected']} corrected, {stats['unsupported']} unsupported ({stats['escalated']} sent to the LLM)")
+        return checked
+
+    def _write_and_verify_section(self, detailed_topic: str, section: Section, previous_sections_context: str) -> tuple[str, dict, list]:
+        """Runs the full RAG and writing process for a single section."""
+        section_queries, top_chunks_with_meta = self._research_section(detailed_topic, section)
+        draft_content, cited_sources = self._write_section(detailed_topic, section, top_chunks_with_meta, previous_sections_context)
+        draft_content = self._verify_section(section, draft_content, top_chunks_with_meta)
         return draft_content, cited_sources, section_queries
 
-    def run(self, user_request: str, user_answers: str):
-        """The main orchestrator that runs the full agent process."""
+    def _summarize_section(self, section: Section, section_text: str) -> tuple[str, int]:
+        """Produces the rolling summary used by the bounded writer context, and the tokens the call cost."""
+        prompt = self.prompts.SECTION_SUMMARIZER.format(section_title=section.title, section_text=section_text)
+        with tracing.span("summarize", section=section.title), self.scheduler.limit("llm"):
+            summary = self.tools.text_completion(prompt, 0.2)
+        tokens = estimate_tokens(prompt) + estimate_tokens(summary)
+        if summary.startswith("[Error"):
+            return section_text.replace("\n", " ")[:400], tokens # Fall back to the section's opening
+        return summary, tokens
+
+    def run(self, user_request: str, user_answers: str, trace: Optional[tracing.Trace] = None):
+        """The main orchestrator that runs the full agent process. Pass `trace` to read the run's spans afterwards."""
+        checkpoint = self.run_store.create(user_request, user_answers) if self.run_store is not None else None
+        yield from self._traced(user_request, user_answers, checkpoint, trace)
+
+    def load_run(self, run_id: str) -> Run:
+        if self.run_store is None:
+            raise ValueError("Run checkpoints are disabled (RUN_STORE_ENABLED is False).")
+        try:
+            return self.run_store.load(run_id)
+        except KeyError:
+            raise ValueError(f"Unknown run ID: {run_id}") from None
+
+    def resume(self, run_id: str):
+        """Continues a checkpointed run, skipping every stage that already completed."""
+        checkpoint = self.load_run(run_id)
+        print(f"\n--- Resuming run {run_id} ---")
+        yield from self._traced(checkpoint.get("user_request"), checkpoint.get("user_answers"), checkpoint)
+
+    def regenerate_section(self, run_id: str, section_index: int, refresh_research: bool = False):
+        """Rewrites one section (0-based) of a stored run, and re-researches it if asked; other sections are reused.
+
+        The section's draft (and with refresh_research its search results) bypass the caches, which would
+        otherwise hand back what the run already had.
+        """
+        checkpoint = self.load_run(run_id)
+        checkpoint.reset_section(section_index, refresh_research)
+        print(f"\n--- Regenerating section {section_index + 1} of run {run_id} ---")
+        yield from self._traced(checkpoint.get("user_request"), checkpoint.get("user_answers"), checkpoint, fresh={section_index: refresh_research})
+
+    def _traced(self, user_request: str, user_answers: str, checkpoint: Optional[Run], trace: Optional[tracing.Trace] = None, fresh: Optional[Dict[int, bool]] = None):
+        if trace is None and self.config.TRACING_ENABLED:
+            trace = tracing.Trace("report", tracing.metrics)
+        if trace is not None:
+            trace.root.set(topic=user_request, run_id=checkpoint.id if checkpoint else None)
+        try:
+            with tracing.activate(trace) if trace is not None else nullcontext():
+                yield from self._run(user_request, user_answers, checkpoint, fresh)
+        finally:
+            self.rag.flush()
+            if checkpoint is not None and checkpoint.get("status") != "done":
+                checkpoint.update(status="incomplete")
+                print(f"-> Run {checkpoint.id} saved; resume it to continue where it stopped.")
+            if trace is not None:
+                trace.finish()
+                self._log_trace(trace)
+
+    def _log_trace(self, trace: tracing.Trace):
+        stages = trace.stage_totals()
+        print("-> Stage timings: " + ", ".join(f"{name} {totals['seconds']:.2f}s" for name, totals in stages.items() if name != "report"))
+        search = stages.get("search", {})
+        if search.get("cache_hits"):
+            print(f"-> Search cache: {int(search['cache_hits'])}/{int(search.get('queries', 0))} queries served from cache "
+                  f"({int(search.get('semantic_cache_hits', 0))} near-duplicates), ~{search.get('cache_seconds_saved', 0):.1f}s of search latency saved")
+        if self.config.TRACE_DIR:
+            try:
+                print(f"-> Trace written to {trace.save(self.config.TRACE_DIR)}")
+            except OSError as e:
+                print(f"Warning: Could not write trace. Error: {e}")
+
+    def _run(self, user_request: str, user_answers: str, checkpoint: Optional[Run] = None, fresh: Optional[Dict[int, bool]] = None):
+        """`fresh` maps section indexes to rewrite without the LLM cache to whether their searches skip the search cache too."""
+        fresh = fresh or {}
+        saved = checkpoint.get if checkpoint is not None else (lambda key, default=None: default)
         # --- Step 1: Construct Brief ---
-        detailed_topic = self._construct_research_brief(user_request, user_answers)
-        yield f"### Research Brief Constructed\n> {detailed_topic}\n\n---\n"
+        detailed_topic = saved("brief") or self._construct_research_brief(user_request, user_answers)
+        if checkpoint is not None: checkpoint.update(brief=detailed_topic, status="running")
+        run_note = f"\n\n*Run ID: `{checkpoint.id}`*" if checkpoint is not None else ""
+        yield f"### Research Brief Constructed\n> {detailed_topic}{run_note}\n\n---\n"
 
         # --- Step 2: Plan Outline ---
         yield "### Generating Report Outline..."
-        sections = self._plan_and_expand_outline(detailed_topic)
+        corpus = self.rag.new_corpus() # Shared by every section of this report
+        ingestor = self._new_ingestor()
+        if saved("sections"):
+            sections = [Section(**s) for s in saved("sections")]
+        else:
+            with tracing.span("plan"):
+                sections = self._plan_and_expand_outline(detailed_topic, corpus, ingestor)
+            if checkpoint is not None and sections: checkpoint.update(sections=[s.model_dump() for s in sections])
         if not sections:
             yield "# Report Generation Failed\nCould not create a valid report outline."
             return
@@ -100,32 +361,110 @@ class ResearchAgent:
         # --- Step 3: Write Report ---
         full_report_text = f"# Deep Research Report: {detailed_topic}\n\n"
         master_bibliography = {}
-        citation_master_counter = 1
+        first_token_latencies = []
+        report_context = None
+        if self.config.BOUNDED_WRITER_CONTEXT:
+            report_context = ReportContext(detailed_topic, [s.title for s in sections], self.config.WRITER_CONTEXT_TOKEN_BUDGET, self.rag.embed_texts)
 
-        for i, section in enumerate(sections):
-            yield f"### Processing Section {i+1}/{len(sections)}: {section.title}...\n"
-            
-            section_content, section_sources, section_queries = self._write_and_verify_section(detailed_topic, section, full_report_text)
+        restrict = self.config.RESTRICT_RETRIEVAL_TO_SECTION_SOURCES
+        scopes = None if restrict else SectionScopes(corpus.shared, len(sections))
+
+        def research(i: int) -> tuple[list, list]:
+            try:
+                stored = checkpoint.section(i) if checkpoint is not None else {}
+                if "chunks" in stored: return stored["queries"], stored["chunks"]
+                # Each section de-duplicates against the planning research and itself only, so its documents don't depend on timing.
+                # A restricted section can only retrieve what it ingests itself, so it skips nothing the planning search found.
+                section_ingestor = ingestor.fork(skip_seen=not restrict)
+                section_queries, top_chunks_with_meta = self._research_section(detailed_topic, sections[i], corpus, section_ingestor, use_cache=not fresh.get(i, False),
+                                                                               scopes=scopes, section_index=i)
+                if checkpoint is not None: checkpoint.update_section(i, queries=section_queries, chunks=top_chunks_with_meta)
+                return section_queries, top_chunks_with_meta
+            finally:
+                if scopes is not None: scopes.pass_on(i, scopes.take(i)) # No-op unless the section stopped (or was restored) before its first retrieval
+
+        # Retrieval does not depend on earlier sections, so it can run ahead of the writer.
+        research_fn = tracing.bind(research)
+        if self.config.CONCURRENT_SECTIONS:
+            research_results = self.scheduler.run_ahead(research_fn, range(len(sections)))
+        else:
+            research_results = (research_fn(i) for i in range(len(sections)))
+
+        try:
+            for i, section in enumerate(sections):
+                yield f"### Processing Section {i+1}/{len(sections)}: {section.title}...\n"
             
-            # Yield the search queries used for this section
-            queries_md = "\n".join(f"- `{q}`" for q in section_queries)
-            yield f"-> Searching with queries:\n{queries_md}\n"
-
-            # Remap citations
-            final_section_text = section_content
-            for local_num, url in section_sources.items():
-                if url not in master_bibliography:
-                    master_bibliography[url] = citation_master_counter
-                    citation_master_counter += 1
-                master_num = master_bibliography[url]
-                final_section_text = final_section_text.replace(f"[Source {local_num}]", f"[{master_num}]")
-
-            full_report_text += final_section_text + "\n\n"
-            yield full_report_text # This yields the cumulative report
+                section_queries, top_chunks_with_meta = next(research_results)
+
+                # Yield the search queries used for this section
+                queries_md = "\n".join(f"- `{q}`" for q in section_queries)
+                yield f"-> Searching with queries:\n{queries_md}\n"
+
+                stored = checkpoint.section(i) if checkpoint is not None else {}
+                with tracing.span("write", section=section.title, resumed="draft" in stored) as write_span:
+                    previous_sections_context = full_report_text
+                    if report_context is not None and "draft" not in stored:
+                        previous_sections_context = report_context.build(section.title, section.description, full_report_text)
+
+                    write_started = time.perf_counter()
+                    if "draft" in stored:
+                        section_stream, section_sources = iter([stored["draft"]]), checkpoint.section_sources(i)
+                    elif self.config.STREAM_WRITER:
+                        section_stream, section_sources = self._stream_section(detailed_topic, section, top_chunks_with_meta, previous_sections_context, use_cache=i not in fresh)
+                    else:
+                        section_content, section_sources = self._write_section(detailed_topic, section, top_chunks_with_meta, previous_sections_context, use_cache=i not in fresh)
+                        section_stream = iter([section_content])
+
+                    # Remap citations as the draft arrives
+                    remapper = CitationRemapper(section_sources, master_bibliography)
+                    draft, final_section_text = "", ""
+                    for n, piece in enumerate(section_stream):
+                        if n == 0 and self.config.STREAM_WRITER and "draft" not in stored:
+                            first_token_latencies.append(time.perf_counter() - write_started)
+                            print(f"--> Time to first token: {first_token_latencies[-1]:.2f}s")
+                            if write_span is not None: write_span.set(ttft_seconds=round(first_token_latencies[-1], 3))
+                        draft += piece
+                        final_section_text += remapper.feed(piece)
+                        if self.config.STREAM_WRITER:
+                            yield full_report_text + final_section_text
+                    final_section_text += remapper.flush()
+                    if "draft" not in stored:
+                        checked = self._verify_section(section, draft, top_chunks_with_meta)
+                        if checked != draft:
+                            draft = checked
+                            final_section_text = remapper.feed(draft) + remapper.flush() # Same master numbers: they were fixed up front
+                    # Failed LLM calls come back as an error marker; leave those sections for the next resume.
+                    draft_saved = "draft" in stored or "[Error: LLM call failed." not in draft
+                    if checkpoint is not None and "draft" not in stored and draft_saved:
+                        checkpoint.update_section(i, draft=draft, sources=section_sources)
+
+                    full_report_text += final_section_text + "\n\n"
+                    yield full_report_text # This yields the cumulative report
+
+                if report_context is not None and i < len(sections) - 1:
+                    # A stored summary only matches a stored draft; a failed draft's summary is kept for this run only.
+                    reused_summary = stored.get("summary") if "draft" in stored else None
+                    summary, summary_tokens = (reused_summary, 0) if reused_summary else self._summarize_section(section, final_section_text)
+                    if checkpoint is not None and not reused_summary and draft_saved: checkpoint.update_section(i, summary=summary)
+                    report_context.add_section(section.title, final_section_text, summary, summary_tokens)
+        finally:
+            research_results.close() # Stops research still queued if the run is cancelled or fails
+
+        if first_token_latencies:
+            print(f"-> Writer time to first token: mean {sum(first_token_latencies) / len(first_token_latencies):.2f}s, max {max(first_token_latencies):.2f}s")
+        print(f"-> Ingestion skipped {ingestor.duplicates_skipped} duplicate documents")
+        tracing.record(duplicates_skipped=ingestor.duplicates_skipped)
+        if report_context is not None:
+            print(f"-> Bounded writer context saved ~{report_context.tokens_saved} writer prompt tokens; section summaries cost "
+                  f"~{report_context.summary_tokens}, net ~{report_context.net_tokens_saved}")
+            tracing.record(context_tokens_saved=report_context.tokens_saved, context_summary_tokens=report_context.summary_tokens,
+                           context_net_tokens_saved=report_context.net_tokens_saved)
             
         # --- Step 4: Final Bibliography ---
-        full_report_text += "## Master Bibliography\n\n"
-        for url, num in sorted(master_bibliography.items(), key=lambda item: item[1]):
-            full_report_text += f"[{num}] {url}\n"
+        with tracing.span("bibliography", sources=len(master_bibliography)):
+            full_report_text += "## Master Bibliography\n\n"
+            for url, num in sorted(master_bibliography.items(), key=lambda item: item[1]):
+                full_report_text += f"[{num}] {url}\n"
+        if checkpoint is not None: checkpoint.update(report=full_report_text, bibliography=master_bibliography, status="done")
             
         yield full_report_text
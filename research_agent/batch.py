@@ -0,0 +1,158 @@
+"""Headless batch runner: generates one report per line of a JSONL file, without the UI.
+
+    python -m research_agent.batch topics.jsonl --output-dir reports --parallel 4
+
+Each input line is {"topic": "...", "answers": "...", "id": "..."}, and only `topic` is required. Without
+`answers` the clarifying round trip is skipped and --default-answers is used instead. Every report gets
+its own directory holding report.md and metadata.json. Reports already marked done in their metadata
+are skipped, so an interrupted batch can simply be started again.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import tracing
+from .agent import ResearchAgent
+from .config import AgentConfig
+from .prompts import Prompts
+from .rag_pipeline import RAGPipeline
+from .tools import AITools
+
+DEFAULT_ANSWERS = "No further preferences. Cover the topic comprehensively, focusing on the most recent and reliable information."
+
+def load_topics(path: str) -> List[Dict[str, str]]:
+    topics = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            item = json.loads(line)
+            if not item.get("topic"):
+                raise ValueError(f"{path}:{line_number}: missing 'topic'")
+            slug = re.sub(r"[^\w-]+", "_", item["topic"].lower()).strip("_")[:60]
+            item["id"] = str(item.get("id") or f"{len(topics) + 1:04d}-{slug}")
+            topics.append(item)
+    return topics
+
+def usage_from_trace(trace: tracing.Trace) -> Dict[str, float]:
+    """API usage of one report, read from its span totals."""
+    stages = trace.stage_totals()
+    llm, search = stages.get("llm", {}), stages.get("search", {})
+    return {
+        "llm_calls": int(llm.get("calls", 0) - llm.get("cache_hits", 0)),
+        "llm_cache_hits": int(llm.get("cache_hits", 0)),
+        "search_queries": int(search.get("queries", 0)),
+        "search_cache_hits": int(search.get("cache_hits", 0)),
+        "search_seconds_saved": float(search.get("cache_seconds_saved", 0.0)),
+        "prompt_tokens": int(llm.get("prompt_tokens", 0)),
+        "response_tokens": int(llm.get("response_tokens", 0)),
+        "errors": int(sum(totals.get("errors", 0) for totals in stages.values())),
+    }
+
+def run_one(agent: ResearchAgent, item: Dict[str, str], output_dir: str, default_answers: str) -> Dict[str, Any]:
+    """Generates one report and writes report.md and metadata.json. Returns the metadata."""
+    report_dir = os.path.join(output_dir, item["id"])
+    os.makedirs(report_dir, exist_ok=True)
+    trace = tracing.Trace("report", tracing.metrics)
+    metadata = {"id": item["id"], "topic": item["topic"], "answers": item.get("answers") or default_answers, "status": "failed", "started_at": time.time()}
+    started = time.perf_counter()
+    report = None
+    try:
+        for report in agent.run(item["topic"], metadata["answers"], trace=trace): pass
+        metadata["status"] = "done" if report and "## Master Bibliography" in report else "failed"
+    except Exception as e:
+        metadata["error"] = str(e)
+        print(f"🔴 Report '{item['id']}' failed. Error: {e}")
+    metadata["seconds"] = time.perf_counter() - started
+    metadata["run_id"] = trace.root.attributes.get("run_id")
+    metadata.update(usage_from_trace(trace))
+    if report:
+        with open(os.path.join(report_dir, "report.md"), "w", encoding="utf-8") as f:
+            f.write(report)
+    with open(os.path.join(report_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    done = [r for r in results if r["status"] == "done"]
+    latencies = np.array([r["seconds"] for r in done]) if done else np.zeros(0)
+    per_report = lambda key: sum(r.get(key, 0) for r in results) / len(results) if results else 0.0
+    return {
+        "reports": len(results), "done": len(done), "failed": len(results) - len(done),
+        "wall_seconds": wall_seconds,
+        "reports_per_hour": len(done) / wall_seconds * 3600 if wall_seconds else 0.0,
+        "mean_latency_seconds": float(latencies.mean()) if latencies.size else None,
+        "p95_latency_seconds": float(np.percentile(latencies, 95)) if latencies.size else None,
+        "llm_calls_per_report": per_report("llm_calls"),
+        "search_queries_per_report": per_report("search_queries"),
+        "search_cache_hit_rate": sum(r.get("search_cache_hits", 0) for r in results) / max(sum(r.get("search_queries", 0) for r in results), 1),
+        "search_seconds_saved": sum(r.get("search_seconds_saved", 0.0) for r in results),
+        "tokens_per_report": per_report("prompt_tokens") + per_report("response_tokens"),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate research reports for every topic in a JSONL file.")
+    parser.add_argument("topics", help="JSONL file with one {\"topic\", \"answers\"?, \"id\"?} object per line")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--parallel", type=int, default=AgentConfig.MAX_CONCURRENT_REPORTS, help="Reports generated at once")
+    parser.add_argument("--default-answers", default=DEFAULT_ANSWERS, help="Used for topics without 'answers'")
+    parser.add_argument("--rerun", action="store_true", help="Regenerate reports already marked done")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    google_key, tavily_key = os.environ.get("GOOGLE_API_KEY"), os.environ.get("TAVILY_API_KEY")
+    if not google_key or not tavily_key:
+        print("🔴 ERROR: GOOGLE_API_KEY and TAVILY_API_KEY must be set in your environment.")
+        return 2
+
+    topics = load_topics(args.topics)
+    pending = []
+    for item in topics:
+        metadata_path = os.path.join(args.output_dir, item["id"], "metadata.json")
+        if not args.rerun and os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("status") == "done": continue
+        pending.append(item)
+    print(f"-> {len(pending)} of {len(topics)} topics to generate, {args.parallel} at a time")
+    if not pending: return 0
+
+    # One agent for the whole batch: models, LLM and embedding caches and concurrency limits are shared.
+    config = AgentConfig()
+    tools = AITools(config=config, api_keys={"google": google_key, "tavily": tavily_key})
+    rag = RAGPipeline(config=config)
+    rag.warm_up(background=False)
+    agent = ResearchAgent(config=config, tools=tools, rag=rag, prompts=Prompts())
+
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel, thread_name_prefix="batch") as executor:
+        futures = {executor.submit(run_one, agent, item, args.output_dir, args.default_answers): item for item in pending}
+        for future in as_completed(futures):
+            metadata = future.result()
+            results.append(metadata)
+            print(f"-> [{len(results)}/{len(pending)}] {metadata['status']}: {metadata['id']} in {metadata['seconds']:.1f}s "
+                  f"({metadata['llm_calls']} LLM calls, {metadata['search_queries']} searches)")
+    tools.searcher.close()
+    if tools.searcher.cache is not None:
+        cache = tools.searcher.cache.stats()
+        print(f"-> Search cache: {cache['hit_rate']:.0%} hit rate ({cache['hits']} exact, {cache['semantic_hits']} near-duplicate, {cache['misses']} misses), ~{cache['seconds_saved']:.0f}s saved")
+
+    summary = summarize(results, time.perf_counter() - started)
+    with open(os.path.join(args.output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"-> Batch finished: {summary['done']}/{summary['reports']} reports in {summary['wall_seconds']:.0f}s "
+          f"({summary['reports_per_hour']:.1f} reports/hour)")
+    if summary["done"]:
+        print(f"-> Latency: mean {summary['mean_latency_seconds']:.1f}s, p95 {summary['p95_latency_seconds']:.1f}s; "
+              f"per report: {summary['llm_calls_per_report']:.1f} LLM calls, {summary['search_queries_per_report']:.1f} searches, {summary['tokens_per_report']:.0f} tokens")
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+# Sentence punctuation (and any closing quote/bracket) followed by spaces.
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*[ \t]+")
+
+class SentenceSplitter:
+    """Splits text into overlapping windows of at most `chunk_size` characters, returned as (start, end) offsets.
+
+    Windows end on line breaks; lines longer than a chunk are cut at sentence ends, and sentences longer
+    than a chunk at spaces, so a word is only split if it alone exceeds `chunk_size`. Each window starts
+    on a cut within `chunk_overlap` characters of the previous window's end, so consecutive chunks share
+    their last line or sentence when it fits; when the overlap would leave no room for new text, the next
+    window starts where the previous one ended instead. Sentences are only looked for in long lines, which keeps
+    the scan cheap on typical pages.
+    """
+    __slots__ = ("chunk_size", "chunk_overlap")
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150):
+        if chunk_overlap >= chunk_size: raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _cuts(self, text: str) -> List[int]:
+        cuts, position = [0], 0
+        for line in text.split("\n"):
+            end = min(position + len(line) + 1, len(text))
+            if end - position > self.chunk_size:
+                for match in SENTENCE_END.finditer(text, position, end): self._cut(text, cuts, match.end())
+            self._cut(text, cuts, end)
+            position = end
+        return cuts
+
+    def _cut(self, text: str, cuts: List[int], end: int):
+        start = cuts[-1]
+        while end - start > self.chunk_size: # Cut at the last space that fits, or hard at chunk_size without one
+            space = text.rfind(" ", start + 1, start + self.chunk_size)
+            start = space + 1 if space > start else start + self.chunk_size
+            cuts.append(start)
+        if end > start: cuts.append(end)
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        cuts = self._cuts(text)
+        spans, i = [], 0
+        while i < len(cuts) - 1:
+            j = self._window_end(cuts, i)
+            start, end = cuts[i], cuts[j]
+            while start < end and text[start].isspace(): start += 1
+            while end > start and text[end - 1].isspace(): end -= 1
+            if end > start and not (spans and spans[-1][0] <= start and end <= spans[-1][1]): spans.append((start, end))
+            if j == len(cuts) - 1: break
+            # Next window starts at the first cut inside the overlap, unless the window from there would end
+            # where this one did (the following segment doesn't fit with the overlap): then it starts at the end.
+            i = min(bisect_left(cuts, cuts[j] - self.chunk_overlap, i + 1, j), j)
+            if self._window_end(cuts, i) <= j: i = j
+        return spans
+
+    def _window_end(self, cuts: List[int], i: int) -> int:
+        return max(bisect_right(cuts, cuts[i] + self.chunk_size) - 1, i + 1)
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+class ChunkStore:
+    """Chunks kept as offsets into their documents instead of as separate strings.
+
+    Every document's text is stored once and every source URL once; a chunk is a (document, start, end)
+    row in flat integer arrays. Indexing returns a {"source", "content"} dict built on demand, so callers
+    handing chunks to the encoder or the writer see the same records as before.
+    """
+    __slots__ = ("documents", "sources", "_source_ids", "_document_sources", "_documents", "_starts", "_ends")
+
+    def __init__(self):
+        self.documents: List[str] = []
+        self.sources: List[str] = []
+        self._source_ids: Dict[str, int] = {}
+        self._document_sources = array("I") # Document -> source id
+        self._documents = array("I") # Chunk -> document
+        self._starts = array("I")
+        self._ends = array("I")
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add_document(self, source: str, text: str, spans: Iterable[Tuple[int, int]]) -> List[int]:
+        """Stores text once and adds a chunk per (start, end) span. Returns the new chunk ids."""
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+        document = len(self.documents)
+        self.documents.append(text)
+        self._document_sources.append(source_id)
+        first = len(self._documents)
+        for start, end in spans:
+            self._documents.append(document)
+            self._starts.append(start)
+            self._ends.append(end)
+        return list(range(first, len(self._documents)))
+
+    def text(self, i: int) -> str:
+        return self.documents[self._documents[i]][self._starts[i]:self._ends[i]]
+
+    def source(self, i: int) -> str:
+        return self.sources[self._document_sources[self._documents[i]]]
+
+    def texts(self, ids: Iterable[int]) -> List[str]:
+        return [self.text(i) for i in ids]
+
+    def __getitem__(self, i: int) -> Dict[str, str]:
+        return {"source": self.source(i), "content": self.text(i)}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def nbytes(self) -> int:
+        """Approximate memory held: document text plus the offset arrays."""
+        arrays = (self._document_sources, self._documents, self._starts, self._ends)
+        return sum(len(text) for text in self.documents) + sum(a.itemsize * len(a) for a in arrays)
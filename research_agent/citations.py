@@ -0,0 +1,38 @@
+import re
+from typing import Dict
+
+# Matches a complete local citation, and any unfinished prefix of one at the end of a buffer.
+CITATION_PATTERN = re.compile(r"\[Source (\d+)\]")
+PARTIAL_CITATION_PATTERN = re.compile(r"\[(?:S(?:o(?:u(?:r(?:c(?:e(?: \d*)?)?)?)?)?)?)?$")
+
+class CitationRemapper:
+    """Rewrites a section's local `[Source N]` markers to master bibliography numbers, incrementally.
+
+    Master numbers are assigned up front, in local source order, for every source the section was given.
+    `feed` holds back a trailing partial marker until the next piece of text completes it.
+    """
+    def __init__(self, section_sources: Dict[int, str], master_bibliography: Dict[str, int]):
+        self.local_to_master = {}
+        for local_num, url in section_sources.items():
+            if url not in master_bibliography:
+                master_bibliography[url] = len(master_bibliography) + 1
+            self.local_to_master[local_num] = master_bibliography[url]
+        self._pending = ""
+
+    def _remap(self, text: str) -> str:
+        def replace(match):
+            master_num = self.local_to_master.get(int(match.group(1)))
+            return f"[{master_num}]" if master_num is not None else match.group(0)
+        return CITATION_PATTERN.sub(replace, text)
+
+    def feed(self, text: str) -> str:
+        """Returns the remapped text that is safe to emit so far."""
+        buffer = self._pending + text
+        partial = PARTIAL_CITATION_PATTERN.search(buffer)
+        split_at = partial.start() if partial else len(buffer)
+        self._pending = buffer[split_at:]
+        return self._remap(buffer[:split_at])
+
+    def flush(self) -> str:
+        remaining, self._pending = self._pending, ""
+        return self._remap(remaining)
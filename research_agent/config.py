@@ -7,11 +7,103 @@ class AgentConfig:
     # Research settings
     INITIAL_SEARCH_RESULTS = 5
     DEEP_DIVE_SEARCH_RESULTS = 5
+    SEARCH_DEPTH = "advanced"
+    SEARCH_TIMEOUT_SECONDS = 30.0
+    SEARCH_MAX_RETRIES = 3
+    SEARCH_BACKOFF_SECONDS = 1.0
+    MAX_CONCURRENT_SEARCH_REQUESTS = 8 # Global cap on in-flight Tavily requests
+    SEARCH_CACHE_ENABLED = True
+    SEARCH_CACHE_PATH = ".cache/search_results.sqlite3"
+    SEARCH_CACHE_TTL_SECONDS = 24 * 3600 # Web results go stale faster than LLM answers
+    SEARCH_CACHE_MAX_ENTRIES = 20_000
+    SEARCH_CACHE_SEMANTIC = False # Also reuse results of near-identical queries (embeds every query with EMBEDDING_MODEL)
+    SEARCH_CACHE_SIMILARITY = 0.95 # Cosine similarity a query needs to reuse another query's results
+    USE_RAW_CONTENT = True # Index the cleaned full page text instead of Tavily's snippet
+    MAX_DOCUMENT_BYTES = 50_000
+    MIN_DOCUMENT_CHARS = 200
+    NEAR_DUPLICATE_MAX_DISTANCE = 3 # SimHash Hamming distance at which two documents count as duplicates
     
     # RAG settings
+    EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    INFERENCE_BACKEND = "torch" # "torch", "torch-int8" or "onnx" (needs onnxruntime); falls back to torch
+    ONNX_QUANTIZE = True # With the onnx backend, run a dynamically int8-quantized graph
+    ONNX_MODEL_DIR = ".cache/onnx"
+    INFERENCE_BATCH_SIZE = 32
+    INFERENCE_THREADS = 0 # Intra-op threads for torch / ONNX Runtime; 0 keeps the library default
+    WARM_UP_MODELS = True # Load the models on a background thread at startup instead of on first use
     CHUNKS_TO_RETRIEVE = 20
     CHUNKS_TO_USE_FOR_WRITING = 7
+    # Adaptive retrieval: start small and only widen the search while the re-ranked chunks look thin.
+    # The budgets above then act as the later rounds' sizes and the cap on chunks sent to the writer.
+    ADAPTIVE_RETRIEVAL = True
+    ADAPTIVE_INITIAL_QUERIES = 2
+    ADAPTIVE_INITIAL_RESULTS = 3
+    ADAPTIVE_INITIAL_RETRIEVE = 10
+    ADAPTIVE_MAX_ROUNDS = 3 # At least 1
+    ADAPTIVE_SCORE_CUTOFF = 0.3 # Re-ranker probability below which a chunk is not sent to the writer
+    ADAPTIVE_MIN_RELEVANT = 4 # Stop widening once this many chunks clear the cutoff...
+    ADAPTIVE_MIN_SOURCES = 2 # ...from at least this many sources...
+    ADAPTIVE_MIN_TOP_SCORE = 0.6 # ...and the best chunk scores at least this
+    ADAPTIVE_MIN_CHUNKS = 2 # Always give the writer at least this many chunks
+    CORPUS_ANN_THRESHOLD = 20_000 # Switch the report corpus (and section scopes this large) from exact search to HNSW past this many chunks
+    CORPUS_HNSW_M = 32
+    # "dense" embeds every chunk; "hybrid" also ranks chunks with BM25 and fuses both rankings (RRF);
+    # "lexical_prefilter" only embeds the BM25 shortlist of each query, which saves most encoder work on raw-content corpora.
+    RETRIEVAL_MODE = "lexical_prefilter"
+    LEXICAL_PREFILTER_K = 100 # BM25 candidates scored densely per query
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    RRF_K = 60 # Reciprocal rank fusion constant; larger values flatten the rank weighting
+    RESTRICT_RETRIEVAL_TO_SECTION_SOURCES = False # Only retrieve from the current section's own search results, not the planning research or earlier sections' too
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_DIR = ".cache/embeddings"
+    EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+    EMBEDDING_CACHE_DTYPE = "float32" # "float16" halves disk and page-cache use
     
     # LLM settings
     WRITER_TEMPERATURE = 0.4
     PLANNER_TEMPERATURE = 0.2
+    LLM_CACHE_ENABLED = True
+    LLM_CACHE_PATH = ".cache/llm_responses.sqlite3"
+    LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES = 20_000
+    LLM_CACHE_SKIP_NONZERO_TEMPERATURE = False # Set to always get fresh samples for temperature > 0
+    BOUNDED_WRITER_CONTEXT = True # Replace the full report-so-far with outline + summaries + relevant passages
+    WRITER_CONTEXT_TOKEN_BUDGET = 2000
+    STREAM_WRITER = True # Stream section drafts token by token into the UI
+    UI_STREAM_FPS = 8 # Max chat re-renders per second while streaming
+
+    # Checkpoint settings
+    RUN_STORE_ENABLED = True # Save each completed stage so failed or interrupted runs can be resumed by ID
+    RUN_STORE_DIR = ".cache/runs"
+
+    # Export settings
+    EXPORT_CACHE_DIR = ".cache/exports"
+    EXPORT_WORKERS = 2 # Processes rendering PDF/HTML/DOCX exports
+    EXPORT_CACHE_MAX_FILES = 200
+    EXPORT_DOWNLOAD_TTL_SECONDS = 3600 # Per-download copies handed to Gradio are deleted after this long
+
+    # Observability settings
+    TRACING_ENABLED = True # Record a span tree per report (stage timings, token and chunk counts)
+    TRACE_DIR = ".cache/traces" # Per-report JSON traces; set to None to keep them in memory only
+    METRICS_PORT = None # Serve Prometheus metrics on this port (e.g. 9464)
+
+    # Citation verification settings
+    VERIFY_CITATIONS = True # Check each cited sentence against its source chunks with a local cross-encoder
+    VERIFIER_MODEL = None # None reuses RERANKER_MODEL; an NLI cross-encoder also works (its entailment label is read from the model config)
+    VERIFY_SUPPORT_THRESHOLD = 0.5 # Claims scoring at least this are accepted
+    VERIFY_REJECT_THRESHOLD = 0.05 # Claims scoring below this are flagged or removed without asking the LLM
+    VERIFY_ACTION = "flag" # "flag" marks unsupported claims, "remove" deletes them
+    VERIFY_ESCALATE_TO_LLM = True # Send claims scoring between the two thresholds to the LLM fact-checker
+    VERIFY_MAX_ESCALATIONS = 3 # Per section
+
+    # Concurrency settings
+    CONCURRENT_SECTIONS = True # Research all sections ahead of the (ordered) writer
+    MAX_CONCURRENT_SECTIONS = 4
+    MAX_CONCURRENT_SEARCHES = 4
+    MAX_CONCURRENT_LLM_CALLS = 4
+    MAX_CONCURRENT_RAG_JOBS = 2
+    MAX_CONCURRENT_REPORTS = 2 # Report jobs run at once in the app; later ones queue
+    OUTLINE_EXPANSION_MODE = "parallel" # "parallel", "batched" (one JSON call) or "sequential"
+    OUTLINE_EXPANSION_WORKERS = 8
@@ -0,0 +1,78 @@
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4 # Rough estimate for English prose; good enough for budgeting
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+class ReportContext:
+    """Bounded stand-in for the full 'report so far' handed to the section writer.
+
+    Combines the outline, a one-off summary of each finished section and the earlier paragraphs most
+    similar to the upcoming section, trimmed to a fixed token budget. `tokens_saved` counts the writer
+    prompt tokens saved against the full report; the summaries cost `summary_tokens` to produce, so
+    `net_tokens_saved` is the actual saving (negative when a report is too short to pay for its summaries).
+    """
+    def __init__(self, topic: str, section_titles: List[str], token_budget: int, encode: Callable[[List[str]], np.ndarray]):
+        self.topic = topic
+        self.section_titles = section_titles
+        self.token_budget = token_budget
+        self.encode = encode
+        self.summaries: List[Tuple[str, str]] = []
+        self.paragraphs: List[str] = []
+        self._paragraph_embeddings: List[np.ndarray] = []
+        self.tokens_saved = 0
+        self.summary_tokens = 0
+
+    @property
+    def net_tokens_saved(self) -> int:
+        return self.tokens_saved - self.summary_tokens
+
+    def add_section(self, title: str, text: str, summary: str, summary_tokens: int = 0):
+        """Records a finished section, and the tokens (prompt and reply) its summary cost. Called once per
+        section, so each paragraph is embedded only once."""
+        self.summaries.append((title, summary.strip()))
+        self.summary_tokens += summary_tokens
+        paragraphs = [p.strip() for p in text.split("\n\n") if len(p.strip()) > 80 and not p.lstrip().startswith("#")]
+        if paragraphs:
+            self.paragraphs.extend(paragraphs)
+            self._paragraph_embeddings.extend(self._normalize(self.encode(paragraphs)))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def build(self, section_title: str, section_description: str, full_report_text: str) -> str:
+        """Returns the writer context for the next section and tallies the tokens saved against full_report_text."""
+        outline = "\n".join(f"{i+1}. {title}" for i, title in enumerate(self.section_titles))
+        parts = [f"# Deep Research Report: {self.topic}\n\nOutline:\n{outline}"]
+        budget = self.token_budget - estimate_tokens(parts[0])
+
+        # Rolling summaries: the most recent sections matter most, so drop the oldest first.
+        summary_lines = []
+        for title, summary in reversed(self.summaries):
+            line = f"- {title}: {summary}"
+            if estimate_tokens(line) > budget: break
+            summary_lines.insert(0, line)
+            budget -= estimate_tokens(line)
+        if summary_lines:
+            parts.append("Summaries of completed sections:\n" + "\n".join(summary_lines))
+
+        if self.paragraphs and budget > 0:
+            query = self._normalize(self.encode([f"{section_title}\n{section_description}"]))[0]
+            scores = np.stack(self._paragraph_embeddings) @ query
+            chosen = []
+            for i in np.argsort(-scores):
+                cost = estimate_tokens(self.paragraphs[i])
+                if cost <= budget:
+                    chosen.append(i)
+                    budget -= cost
+            if chosen:
+                parts.append("Most relevant earlier passages:\n\n" + "\n\n".join(self.paragraphs[i] for i in sorted(chosen)))
+
+        context = "\n\n".join(parts)
+        self.tokens_saved += max(0, estimate_tokens(full_report_text) - estimate_tokens(context))
+        return context
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from .chunks import ChunkStore
+from .lexical import BM25Index
+
+class ReportCorpus:
+    """Report-scoped chunk index that sections add to incrementally.
+
+    Chunks are de-duplicated by (source URL, content hash) and stored as offsets into their documents. Vectors are L2-normalised and searched by
+    inner product (cosine) with an exact flat index, which is swapped for an HNSW graph once the corpus
+    grows past `ann_threshold` chunks. With `lexical=True` every chunk is also kept in a BM25 index, and
+    chunks may be added as text only (`add_document`) and given vectors later (`set_embeddings`), so only
+    lexical candidates ever need encoding.
+
+    Sections that add to the corpus concurrently should search within explicit chunk ids (see
+    `SectionScopes`), so what they retrieve does not depend on what other sections happened to add first.
+    Rankings break ties by the order of the given ids. Scopes of at least `ann_threshold` chunks are searched
+    through the HNSW graph as well, which makes them approximate.
+    """
+    def __init__(self, ann_threshold: int, hnsw_m: int = 32, hnsw_ef_search: int = 64, lexical: bool = False):
+        self.ann_threshold = ann_threshold
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.chunks = ChunkStore()
+        self.lexical = BM25Index() if lexical else None
+        self.shared: List[int] = [] # Chunks in every section's scope
+        self._ids_by_key: Dict[Tuple[str, str], int] = {}
+        self._ids_by_source: Dict[str, List[int]] = defaultdict(list)
+        self._embeddings: Optional[np.ndarray] = None # Over-allocated, one row per vector; only the first len(_row_ids) rows are valid
+        self._row_ids: List[int] = [] # Vector row -> chunk id
+        self._row_of: Dict[int, int] = {} # Chunk id -> vector row
+        self._index = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, chunks: List[Dict[str, str]], embeddings: np.ndarray):
+        if not chunks: return
+        self.set_embeddings(self.add_chunks(chunks), embeddings)
+
+    def add_chunks(self, chunks: List[Dict[str, str]]) -> List[int]:
+        """Adds standalone chunks without vectors. Returns their ids, one per chunk."""
+        return [i for chunk in chunks for i in self.add_document(chunk['source'], chunk['content'], [(0, len(chunk['content']))])]
+
+    def add_document(self, source: str, text: str, spans: List[Tuple[int, int]]) -> List[int]:
+        """Adds the (start, end) spans of a document's text as chunks, without vectors. Returns the id of every span.
+
+        A span whose text this source already has in the corpus keeps its existing id. Adding is atomic, so
+        once this returns every id is searchable (given a vector), whichever call first added it.
+        """
+        keys = [(source, hashlib.sha1(text[start:end].encode("utf-8")).hexdigest()) for start, end in spans]
+        with self._lock:
+            new_keys, new_spans = {}, []
+            for key, span in zip(keys, spans):
+                if key not in self._ids_by_key and key not in new_keys:
+                    new_keys[key] = None
+                    new_spans.append(span)
+            if new_spans:
+                new_ids = self.chunks.add_document(source, text, new_spans)
+                self._ids_by_source[source].extend(new_ids)
+                for key, i, (start, end) in zip(new_keys, new_ids, new_spans):
+                    self._ids_by_key[key] = i
+                    if self.lexical is not None: self.lexical.add(i, text[start:end])
+            return [self._ids_by_key[key] for key in keys]
+
+    def share(self, ids: Iterable[int]):
+        """Adds chunks to the shared scope every section retrieves from."""
+        with self._lock:
+            known = set(self.shared)
+            self.shared.extend(i for i in dict.fromkeys(ids) if i not in known)
+
+    def missing_vectors(self, ids: Iterable[int]) -> List[int]:
+        with self._lock:
+            return [i for i in ids if i not in self._row_of]
+
+    def set_embeddings(self, ids: List[int], embeddings: np.ndarray):
+        """Adds vectors for chunks already in the corpus (ids that already have one are skipped)."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        with self._lock:
+            first = {}
+            for n, i in enumerate(ids):
+                if i not in self._row_of: first.setdefault(i, n)
+            keep = list(first.values())
+            if not keep: return
+            ids, embeddings = [ids[n] for n in keep], embeddings[keep]
+            start = len(self._row_ids)
+            self._reserve(start + len(ids), embeddings.shape[1])
+            self._embeddings[start:start + len(ids)] = embeddings
+            for offset, chunk_id in enumerate(ids):
+                self._row_of[chunk_id] = start + offset
+            self._row_ids.extend(ids)
+
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(embeddings.shape[1])
+            if isinstance(self._index, faiss.IndexFlatIP) and len(self._row_ids) >= self.ann_threshold:
+                print(f"--> Corpus reached {len(self._row_ids)} chunks, switching to an HNSW index...")
+                self._index = faiss.IndexHNSWFlat(embeddings.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                self._index.hnsw.efSearch = self.hnsw_ef_search
+                self._index.add(self._embeddings[:len(self._row_ids)])
+            else:
+                self._index.add(embeddings)
+
+    def _reserve(self, size: int, dim: int):
+        if self._embeddings is None:
+            self._embeddings = np.empty((max(size, 256), dim), dtype=np.float32)
+        elif size > len(self._embeddings):
+            grown = np.empty((max(size, 2 * len(self._embeddings)), dim), dtype=np.float32)
+            grown[:len(self._row_ids)] = self._embeddings[:len(self._row_ids)]
+            self._embeddings = grown
+
+    def source_ids(self, sources: Iterable[str]) -> List[int]:
+        with self._lock:
+            return [i for source in dict.fromkeys(sources) for i in self._ids_by_source.get(source, [])]
+
+    def scope_ids(self, sources: Optional[Iterable[str]], ids: Optional[Iterable[int]]) -> Optional[List[int]]:
+        """The chunk ids allowed by a source filter and an id list (None: no limit), in the order given."""
+        if sources is None: return None if ids is None else list(dict.fromkeys(ids))
+        if ids is None: return self.source_ids(sources)
+        allowed = set(self.source_ids(sources))
+        return [i for i in dict.fromkeys(ids) if i in allowed]
+
+    def search(self, query_embedding: np.ndarray, k: int, sources: Optional[Iterable[str]] = None, ids: Optional[Iterable[int]] = None) -> List[int]:
+        """Returns ids of the k chunks closest to the query, optionally limited to the given source URLs and/or chunk ids.
+
+        Only chunks that have vectors can be returned.
+        """
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(query)
+        ids = self.scope_ids(sources, ids)
+        with self._lock:
+            if not self._row_ids: return []
+            if ids is not None:
+                ids = [i for i in ids if i in self._row_of]
+                if not ids: return []
+                rows = [self._row_of[i] for i in ids]
+                if isinstance(self._index, faiss.IndexHNSWFlat) and len(rows) >= self.ann_threshold:
+                    params = faiss.SearchParametersHNSW(sel=faiss.IDSelectorBatch(np.array(rows, dtype=np.int64)), efSearch=self.hnsw_ef_search)
+                    _, found = self._index.search(query, min(k, len(rows)), params=params)
+                    return [self._row_ids[int(row)] for row in found[0] if row >= 0]
+                # Below the ANN threshold exact scoring is cheap, and ties keep the scope's order.
+                scores = self._embeddings[rows] @ query[0]
+                return [ids[i] for i in np.argsort(-scores, kind="stable")[:k]]
+            _, rows = self._index.search(query, min(k, len(self._row_ids)))
+            return [self._row_ids[int(row)] for row in rows[0] if row >= 0]
+
+    def lexical_search(self, query: str, k: int, sources: Optional[Iterable[str]] = None, ids: Optional[Iterable[int]] = None) -> List[int]:
+        """Returns ids of the k best BM25 matches for the query (empty without a lexical index), limited like search."""
+        if self.lexical is None: return []
+        return [i for i, _ in self.lexical.search(query, k, self.scope_ids(sources, ids))]
+
+class SectionScopes:
+    """Hands each section of a report the chunk ids it retrieves from, the same however sections are scheduled.
+
+    Section i starts from the scope section i-1 had after its first retrieval: the shared chunks plus
+    the first-round chunks of every earlier section, in section order. `take` waits until that scope is
+    known, so call it after searching (and outside any concurrency slot an earlier section may need).
+    Every section must `pass_on` a scope, even one that fails or has nothing to research.
+    """
+    def __init__(self, shared: Iterable[int], sections: int):
+        self._scopes: List[Optional[List[int]]] = [list(shared)] + [None] * sections
+        self._ready = threading.Condition()
+
+    def take(self, i: int) -> List[int]:
+        """A copy of section i's starting scope, once section i-1 has passed it on."""
+        with self._ready:
+            self._ready.wait_for(lambda: self._scopes[i] is not None)
+            return list(self._scopes[i])
+
+    def pass_on(self, i: int, scope: List[int]):
+        """Sets the scope section i+1 starts from. Only the first call for a section counts."""
+        with self._ready:
+            if self._scopes[i + 1] is None:
+                self._scopes[i + 1] = list(scope)
+                self._ready.notify_all()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+class EmbeddingCache:
+    """Disk-backed, content-addressed embedding store with LRU eviction. Safe to share across threads and processes.
+
+    Vectors live in a fixed-capacity memory-mapped array, one record per slot holding the vector and the
+    key it was written for; an SQLite table maps sha1(model + text) to a slot and keeps LRU order. Writers
+    fill and claim slots under SQLite's write lock, and evicted slots are reused in place. A read only
+    counts if the slot still carries the requested key, so a slot another process has since reused (or a
+    write cut short by a crash) is a miss rather than some other text's vector. Hits refresh LRU order in
+    memory only; it is written back by the next put, by `flush`, or at most every FLUSH_SECONDS.
+    """
+    FLUSH_SECONDS = 60.0
+    QUERY_BATCH = 500 # Keys per SQL lookup, under SQLite's bound-parameter limit
+
+    def __init__(self, directory: str, model_name: str, dim: int, max_entries: int, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = max_entries
+        self.dtype = dtype
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {} # key -> last hit, not yet written to the index
+        self._last_flush = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^\w.-]+', '_', model_name)
+        path = os.path.join(directory, f"{slug}.{dtype}")
+        self._conn = sqlite3.connect(f"{path}.index.sqlite3", check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._records_path = f"{path}.slots"
+        self._record_type = np.dtype([("key", "u1", (20,)), ("vector", dtype, (dim,))])
+        self._open()
+
+    @contextmanager
+    def _write(self):
+        """A transaction holding SQLite's write lock, which also guards the slot records."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _open(self):
+        layout = f"{self.dim}x{self.capacity}"
+        with self._write():
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            row = self._conn.execute("SELECT value FROM meta WHERE name = 'layout'").fetchone()
+            reuse = row is not None and row[0] == layout and os.path.exists(self._records_path)
+            if not reuse: # Layout changed (or fresh cache): start over.
+                self._conn.execute("DELETE FROM entries")
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('layout', ?)", (layout,))
+            self._records = np.memmap(self._records_path, dtype=self._record_type, mode="r+" if reuse else "w+", shape=(self.capacity,))
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _slots(self, keys: List[str]) -> Dict[str, int]:
+        slots = {}
+        for start in range(0, len(keys), self.QUERY_BATCH):
+            batch = keys[start:start + self.QUERY_BATCH]
+            slots.update(self._conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall())
+        return slots
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Returns float32 vectors for every text already in the cache."""
+        keys = {text: self._key(text) for text in dict.fromkeys(texts)}
+        found, now = {}, time.time()
+        with self._lock:
+            slots = self._slots(list(keys.values()))
+            for text, key in keys.items():
+                slot = slots.get(key)
+                if slot is not None:
+                    vector = np.array(self._records["vector"][slot], dtype=np.float32)
+                    if self._records["key"][slot].tobytes() == bytes.fromhex(key): # Checked after the copy: a concurrent rewrite clears it first
+                        found[text] = vector
+                        self._touched[key] = now
+                        self.hits += 1
+                        continue
+                self.misses += 1
+            if self._touched and time.monotonic() - self._last_flush > self.FLUSH_SECONDS:
+                self._flush()
+        return found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        pending = {}
+        for text, vector in zip(texts, vectors):
+            pending.setdefault(self._key(text), vector)
+        now = time.time()
+        with self._lock, self._write():
+            self._write_touched()
+            existing = self._slots(list(pending))
+            new = [key for key in pending if key not in existing][:self.capacity]
+            if not new: return
+            used = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            slots = list(range(used, min(used + len(new), self.capacity))) # Slots fill up in order and are only freed by eviction
+            if len(slots) < len(new):
+                victims = self._conn.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (len(new) - len(slots),)).fetchall()
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+                slots += [slot for _, slot in victims]
+                self.evictions += len(victims)
+            for key, slot in zip(new, slots):
+                self._records["key"][slot] = 0 # Invalidate before overwriting, so readers of the old entry miss
+                self._records["vector"][slot] = pending[key]
+                self._records["key"][slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+            self._conn.executemany("INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)", [(key, slot, now) for key, slot in zip(new, slots)])
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _flush(self):
+        if self._touched:
+            with self._write(): self._write_touched()
+        self._records.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Writes hit recency back to the index and syncs the vectors to disk."""
+        with self._lock:
+            self._flush()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
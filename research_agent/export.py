@@ -1,18 +1,221 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
 import os
-import subprocess
+import re
 import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from .config import AgentConfig
+
+# Bump when the pandoc invocation changes, so cached renders from older code are not served.
+EXPORT_VERSION = 1
+
+EXPORT_FORMATS = {
+    "pdf": {"extension": "pdf", "tools": ("pandoc", "xelatex"), "options": {"toc": True, "fontsize": "12pt", "margin": "1in"}},
+    "html": {"extension": "html", "tools": ("pandoc",), "options": {"toc": True}},
+    "docx": {"extension": "docx", "tools": ("pandoc",), "options": {"toc": True}},
+    "md": {"extension": "zip", "tools": (), "options": {}}, # report.md plus sources.txt, no conversion
+}
+
+class ExportError(Exception):
+    """Raised when a report cannot be converted (missing tools or a failed pandoc run)."""
 
 def is_tool_installed(name):
     """Check whether `name` is on PATH and marked as executable."""
     return shutil.which(name) is not None
 
+def missing_tools(fmt: str) -> list:
+    return [tool for tool in EXPORT_FORMATS[fmt]["tools"] if not is_tool_installed(tool)]
+
+def _pandoc_command(markdown_path: str, output_path: str, fmt: str, options: Dict[str, Any]) -> list:
+    command = ["pandoc", markdown_path, "-o", output_path, "--from", "markdown"]
+    if fmt == "pdf":
+        command += [
+            "--to", "pdf",
+            "--pdf-engine", "xelatex",
+            "-V", f"geometry:margin={options['margin']}",
+            "-V", "mainfont:Latin Modern Roman", # Use a standard, high-quality LaTeX font
+            "-V", "sansfont:Latin Modern Sans", # Define a sans-serif font for headings
+            "-V", "monofont:Latin Modern Mono", # Define a monospaced font for code
+            "-V", f"fontsize={options['fontsize']}",
+        ]
+    elif fmt == "html":
+        command += ["--to", "html5", "--standalone", "--metadata", f"pagetitle={options.get('title') or 'Research Report'}"]
+    else:
+        command += ["--to", fmt]
+    if options.get("toc"): command.append("--toc")
+    return command
+
+def _write_bundle(markdown_content: str, output_path: str):
+    sources = re.findall(r"^\[\d+\] (\S+)$", markdown_content.split("## Master Bibliography", 1)[-1], re.MULTILINE)
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr("report.md", markdown_content)
+        bundle.writestr("sources.txt", "\n".join(sources) + "\n")
+
+def _render(markdown_content: str, fmt: str, options: Dict[str, Any], output_path: str) -> float:
+    """Renders one report into output_path. Runs in a pool worker; every render gets its own temp directory."""
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="report-export-") as workdir:
+        rendered_path = os.path.join(workdir, f"report.{EXPORT_FORMATS[fmt]['extension']}")
+        if fmt == "md":
+            _write_bundle(markdown_content, rendered_path)
+        else:
+            markdown_path = os.path.join(workdir, "report.md")
+            with open(markdown_path, "w", encoding="utf-8") as f:
+                f.write(markdown_content)
+            try:
+                # Run inside the temp dir so LaTeX intermediates never land in the working directory.
+                subprocess.run(_pandoc_command(markdown_path, rendered_path, fmt, options), check=True, capture_output=True, text=True, cwd=workdir)
+            except FileNotFoundError:
+                raise ExportError("Pandoc or LaTeX command not found.")
+            except subprocess.CalledProcessError as e:
+                raise ExportError(f"Pandoc failed.\nSTDOUT: {e.stdout}\nSTDERR: {e.stderr}")
+        # Move into place in one step so readers never see a half-written file.
+        shutil.move(rendered_path, f"{output_path}.tmp")
+        os.replace(f"{output_path}.tmp", output_path)
+    return time.perf_counter() - started
+
+class ExportService:
+    """Converts reports in a bounded process pool, caching outputs by content hash and export options.
+
+    Identical concurrent requests share a single render. The pool is started on the first cache miss.
+    """
+    def __init__(self, cache_dir: str = ".cache/exports", max_workers: int = 2, max_cached_files: int = 200):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_cached_files = max_cached_files
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.render_seconds: Dict[str, list] = {fmt: [] for fmt in EXPORT_FORMATS}
+
+    def _cache_path(self, markdown_content: str, fmt: str, options: Dict[str, Any]) -> str:
+        payload = json.dumps({"v": EXPORT_VERSION, "format": fmt, "options": options}, sort_keys=True) + "\0" + markdown_content
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}.{EXPORT_FORMATS[fmt]['extension']}")
+
+    @staticmethod
+    def _options(fmt: str, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if fmt not in EXPORT_FORMATS: raise ExportError(f"Unsupported export format: {fmt}")
+        return {**EXPORT_FORMATS[fmt]["options"], **(options or {})}
+
+    def submit(self, markdown_content: str, fmt: str = "pdf", options: Optional[Dict[str, Any]] = None) -> Future:
+        """Starts an export and returns a future of {"path", "format", "cached", "seconds"}. Raises ExportError early for unknown formats or missing tools."""
+        options = self._options(fmt, options)
+        path = self._cache_path(markdown_content, fmt, options)
+        with self._lock:
+            try:
+                os.utime(path) # Keeps recently used exports out of the pruning
+                cached = True
+            except OSError: # Not rendered yet, or pruned (pruning does not take the lock): a miss
+                cached = False
+            if cached:
+                self.hits += 1
+                done: Future = Future()
+                done.set_result({"path": path, "format": fmt, "cached": True, "seconds": 0.0})
+                return done
+            if path in self._in_flight: return self._in_flight[path]
+            missing = missing_tools(fmt)
+            if missing: raise ExportError(f"{fmt.upper()} export needs {', '.join(missing)} installed and on your PATH.")
+            self.misses += 1
+            if not EXPORT_FORMATS[fmt]["tools"]:
+                # Nothing to convert: cheaper to write here than to hand the report to another process.
+                os.makedirs(self.cache_dir, exist_ok=True)
+                seconds = _render(markdown_content, fmt, options, path)
+                self.render_seconds[fmt].append(seconds)
+                done = Future()
+                done.set_result({"path": path, "format": fmt, "cached": False, "seconds": seconds})
+                return done
+            if self._executor is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Spawned, not forked: forking a process that runs model and server threads can deadlock the child.
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            render = self._executor.submit(_render, markdown_content, fmt, options, path)
+            result: Future = Future()
+            self._in_flight[path] = result
+
+        def finish(render: Future):
+            with self._lock:
+                self._in_flight.pop(path, None)
+            error = render.exception()
+            if error is not None:
+                result.set_exception(error)
+                return
+            seconds = render.result()
+            self.render_seconds[fmt].append(seconds)
+            print(f"-> Exported {fmt} in {seconds:.2f}s")
+            self._prune()
+            result.set_result({"path": path, "format": fmt, "cached": False, "seconds": seconds})
+        render.add_done_callback(finish)
+        return result
+
+    def export(self, markdown_content: str, fmt: str = "pdf", output_path: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Blocking export; copies the result to output_path when given."""
+        started = time.perf_counter()
+        result = self.submit(markdown_content, fmt, options).result()
+        if output_path: result = self._deliver(result, markdown_content, fmt, options, output_path)
+        return {**result, "wall_seconds": time.perf_counter() - started}
+
+    async def aexport(self, markdown_content: str, fmt: str = "pdf", output_path: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Like export, but waits for the render and the copy without blocking the event loop."""
+        started = time.perf_counter()
+        result = await asyncio.wrap_future(self.submit(markdown_content, fmt, options))
+        if output_path: result = await asyncio.to_thread(self._deliver, result, markdown_content, fmt, options, output_path)
+        return {**result, "wall_seconds": time.perf_counter() - started}
+
+    def _deliver(self, result: Dict[str, Any], markdown_content: str, fmt: str, options: Optional[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+        """Copies a cached export to output_path, rendering it there instead if pruning removed it first."""
+        try:
+            shutil.copyfile(result["path"], output_path)
+            return {**result, "path": output_path}
+        except OSError:
+            seconds = _render(markdown_content, fmt, self._options(fmt, options), output_path)
+            return {**result, "path": output_path, "cached": False, "seconds": seconds}
+
+    def _prune(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if not name.endswith(".tmp")]
+        if len(files) <= self.max_cached_files: return
+        for path in sorted(files, key=os.path.getmtime)[:len(files) - self.max_cached_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        timings = {fmt: {"renders": len(s), "mean_seconds": sum(s) / len(s)} for fmt, s in self.render_seconds.items() if s}
+        return {"hits": self.hits, "misses": self.misses, "renders": timings}
+
+    def shutdown(self):
+        if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True)
+
+def prune_download_dirs(root: str, max_age_seconds: float):
+    """Removes per-download directories under root that were created more than max_age_seconds ago."""
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff: shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+export_service = ExportService(AgentConfig.EXPORT_CACHE_DIR, AgentConfig.EXPORT_WORKERS, AgentConfig.EXPORT_CACHE_MAX_FILES)
+
 def export_to_pdf(markdown_content: str, output_filename: str):
+    """Renders the report to output_filename as a LaTeX-quality PDF. Returns False (with the reason printed) on failure."""
     # Pandoc and LaTeX check
     if not is_tool_installed("pandoc"):
         print("🔴 ERROR: Pandoc is not installed or not in your system's PATH.")
         print("Please install it from https://pandoc.org/installing.html")
         return False
-    
+
     # Simple check for a latex distribution, might not be foolproof
     if not is_tool_installed("xelatex"):
         print("🔴 ERROR: A LaTeX distribution (like MiKTeX or TeX Live) is not installed or not in your system's PATH.")
@@ -20,43 +223,13 @@ def export_to_pdf(markdown_content: str, output_filename: str):
         print("TeX Live (Multi-platform): https://www.tug.org/texlive/")
         return False
 
-    markdown_filename = "temp_report.md"
     print(f"-> Exporting report to {output_filename} via LaTeX...")
-    
-    # 1. Save the final markdown to a temporary file
-    with open(markdown_filename, "w", encoding="utf-8") as f:
-        f.write(markdown_content)
-        
-    command = [
-        "pandoc",
-        markdown_filename,
-        "-o", output_filename,
-        "--from", "markdown",
-        "--to", "pdf",
-        "--pdf-engine", "xelatex",
-        "-V", "geometry:margin=1in",
-        "-V", "mainfont:Latin Modern Roman", # Use a standard, high-quality LaTeX font
-        "-V", "sansfont:Latin Modern Sans", # Define a sans-serif font for headings
-        "-V", "monofont:Latin Modern Mono", # Define a monospaced font for code
-        "-V", "fontsize=12pt",
-        "--toc",
-    ]
-    
     try:
-        # 3. Run the command
-        process = subprocess.run(command, check=True, capture_output=True, text=True)
-        print(f"-> Successfully created PDF: {output_filename}")
-        os.remove(markdown_filename)
-        return True
-    except FileNotFoundError:
-        print("🔴 ERROR: Pandoc or LaTeX command not found.")
-        print("Please ensure both Pandoc and a LaTeX distribution (like MiKTeX/TeX Live) are installed and in your system's PATH.")
-        os.remove(markdown_filename)
-        return False
-    except subprocess.CalledProcessError as e:
+        export_service.export(markdown_content, "pdf", output_filename)
+    except ExportError as e:
         print("--- PANDOC ERROR ---")
-        print(f"STDOUT: {e.stdout}")
-        print(f"STDERR: {e.stderr}")
+        print(e)
         print("--------------------")
-        os.remove(markdown_filename)
-        return False 
\ No newline at end of file
+        return False
+    print(f"-> Successfully created PDF: {output_filename}")
+    return True
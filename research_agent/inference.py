@@ -0,0 +1,327 @@
+import inspect
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Every backend exposes the slice of the sentence-transformers API the pipeline uses (encode and
+# get_sentence_embedding_dimension, or predict), so they are drop-in replacements for each other.
+# "torch" is the stock fp32 model, "torch-int8" dynamically quantizes its Linear layers, and "onnx"
+# runs an exported ONNX Runtime graph (int8-quantized with ONNX_QUANTIZE). onnxruntime is optional:
+# a backend that fails to load falls back to "torch".
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+def _set_threads(threads: int):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+class TorchEmbedder:
+    def __init__(self, model, batch_size: int, backend: str = "torch"):
+        self.model = model
+        self.batch_size = batch_size
+        self.backend = backend
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=show_progress_bar)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+def activate(scores: np.ndarray, activation: str) -> np.ndarray:
+    """Applies "sigmoid", "softmax" (over the last axis) or "identity"."""
+    scores = np.asarray(scores, dtype=np.float32)
+    if activation == "sigmoid":
+        return 1 / (1 + np.exp(-scores))
+    if activation == "softmax":
+        exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+    return scores
+
+def as_probabilities(scores: np.ndarray, activation: str = "identity", positive_label: int = 1) -> np.ndarray:
+    """Maps re-ranker output to one probability per pair.
+
+    `activation` is what the output still needs ("sigmoid" for a single logit, "softmax" for label logits,
+    "identity" if predict already applied one); with several labels, the `positive_label` column is kept.
+    The choice comes from the model, never from the values, so a pair's probability does not depend on its batch.
+    """
+    scores = activate(scores, activation)
+    return scores[:, positive_label] if scores.ndim == 2 else scores
+
+def _head(cross_encoder) -> Dict:
+    """Number of labels, the activation predict applies and the positive label of a sentence-transformers CrossEncoder."""
+    config = getattr(cross_encoder, "config", None) or cross_encoder.model.config # The model config moved across versions
+    num_labels = getattr(cross_encoder, "num_labels", None) or config.num_labels
+    activation = getattr(cross_encoder, "activation_fn", None) or getattr(cross_encoder, "default_activation_function", None)
+    labels = [str(label).lower() for _, label in sorted((int(i), label) for i, label in (getattr(config, "id2label", None) or {}).items())]
+    # NLI models score "entailment"; otherwise keep the convention of label 1 as the positive one.
+    positive = next((i for i, label in enumerate(labels) if label.startswith("entail")), 1 if num_labels > 1 else 0)
+    return {"num_labels": num_labels, "activation": type(activation).__name__.lower() if activation is not None else "identity", "positive_label": positive}
+
+def _remaining_activation(applied: str, num_labels: int) -> str:
+    """The activation still needed for probabilities after predict applied `applied`."""
+    if applied != "identity": return "identity"
+    return "sigmoid" if num_labels == 1 else "softmax"
+
+class TorchReranker:
+    """predict returns what the CrossEncoder returns: one score per pair, or a row of label scores with several labels.
+    `activation` and `positive_label` say how as_probabilities turns them into probabilities."""
+    def __init__(self, model, batch_size: int, backend: str = "torch"):
+        self.model = model
+        self.batch_size = batch_size
+        self.backend = backend
+        head = _head(model)
+        self.activation = _remaining_activation(head["activation"], head["num_labels"])
+        self.positive_label = head["positive_label"]
+
+    def predict(self, pairs: Sequence[Sequence[str]], show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=show_progress_bar)
+
+def _load_torch_embedder(name: str, quantize: bool):
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(name, device='cpu')
+    if quantize:
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def _load_torch_reranker(name: str, quantize: bool):
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(name, device='cpu')
+    if quantize:
+        import torch
+        # CrossEncoder became an nn.Module in sentence-transformers 4; before that it wrapped one in .model.
+        if isinstance(model, torch.nn.Module):
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+class OnnxModel:
+    """An ONNX Runtime session plus the tokenizer and post-processing metadata saved at export time."""
+    def __init__(self, model_dir: str, quantize: bool, threads: int):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        path = os.path.join(model_dir, "model.int8.onnx" if quantize else "model.onnx")
+        if quantize and not os.path.exists(path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(os.path.join(model_dir, "model.onnx"), path, weight_type=QuantType.QInt8)
+        options = ort.SessionOptions()
+        if threads: options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def run(self, *texts, batch_size: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Tokenizes single texts or text pairs in batches and returns (first output, attention_mask) per batch."""
+        results = []
+        for start in range(0, len(texts[0]), batch_size):
+            batch = [list(t[start:start + batch_size]) for t in texts]
+            encoded = self.tokenizer(*batch, padding=True, truncation=True, max_length=self.meta["max_seq_length"], return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            results.append((self.session.run(None, feed)[0], encoded["attention_mask"]))
+        return results
+
+def _export_dir(base_dir: str, name: str) -> str:
+    return os.path.join(base_dir, re.sub(r'[^\w.-]+', '_', name))
+
+def _export_onnx(torch_model, tokenizer, model_dir: str, meta: Dict, pair: bool):
+    """Exports a HF transformer to ONNX with dynamic batch and sequence axes."""
+    import torch
+
+    class FirstOutput(torch.nn.Module):
+        # Fixed positional signature and a single tensor output, whatever the transformers version.
+        def __init__(self, model, input_names):
+            super().__init__()
+            self.model, self.input_names = model, input_names
+        def forward(self, *inputs):
+            return self.model(**dict(zip(self.input_names, inputs)), return_dict=False)[0]
+
+    os.makedirs(model_dir, exist_ok=True)
+    sample = tokenizer(*((["query"], ["passage"]) if pair else (["sample text"],)), return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic_axes = {k: {0: "batch", 1: "sequence"} for k in input_names}
+    dynamic_axes["output"] = {0: "batch"} if pair else {0: "batch", 1: "sequence"} # logits vs. token embeddings
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one handles dynamic_axes fine.
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(FirstOutput(torch_model, input_names), tuple(sample[k] for k in input_names), os.path.join(model_dir, "model.onnx"),
+                          input_names=input_names, output_names=["output"], dynamic_axes=dynamic_axes, opset_version=14, **legacy)
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+class OnnxEmbedder:
+    """Mean-pooled sentence embeddings from an ONNX export of a SentenceTransformer."""
+    backend = "onnx"
+
+    def __init__(self, name: str, base_dir: str, quantize: bool, batch_size: int, threads: int):
+        model_dir = _export_dir(base_dir, name)
+        if not os.path.exists(os.path.join(model_dir, "meta.json")):
+            print(f"-> Exporting {name} to ONNX...")
+            from sentence_transformers import SentenceTransformer
+            from sentence_transformers.models import Normalize
+            st = SentenceTransformer(name, device='cpu')
+            meta = {"max_seq_length": st.max_seq_length, "dim": st.get_sentence_embedding_dimension(), "normalize": any(isinstance(m, Normalize) for m in st)}
+            _export_onnx(st[0].auto_model, st.tokenizer, model_dir, meta, pair=False)
+        self.model = OnnxModel(model_dir, quantize, threads)
+        self.batch_size = batch_size
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        batches = []
+        for token_embeddings, mask in self.model.run(texts, batch_size=self.batch_size):
+            mask = mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.model.meta["normalize"]:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches) if batches else np.zeros((0, self.model.meta["dim"]), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.meta["dim"]
+
+class OnnxReranker:
+    """Cross-encoder scores from an ONNX export, shaped and activated like the torch model's (see TorchReranker)."""
+    backend = "onnx"
+
+    def __init__(self, name: str, base_dir: str, quantize: bool, batch_size: int, threads: int):
+        model_dir = _export_dir(base_dir, name)
+        if not self._exported(model_dir):
+            print(f"-> Exporting {name} to ONNX...")
+            from sentence_transformers import CrossEncoder
+            ce = CrossEncoder(name, device='cpu')
+            meta = {"max_seq_length": ce.max_length or 512, **_head(ce)}
+            _export_onnx(ce.model, ce.tokenizer, model_dir, meta, pair=True)
+        self.model = OnnxModel(model_dir, quantize, threads)
+        self.batch_size = batch_size
+        meta = self.model.meta
+        self.activation = _remaining_activation(meta["activation"], meta["num_labels"])
+        self.positive_label = meta["positive_label"]
+
+    @staticmethod
+    def _exported(model_dir: str) -> bool:
+        try:
+            with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+                return "num_labels" in json.load(f) # Older exports lack the label metadata and are redone
+        except (OSError, ValueError):
+            return False
+
+    def predict(self, pairs: Sequence[Sequence[str]], show_progress_bar: bool = False) -> np.ndarray:
+        meta = self.model.meta
+        if not len(pairs): return np.zeros((0, meta["num_labels"]) if meta["num_labels"] > 1 else 0, dtype=np.float32)
+        queries, passages = zip(*pairs)
+        logits = np.concatenate([output for output, _ in self.model.run(queries, passages, batch_size=self.batch_size)])
+        if meta["num_labels"] == 1: logits = logits[:, 0]
+        return activate(logits, meta["activation"])
+
+def load_embedder(name: str, backend: str, batch_size: int, threads: int, onnx_dir: str, onnx_quantize: bool):
+    """Loads the embedder for `backend`, falling back to fp32 torch if it fails; the result's `backend` says which it is."""
+    _set_threads(threads)
+    if backend == "onnx":
+        try:
+            return OnnxEmbedder(name, onnx_dir, onnx_quantize, batch_size, threads)
+        except Exception as e:
+            print(f"Warning: ONNX embedding backend unavailable, falling back to torch. Error: {e}")
+    elif backend == "torch-int8":
+        try:
+            return TorchEmbedder(_load_torch_embedder(name, quantize=True), batch_size, backend)
+        except Exception as e:
+            print(f"Warning: int8 quantization failed, falling back to fp32 torch. Error: {e}")
+    return TorchEmbedder(_load_torch_embedder(name, quantize=False), batch_size)
+
+def load_reranker(name: str, backend: str, batch_size: int, threads: int, onnx_dir: str, onnx_quantize: bool):
+    """Loads the re-ranker for `backend`, falling back to fp32 torch if it fails; the result's `backend` says which it is."""
+    _set_threads(threads)
+    if backend == "onnx":
+        try:
+            return OnnxReranker(name, onnx_dir, onnx_quantize, batch_size, threads)
+        except Exception as e:
+            print(f"Warning: ONNX re-ranking backend unavailable, falling back to torch. Error: {e}")
+    elif backend == "torch-int8":
+        try:
+            return TorchReranker(_load_torch_reranker(name, quantize=True), batch_size, backend)
+        except Exception as e:
+            print(f"Warning: int8 quantization failed, falling back to fp32 torch. Error: {e}")
+    return TorchReranker(_load_torch_reranker(name, quantize=False), batch_size)
+
+# --- Accuracy check against the fp32 baseline ---
+ACCURACY_QUERIES = [
+    "How do vertical farms control light for plant growth?",
+    "What are the economic risks of lithium mining?",
+    "Which treatments reduce symptoms of seasonal allergies?",
+    "How did the Apollo program train astronauts for lunar landings?",
+]
+ACCURACY_CORPUS = [
+    "Vertical farms rely on LED arrays tuned to red and blue wavelengths to drive photosynthesis indoors.",
+    "Hydroponic systems deliver nutrients through water, removing the need for soil in stacked growing racks.",
+    "Energy for artificial lighting is the largest operating cost for most indoor farms.",
+    "Lithium prices swung sharply between 2021 and 2023 as new brine and hard-rock projects came online.",
+    "Mining projects face permitting delays, water-use disputes and volatile commodity prices.",
+    "Battery makers sign long-term offtake agreements to secure lithium supply.",
+    "Antihistamines block histamine receptors and relieve sneezing and itching caused by pollen.",
+    "Nasal corticosteroid sprays reduce inflammation and are a first-line treatment for hay fever.",
+    "Allergen immunotherapy gradually desensitises the immune system over several years.",
+    "Apollo crews practised landings in the Lunar Landing Training Vehicle, a jet-powered simulator.",
+    "Geology field trips taught astronauts to identify and sample rocks on the Moon.",
+    "Centrifuge runs prepared crews for the high g-loads of launch and re-entry.",
+]
+
+def compare_rankings(baseline_embedder, candidate_embedder, baseline_reranker, candidate_reranker, k: int = 3,
+                     queries: Optional[List[str]] = None, corpus: Optional[List[str]] = None) -> Dict[str, float]:
+    """Compares a candidate backend with the fp32 baseline on a fixed corpus.
+
+    Reports mean top-k overlap of the retrieval and re-ranking orders, and the largest absolute
+    difference in re-ranker probabilities.
+    """
+    queries, corpus = queries or ACCURACY_QUERIES, corpus or ACCURACY_CORPUS
+
+    def retrieval_order(embedder) -> np.ndarray:
+        docs, qs = np.asarray(embedder.encode(corpus), dtype=np.float32), np.asarray(embedder.encode(queries), dtype=np.float32)
+        docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+        qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+        return np.argsort(-(qs @ docs.T), axis=1)[:, :k]
+
+    def rerank_scores(reranker) -> np.ndarray:
+        return np.stack([as_probabilities(reranker.predict([[q, d] for d in corpus]), reranker.activation, reranker.positive_label) for q in queries])
+
+    def overlap(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(a, b)]))
+
+    base_scores, cand_scores = rerank_scores(baseline_reranker), rerank_scores(candidate_reranker)
+    return {
+        "retrieval_topk_overlap": overlap(retrieval_order(baseline_embedder), retrieval_order(candidate_embedder)),
+        "rerank_topk_overlap": overlap(np.argsort(-base_scores, axis=1)[:, :k], np.argsort(-cand_scores, axis=1)[:, :k]),
+        "rerank_max_abs_diff": float(np.max(np.abs(base_scores - cand_scores))),
+    }
+
+def check_backend(backend: str, config) -> Dict[str, float]:
+    """Runs compare_rankings for `backend` against fp32 torch with the config's models.
+
+    Raises RuntimeError if either candidate model fell back to another backend, since the comparison
+    would then not measure `backend` at all.
+    """
+    options = dict(batch_size=config.INFERENCE_BATCH_SIZE, threads=config.INFERENCE_THREADS, onnx_dir=config.ONNX_MODEL_DIR, onnx_quantize=config.ONNX_QUANTIZE)
+    embedder, reranker = load_embedder(config.EMBEDDING_MODEL, backend, **options), load_reranker(config.RERANKER_MODEL, backend, **options)
+    fallbacks = [f"{model} loaded as {loaded.backend}" for model, loaded in ((config.EMBEDDING_MODEL, embedder), (config.RERANKER_MODEL, reranker)) if loaded.backend != backend]
+    if fallbacks: raise RuntimeError(f"The {backend} backend is unavailable: {'; '.join(fallbacks)}.")
+    return compare_rankings(load_embedder(config.EMBEDDING_MODEL, "torch", **options), embedder, load_reranker(config.RERANKER_MODEL, "torch", **options), reranker)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from .config import AgentConfig
+
+    parser = argparse.ArgumentParser(description="Check an inference backend's rankings against the fp32 torch baseline.")
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx")
+    args = parser.parse_args()
+    try:
+        result = check_backend(args.backend, AgentConfig())
+    except RuntimeError as e:
+        print(f"🔴 ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps({"backend": args.backend, **result}, indent=2))
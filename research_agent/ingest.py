@@ -0,0 +1,107 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+BOILERPLATE_LINE = re.compile(
+    r"^(accept( all)? cookies?|we use cookies|cookie (policy|settings)|subscribe|sign (up|in)|log ?in|share (this|on)|"
+    r"advertisement|all rights reserved|privacy policy|terms (of|and) (use|service|conditions)|skip to (main )?content|"
+    r"read more|related (articles|posts)|follow us|back to top|©)", re.IGNORECASE)
+TRACKING_PARAM = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref)$", re.IGNORECASE)
+WORD = re.compile(r"\w+")
+
+def canonical_url(url: str) -> str:
+    """Normalises a URL so trivially different links to the same page compare equal."""
+    parts = urlsplit(url.strip())
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAM.match(k)])
+    host = parts.netloc.lower().removeprefix("www.")
+    return urlunsplit((parts.scheme.lower() or "https", host, parts.path.rstrip("/") or "/", query, ""))
+
+def iter_clean_lines(text: str) -> Iterator[str]:
+    """Lazily yields normalised content lines, dropping navigation, boilerplate and repeats."""
+    seen = set()
+    for match in re.finditer(r"[^\n]+", text):
+        line = " ".join(unicodedata.normalize("NFKC", match.group()).split())
+        if not line or BOILERPLATE_LINE.match(line): continue
+        # Menus and link lists are short fragments without sentence punctuation.
+        if len(line.split()) < 4 and not line.endswith((".", "!", "?", ":")): continue
+        if line in seen: continue
+        seen.add(line)
+        yield line
+
+def simhash(text: str, bits: int = 64) -> int:
+    """SimHash (up to 64 bits) over word 3-shingles; near-identical texts differ in only a few bits."""
+    words = WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    # One row of bits per shingle, reversed so column b is bit b of the big-endian hash; a bit is set if most shingles set it.
+    ones = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)[:, ::-1].sum(axis=0)
+    return sum(1 << int(bit) for bit in np.flatnonzero(2 * ones[:bits] > len(shingles)))
+
+class DocumentIngestor:
+    """Report-scoped stage between search and RAG: picks raw page text, cleans it, caps it and drops duplicates.
+
+    Documents are de-duplicated by canonical URL and by SimHash distance, across every batch ingested
+    for the report. Safe to share between threads, but concurrently researched sections should each take a
+    `fork`: with a shared ingestor, which section keeps a page shared by several depends on timing.
+    """
+    def __init__(self, use_raw_content: bool, max_bytes: int, near_duplicate_distance: int, min_chars: int):
+        self.use_raw_content = use_raw_content
+        self.max_bytes = max_bytes
+        self.near_duplicate_distance = near_duplicate_distance
+        self.min_chars = min_chars
+        self.duplicates_skipped = 0
+        self._seen_urls = set()
+        self._fingerprints: List[int] = []
+        self._parent: Optional["DocumentIngestor"] = None
+        self._lock = threading.Lock()
+
+    def fork(self, skip_seen: bool = True) -> "DocumentIngestor":
+        """A new ingestor that skips everything ingested here so far (unless skip_seen is False), but not what either ingests later. Its skips count here too."""
+        child = DocumentIngestor(self.use_raw_content, self.max_bytes, self.near_duplicate_distance, self.min_chars)
+        if skip_seen:
+            with self._lock:
+                child._seen_urls, child._fingerprints = set(self._seen_urls), list(self._fingerprints)
+        child._parent = self
+        return child
+
+    def _skip(self):
+        ingestor = self
+        while ingestor is not None:
+            with ingestor._lock: ingestor.duplicates_skipped += 1
+            ingestor = ingestor._parent
+
+    def _clean(self, text: str) -> str:
+        lines, size = [], 0
+        for line in iter_clean_lines(text):
+            size += len(line.encode("utf-8")) + 1
+            if size > self.max_bytes: break # Stop reading the page once the cap is hit
+            lines.append(line)
+        return "\n".join(lines)
+
+    def ingest(self, results: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+        """Yields cleaned, unique documents as {"content", "source"} dicts, one result at a time."""
+        for result in results:
+            url = canonical_url(result['source'])
+            with self._lock:
+                duplicate = url in self._seen_urls
+                self._seen_urls.add(url)
+            if duplicate:
+                self._skip()
+                continue
+
+            content = self._clean(result['raw_content']) if self.use_raw_content and result.get('raw_content') else ""
+            if len(content) < self.min_chars:
+                content = result['content'] # Extraction failed or page was thin: keep Tavily's snippet
+            fingerprint = simhash(content)
+            with self._lock:
+                duplicate = any(bin(fingerprint ^ seen).count("1") <= self.near_duplicate_distance for seen in self._fingerprints)
+                if not duplicate: self._fingerprints.append(fingerprint)
+            if duplicate:
+                self._skip()
+                continue
+            yield {"content": content, "source": result['source']}
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+class Job:
+    """A single report run. Updates from the report generator are relayed through `events`."""
+    def __init__(self, job_id: str, make_stream: Callable[[], Iterator[str]]):
+        self.id = job_id
+        self.make_stream = make_stream
+        self.status = "queued" # queued -> running -> done | failed | cancelled
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue()
+        self.cancel_event = threading.Event()
+
+class JobScheduler:
+    """Runs report jobs on a fixed-size worker pool, so several users can generate reports at once.
+
+    Jobs queue in submission order; each caller follows its own job with `stream()`. Cancellation is
+    cooperative: a queued job never starts, a running one stops at its next progress update.
+    """
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._jobs: Dict[str, Job] = {}
+        self._waiting: List[str] = []
+        self._lock = threading.Lock()
+
+    def submit(self, make_stream: Callable[[], Iterator[str]]) -> Job:
+        job = Job(uuid.uuid4().hex[:12], make_stream)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._waiting.append(job.id)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def queue_position(self, job_id: str) -> int:
+        """1-based position among jobs waiting for a worker, or 0 once the job has started."""
+        with self._lock:
+            return self._waiting.index(job_id) + 1 if job_id in self._waiting else 0
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"): return False
+        job.cancel_event.set()
+        return True
+
+    def _run(self, job: Job):
+        with self._lock:
+            self._waiting.remove(job.id)
+        if job.cancel_event.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.status, job.started_at = "running", time.time()
+        stream = job.make_stream()
+        try:
+            for update in stream:
+                if job.cancel_event.is_set():
+                    stream.close()
+                    self._finish(job, "cancelled")
+                    return
+                job.events.put(("update", update))
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, "failed")
+            return
+        self._finish(job, "done")
+
+    def _finish(self, job: Job, status: str):
+        job.status, job.finished_at = status, time.time()
+        job.events.put((status, job.error))
+
+    def stream(self, job_id: str, poll_interval: float = 1.0) -> Iterator[Tuple[str, Optional[str]]]:
+        """Yields (kind, payload) events for one job until it ends, then forgets the job.
+
+        Kinds are 'queued' (payload: queue position), 'update' (payload: report text), 'idle' (a running job
+        sent nothing for poll_interval seconds), and finally one of 'done', 'failed' (payload: error message)
+        or 'cancelled'.
+        """
+        job = self._jobs[job_id]
+        try:
+            if job.status == "queued":
+                yield "queued", str(self.queue_position(job_id))
+            while True:
+                try:
+                    kind, payload = job.events.get(timeout=poll_interval)
+                except queue.Empty:
+                    if job.status == "queued":
+                        yield "queued", str(self.queue_position(job_id))
+                    else:
+                        yield "idle", None
+                    continue
+                yield kind, payload
+                if kind != "update": return
+        finally:
+            # If the consumer went away mid-run, nobody is left to read the report.
+            job.cancel_event.set()
+            self._jobs.pop(job_id, None)
+
+    def shutdown(self):
+        for job in list(self._jobs.values()): job.cancel_event.set()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Numbers keep their decimal and thousands separators ("4.5", "1,200") so figures match as one token.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were which with "
+    "what how why when who will can into about than then there these those also not but more most such".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring. Documents are identified by caller-chosen integer ids."""
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict) # token -> {doc id: term frequency}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: int, text: str):
+        counts = Counter(tokenize(text))
+        with self._lock:
+            for token, count in counts.items():
+                self._postings[token][doc_id] = count
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+
+    def search(self, query: str, k: int, ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Returns up to k (doc id, score) pairs, best first, optionally limited to the given ids.
+
+        With ids, document frequencies and the average length are taken over those documents only, and ties
+        keep their order, so scores do not change as other documents are added to the index.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        scores: Dict[int, float] = defaultdict(float)
+        with self._lock:
+            if ids is None:
+                order, n = None, len(self._lengths)
+                avg_length = self._total_length / n if n else 0.0
+            else:
+                order = {doc_id: rank for rank, doc_id in enumerate(dict.fromkeys(ids)) if doc_id in self._lengths}
+                n = len(order)
+                avg_length = sum(self._lengths[doc_id] for doc_id in order) / n if n else 0.0
+            if not n: return []
+            for token in tokens:
+                postings = self._postings.get(token)
+                if not postings: continue
+                if order is not None:
+                    postings = {doc_id: postings[doc_id] for doc_id in order if doc_id in postings} if len(order) < len(postings) else \
+                               {doc_id: tf for doc_id, tf in postings.items() if doc_id in order}
+                    if not postings: continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        tie_break = (lambda doc_id: doc_id) if order is None else order.__getitem__
+        return sorted(scores.items(), key=lambda item: (-item[1], tie_break(item[0])))[:k]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merges ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
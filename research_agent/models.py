@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class SerializedModel:
+    """A shared model whose encode and predict calls run one at a time under the registry's inference lock.
+
+    Everything else (dimension, activation, ...) is passed through to the wrapped model.
+    """
+    def __init__(self, model: Any, lock: threading.Lock):
+        self.model = model
+        self._lock = lock
+
+    def encode(self, *args, **kwargs):
+        with self._lock:
+            return self.model.encode(*args, **kwargs)
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self.model.predict(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+class ModelRegistry:
+    """Process-wide cache of loaded models, so every pipeline and worker shares one copy of the weights.
+
+    Models load on first use. Concurrent first requests for the same model wait for a single load
+    instead of each loading a copy. Models are handed out wrapped in SerializedModel, so no caller can
+    run inference on them concurrently.
+    """
+    def __init__(self):
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._load_seconds: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        # Shared models serve every concurrent report. HF fast tokenizers are not safe to call from several
+        # threads at once, and torch already parallelises each forward pass, so inference is serialised.
+        self.inference_lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, loader: Callable[[], Any]) -> Any:
+        key = (kind, name)
+        model = self._models.get(key)
+        if model is not None: return model
+        with self._registry_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._models:
+                print(f"-> Loading {kind} model {name}...")
+                started = time.perf_counter()
+                self._models[key] = SerializedModel(loader(), self.inference_lock)
+                self._load_seconds[key] = time.perf_counter() - started
+                print(f"-> Loaded {kind} model {name} in {self._load_seconds[key]:.2f}s")
+            return self._models[key]
+
+    def embedding_model(self, name: str, backend: str = "torch", **options):
+        """Returns the shared embedder for (name, backend). options go to inference.load_embedder on first load."""
+        from .inference import load_embedder # Deferred: importing torch alone takes seconds
+        return self._get("embedding", f"{name} [{backend}]", lambda: load_embedder(name, backend, **options))
+
+    def reranker(self, name: str, backend: str = "torch", **options):
+        from .inference import load_reranker
+        return self._get("reranker", f"{name} [{backend}]", lambda: load_reranker(name, backend, **options))
+
+    def warm_up(self, loaders: List[Callable[[], Any]], background: bool = True) -> Optional[threading.Thread]:
+        """Runs the given model getters now, on a daemon thread by default, so the first report doesn't pay for them."""
+        def load_all():
+            for load in loaders: load()
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def load_times(self) -> List[Tuple[str, str, float]]:
+        return [(kind, name, seconds) for (kind, name), seconds in self._load_seconds.items()]
+
+model_registry = ModelRegistry()
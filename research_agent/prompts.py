@@ -78,8 +78,10 @@ class Prompts:
     BRIEF_CONSTRUCTOR = """Synthesize the user's request into a single, concise, and factual research topic string suitable for a report title. Do NOT add conversational preamble. Initial Topic: '{initial_topic}'. User's Refinements: '{user_answers}'. Synthesized Topic String:"""
     PLANNER = """Your sole task is to create a report outline for the topic: '{topic}'. Use context: {context}. You MUST respond with ONLY a valid JSON object with a "sections" key. Each section MUST have a "title" and a "description"."""
     OUTLINE_EXPANDER = """Given the report section '{section_title}: {section_description}', generate 3-5 specific sub-topics or key questions to investigate. Respond with a simple bulleted list."""
+    OUTLINE_EXPANDER_BATCH = """For each numbered report section below, generate 3-5 specific sub-topics or key questions to investigate.\n\n{outline}\n\nYou MUST respond with ONLY a valid JSON object like this: {{"expansions": [{{"section": 1, "sub_topics": ["sub-topic 1", "sub-topic 2"]}}]}}"""
     WRITER_SYSTEM = "You are a distinguished academic researcher. Your primary function is to synthesize information ONLY from the provided research materials. You MUST ignore prior knowledge and base your writing exclusively on the text provided. You are meticulous about citing sources. Every factual statement MUST be followed by an in-text citation in the format [Source X]."
     SECTION_WRITER = """**Report So Far (for context and to avoid repetition):**\n---\n{previous_sections_context}\n---\n\nNow, using the following research material, write the next section of the report: '## {section_title}'. CITE EVERY FACT. Ensure your writing flows naturally.\n\n**Research Material for this Section:**\n---\n{research}\n---"""
+    SECTION_SUMMARIZER = """Summarize the following report section in 2-3 sentences (under 80 words), keeping its key facts and figures. Respond with ONLY the summary.\n\nSection '{section_title}':\n---\n{section_text}\n---"""
     VERIFICATION_PROMPT = """
 Here is a draft of a report section and the source material it was based on.
 Your task is to act as a fact-checker. Read the draft and verify three things:
@@ -1,54 +1,201 @@
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional, Tuple
 import numpy as np
-import faiss
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer, CrossEncoder
 
+from . import tracing
+from .chunks import SentenceSplitter
 from .config import AgentConfig
+from .embedding_cache import EmbeddingCache
+from .inference import as_probabilities
+from .corpus import ReportCorpus
+from .lexical import reciprocal_rank_fusion
+from .models import ModelRegistry, model_registry
 
 class RAGPipeline:
-    def __init__(self, config: AgentConfig):
+    def __init__(self, config: AgentConfig, registry: ModelRegistry = model_registry):
+        """Cheap to construct: models come from the shared registry and load on first use (or via warm_up)."""
         self.config = config
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-        print("-> Loading embedding model...")
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-        print("-> Loading re-ranking model...")
-        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', device='cpu')
-
-    def run(self, research_data: List[Dict[str, str]], query: str, top_k: int) -> List[Dict[str, str]]:
-        if not research_data: return []
+        self.registry = registry
+        self.text_splitter = SentenceSplitter(chunk_size=1000, chunk_overlap=150)
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._cache_lock = threading.Lock()
+
+    def _backend_options(self) -> dict:
+        return dict(batch_size=self.config.INFERENCE_BATCH_SIZE, threads=self.config.INFERENCE_THREADS, onnx_dir=self.config.ONNX_MODEL_DIR, onnx_quantize=self.config.ONNX_QUANTIZE)
+
+    @property
+    def embedding_model(self):
+        return self.registry.embedding_model(self.config.EMBEDDING_MODEL, self.config.INFERENCE_BACKEND, **self._backend_options())
+
+    @property
+    def reranker(self):
+        return self.registry.reranker(self.config.RERANKER_MODEL, self.config.INFERENCE_BACKEND, **self._backend_options())
+
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        # Opened lazily because its layout depends on the embedding dimension, which needs the model.
+        if self._embedding_cache is None and self.config.EMBEDDING_CACHE_ENABLED:
+            with self._cache_lock:
+                if self._embedding_cache is None:
+                    dim = self.embedding_model.get_sentence_embedding_dimension()
+                    # Quantized backends produce slightly different vectors, so they get their own cache namespace.
+                    self._embedding_cache = EmbeddingCache(self.config.EMBEDDING_CACHE_DIR, f"{self.config.EMBEDDING_MODEL}-{self.config.INFERENCE_BACKEND}", dim, self.config.EMBEDDING_CACHE_MAX_ENTRIES, self.config.EMBEDDING_CACHE_DTYPE)
+        return self._embedding_cache
+
+    def flush(self):
+        """Persists what the embedding cache holds only in memory (hit recency). Called at the end of each report."""
+        if self._embedding_cache is not None:
+            self._embedding_cache.flush()
+
+    def warm_up(self, background: bool = True):
+        """Starts loading the models ahead of the first report."""
+        return self.registry.warm_up([lambda: self.embedding_model, lambda: self.reranker], background)
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embeds arbitrary text with the pipeline's embedding model, bypassing the chunk cache."""
+        return np.asarray(self.embedding_model.encode(texts, show_progress_bar=False), dtype=np.float32)
+
+    @property
+    def verifier(self):
+        """Cross-encoder used to check claims against their sources; the re-ranker unless VERIFIER_MODEL is set."""
+        if not self.config.VERIFIER_MODEL: return self.reranker
+        return self.registry.reranker(self.config.VERIFIER_MODEL, self.config.INFERENCE_BACKEND, **self._backend_options())
+
+    @staticmethod
+    def _probabilities(model, scores) -> np.ndarray:
+        # The activation comes from the model's config; stand-ins without one already return probabilities.
+        return as_probabilities(scores, getattr(model, "activation", "identity"), getattr(model, "positive_label", 1))
+
+    def rerank_scores(self, query: str, passages: List[str]) -> np.ndarray:
+        """Cross-encoder relevance probabilities for (query, passage) pairs."""
+        reranker = self.reranker
+        return self._probabilities(reranker, reranker.predict([[query, passage] for passage in passages], show_progress_bar=False))
+
+    def verify_scores(self, pairs: List[tuple]) -> np.ndarray:
+        """Support probabilities for (claim, source text) pairs, in one batched call."""
+        if not pairs: return np.zeros(0, dtype=np.float32)
+        verifier = self.verifier
+        return self._probabilities(verifier, verifier.predict([list(pair) for pair in pairs], show_progress_bar=False))
+
+    def _encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """Embeds chunks, serving repeats from the embedding cache so only new text hits the encoder."""
+        embedding_cache = self.embedding_cache
+        if embedding_cache is None:
+            return self.embed_texts(chunks)
+        cached = embedding_cache.get_many(chunks)
+        missing = list(dict.fromkeys(chunk for chunk in chunks if chunk not in cached))
+        if missing:
+            new_embeddings = self.embed_texts(missing)
+            embedding_cache.put_many(missing, new_embeddings)
+            cached.update(zip(missing, new_embeddings))
+        print(f"--> Embedding cache: {len(chunks) - len(missing)}/{len(chunks)} chunks reused")
+        tracing.record(embedding_cache_hits=len(chunks) - len(missing))
+        return np.stack([cached[chunk] for chunk in chunks])
+
+    def new_corpus(self) -> ReportCorpus:
+        """Creates an empty corpus that a report's sections can share."""
+        if self.config.RETRIEVAL_MODE not in ("dense", "hybrid", "lexical_prefilter"):
+            raise ValueError(f"Unsupported retrieval mode: {self.config.RETRIEVAL_MODE}")
+        corpus = ReportCorpus(self.config.CORPUS_ANN_THRESHOLD, self.config.CORPUS_HNSW_M, lexical=self.config.RETRIEVAL_MODE != "dense")
+        if corpus.lexical is not None:
+            corpus.lexical.k1, corpus.lexical.b = self.config.BM25_K1, self.config.BM25_B
+        return corpus
+
+    def index_documents(self, corpus: ReportCorpus, research_data: List[Dict[str, str]]) -> List[int]:
+        """Splits and embeds documents into the corpus. Returns the ids of their chunks, in document order.
+
+        Chunks the corpus already holds are not added again but keep their ids in the result. In
+        lexical_prefilter mode chunks are only added to the BM25 index; they are embedded when they first
+        make a query's lexical shortlist.
+        """
+        with tracing.span("index", documents=len(research_data)):
+            ids = []
+            for item in research_data:
+                ids += corpus.add_document(item['source'], item['content'], self.text_splitter.split_offsets(item['content']))
+            ids = list(dict.fromkeys(ids))
+            if self.config.RETRIEVAL_MODE != "lexical_prefilter":
+                missing = corpus.missing_vectors(ids) # Includes chunks another section added but has not embedded yet
+                if missing: corpus.set_embeddings(missing, self._encode_chunks(corpus.chunks.texts(missing)))
+            tracing.record(chunks=len(ids))
+            return ids
+
+    def _retrieve(self, corpus: ReportCorpus, query: str, k: int, sources: Optional[List[str]], scope: Optional[List[int]] = None) -> List[int]:
+        """Candidate chunk ids for the re-ranker, according to RETRIEVAL_MODE, limited to `sources` and `scope` when given.
+
+        dense: nearest neighbours of the query embedding. hybrid: BM25 and dense rankings merged with
+        reciprocal rank fusion. lexical_prefilter: the BM25 shortlist is embedded (where not already) and
+        only it is scored densely, then both rankings are fused.
+        """
+        mode = self.config.RETRIEVAL_MODE
+        if mode == "dense" or corpus.lexical is None:
+            return corpus.search(self.embed_texts([query]), k, sources, scope)
+        if mode == "hybrid":
+            lexical = corpus.lexical_search(query, k, sources, scope)
+            dense = corpus.search(self.embed_texts([query]), k, sources, scope)
+            return reciprocal_rank_fusion([lexical, dense], self.config.RRF_K)[:k]
+
+        with tracing.span("lexical", corpus_size=len(corpus)):
+            lexical = corpus.lexical_search(query, max(k, self.config.LEXICAL_PREFILTER_K), sources, scope)
+            # No term overlap at all: fall back to scoring everything in scope densely.
+            in_scope = corpus.scope_ids(sources, scope)
+            candidates = lexical or (in_scope if in_scope is not None else list(range(len(corpus))))
+            missing = corpus.missing_vectors(candidates)
+            if missing:
+                corpus.set_embeddings(missing, self._encode_chunks(corpus.chunks.texts(missing)))
+            tracing.record(candidates=len(candidates), embedded=len(missing))
+        dense = corpus.search(self.embed_texts([query]), k, ids=candidates)
+        return reciprocal_rank_fusion([lexical[:k], dense], self.config.RRF_K)[:k]
+
+    def run(self, research_data: List[Dict[str, str]], query: str, top_k: int, corpus: Optional[ReportCorpus] = None, sources: Optional[List[str]] = None,
+            scope: Optional[List[int]] = None) -> List[Dict[str, str]]:
+        """Indexes research_data and returns the top_k re-ranked chunks for the query.
+
+        With a shared corpus, retrieval covers everything indexed so far for the report; `sources` limits it
+        to chunks from those URLs. With a `scope` list, retrieval is limited to the chunk ids in it plus the
+        chunks of research_data, which are appended to it.
+        """
+        return [meta for meta, score in self.run_scored(research_data, query, top_k, corpus, sources, scope=scope)]
+
+    def run_scored(self, research_data: List[Dict[str, str]], query: str, top_k: int, corpus: Optional[ReportCorpus] = None, sources: Optional[List[str]] = None,
+                   retrieve_k: Optional[int] = None, score_cache: Optional[Dict[str, float]] = None, scope: Optional[List[int]] = None) -> List[Tuple[Dict[str, str], float]]:
+        """Like run, but returns (chunk, re-ranker score) pairs, best first.
+
+        `retrieve_k` overrides CHUNKS_TO_RETRIEVE. Chunks found in `score_cache` (content -> score) are not
+        re-scored, and new scores are added to it, so repeated calls for one query only re-rank new chunks.
+        Passing the same `scope` list to repeated calls likewise lets each retrieve from all chunks so far.
+        """
+        if corpus is None:
+            if not research_data: return []
+            corpus = self.new_corpus()
         
         # Indexing
         print(f"--> Indexing {len(research_data)} documents...")
-        all_chunks, metadata = [], []
-        for item in research_data:
-            chunks = self.text_splitter.split_text(item['content'])
-            for chunk in chunks:
-                all_chunks.append(chunk)
-                metadata.append({"source": item['source'], "content": chunk})
-
-        if not all_chunks: return []
-        
-        embeddings = self.embedding_model.encode(all_chunks, show_progress_bar=False)
-        index = faiss.IndexFlatL2(embeddings.shape[1]); index.add(np.array(embeddings, dtype=np.float32))
+        ids = self.index_documents(corpus, research_data)
+        print(f"--> Indexed {len(ids)} chunks (corpus size: {len(corpus)})")
+        if not len(corpus): return []
+        if scope is not None:
+            known = set(scope)
+            scope.extend(i for i in ids if i not in known)
         
         # Retrieval
         print("--> Retrieving relevant chunks...")
-        query_embedding = self.embedding_model.encode([query])
-        k_retrieve = min(len(all_chunks), self.config.CHUNKS_TO_RETRIEVE)
-        if k_retrieve == 0: return []
-        _, indices = index.search(np.array(query_embedding, dtype=np.float32), k=k_retrieve)
+        with tracing.span("retrieve", corpus_size=len(corpus), mode=self.config.RETRIEVAL_MODE):
+            indices = self._retrieve(corpus, query, retrieve_k or self.config.CHUNKS_TO_RETRIEVE, sources, scope)
+            tracing.record(chunks=len(indices))
+        if not indices: return []
         
         # Re-ranking
         print("--> Re-ranking for quality...")
-        retrieved_chunks = [all_chunks[i] for i in indices[0]]
+        retrieved_metadata = [corpus.chunks[i] for i in indices]
+        score_cache = {} if score_cache is None else score_cache
+        unscored = [meta['content'] for meta in retrieved_metadata if meta['content'] not in score_cache]
         
-        pairs = [[query, chunk] for chunk in retrieved_chunks]
-        scores = self.reranker.predict(pairs, show_progress_bar=False)
+        if unscored:
+            with tracing.span("rerank", pairs=len(unscored)):
+                score_cache.update(zip(unscored, (float(score) for score in self.rerank_scores(query, unscored))))
         
         # Combine chunks with their original metadata and scores
-        retrieved_metadata = [metadata[i] for i in indices[0]]
-        ranked_results = sorted(zip(retrieved_metadata, scores), key=lambda x: x[1], reverse=True)
+        ranked_results = sorted(((meta, score_cache[meta['content']]) for meta in retrieved_metadata), key=lambda x: x[1], reverse=True)
         
         # Return the top_k results
-        return [meta for meta, score in ranked_results[:top_k]]
+        return ranked_results[:top_k]
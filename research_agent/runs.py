@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+class Run:
+    """Checkpoint of one report run. Every update is written through to the store immediately.
+
+    Layout of `data`: the original request and answers, `brief`, `sections` (the expanded outline),
+    `section_results` (per section index: `queries`, `chunks`, `draft` with section-local citations,
+    `sources` mapping those citation numbers to URLs, and `summary`), plus `status` and the final `report`.
+    """
+    def __init__(self, store: "RunStore", data: Dict[str, Any]):
+        self.store = store
+        self.data = data
+        self._lock = threading.Lock()
+
+    @property
+    def id(self) -> str:
+        return self.data["id"]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def update(self, **fields):
+        with self._lock:
+            self.data.update(fields)
+            self.store.save(self)
+
+    def section(self, index: int) -> Dict[str, Any]:
+        """The saved results for one section (empty if nothing was checkpointed yet)."""
+        return self.data["section_results"].get(str(index), {})
+
+    def section_sources(self, index: int) -> Dict[int, str]:
+        return {int(num): url for num, url in self.section(index).get("sources", {}).items()} # JSON keys are strings
+
+    def update_section(self, index: int, **fields):
+        with self._lock:
+            self.data["section_results"].setdefault(str(index), {}).update(fields)
+            self.store.save(self)
+
+    def reset_section(self, index: int, refresh_research: bool = False):
+        """Forgets a section's draft (and optionally its research) so the next resume regenerates it."""
+        if not 0 <= index < len(self.data.get("sections") or []):
+            raise ValueError(f"Run {self.id} has no section {index + 1}.")
+        with self._lock:
+            results = self.data["section_results"].get(str(index), {})
+            for key in ("draft", "sources", "summary") + (("queries", "chunks") if refresh_research else ()):
+                results.pop(key, None)
+            self.data["status"] = "incomplete"
+            self.data.pop("report", None)
+            self.store.save(self)
+
+class RunStore:
+    """Local store of report checkpoints, one JSON file per run, written atomically."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.json")
+
+    def create(self, user_request: str, user_answers: str) -> Run:
+        now = time.time()
+        data = {"id": uuid.uuid4().hex[:12], "created_at": now, "updated_at": now, "status": "running",
+                "user_request": user_request, "user_answers": user_answers, "section_results": {}}
+        run = Run(self, data)
+        self.save(run)
+        return run
+
+    def load(self, run_id: str) -> Run:
+        if not run_id.isalnum(): raise KeyError(run_id) # Run IDs are hex; anything else could escape the directory
+        try:
+            with open(self._path(run_id), "r", encoding="utf-8") as f:
+                return Run(self, json.load(f))
+        except FileNotFoundError:
+            raise KeyError(run_id) from None
+
+    def save(self, run: Run):
+        run.data["updated_at"] = time.time()
+        tmp_path = f"{self._path(run.id)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(run.data, f)
+        os.replace(tmp_path, self._path(run.id))
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """Summaries of every stored run, newest first."""
+        runs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"): continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            done = sum(1 for result in data.get("section_results", {}).values() if "draft" in result)
+            runs.append({"id": data["id"], "topic": data.get("user_request"), "status": data.get("status"), "updated_at": data.get("updated_at"),
+                         "sections_done": done, "sections": len(data.get("sections") or [])})
+        return sorted(runs, key=lambda run: run["updated_at"] or 0, reverse=True)
+
+    def delete(self, run_id: str) -> bool:
+        try:
+            os.remove(self._path(run_id))
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,37 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from .config import AgentConfig
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class SectionScheduler:
+    """Bounded scheduler that runs per-section work ahead of the report writer."""
+    def __init__(self, config: AgentConfig):
+        self.config = config
+        self._limits = {
+            "search": threading.BoundedSemaphore(config.MAX_CONCURRENT_SEARCHES),
+            "llm": threading.BoundedSemaphore(config.MAX_CONCURRENT_LLM_CALLS),
+            "rag": threading.BoundedSemaphore(config.MAX_CONCURRENT_RAG_JOBS),
+        }
+
+    @contextmanager
+    def limit(self, stage: str):
+        """Holds one of the 'search', 'llm' or 'rag' slots for the duration of the block."""
+        with self._limits[stage]:
+            yield
+
+    def run_ahead(self, fn: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+        """Submits fn for every item at once and yields the results in input order."""
+        executor = ThreadPoolExecutor(max_workers=self.config.MAX_CONCURRENT_SECTIONS, thread_name_prefix="section")
+        futures = [executor.submit(fn, item) for item in items]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            # Stop queued work if the consumer bails out early (error or closed generator).
+            for future in futures: future.cancel()
+            executor.shutdown(wait=False)
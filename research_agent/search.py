@@ -0,0 +1,153 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from . import tracing
+from .config import AgentConfig
+from .search_cache import SearchCache
+
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+class RateLimitError(Exception):
+    """Raised by a provider when the upstream API asks us to back off."""
+
+class SearchProvider:
+    """Minimal interface for a web search backend. Results use Tavily's shape: dicts with 'url' and 'content'."""
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+class TavilySearchProvider(SearchProvider):
+    """Tavily REST backend over a single pooled HTTP/1.1 keep-alive client."""
+    def __init__(self, api_key: str, search_depth: str = "advanced", max_connections: int = 10):
+        self.api_key = api_key
+        self.search_depth = search_depth
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the loop that actually runs the searches.
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(limits=limits, timeout=None, headers={"Authorization": f"Bearer {self.api_key}"})
+        return self._client
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        payload = {"query": query, "search_depth": self.search_depth, "max_results": num_results, "include_raw_content": True}
+        response = await self._get_client().post(TAVILY_SEARCH_URL, json=payload)
+        if response.status_code == 429:
+            raise RateLimitError(f"Tavily rate limit hit (HTTP 429) for '{query}'")
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class FakeSearchProvider(SearchProvider):
+    """Offline provider returning canned (or synthetic) results after a set latency. For tests and benchmarks."""
+    def __init__(self, results: Optional[Dict[str, List[Dict[str, Any]]]] = None, latency: float = 0.0, latencies: Optional[Dict[str, float]] = None):
+        self.results = results or {}
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.calls: List[str] = []
+
+    async def search(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        self.calls.append(query)
+        await asyncio.sleep(self.latencies.get(query, self.latency))
+        if query in self.results:
+            return self.results[query][:num_results]
+        slug = re.sub(r'[^a-z0-9]+', '-', query.lower()).strip('-')[:60]
+        return [{"url": f"https://example.com/{slug}/{i}", "content": f"Synthetic result {i} for '{query}'.", "raw_content": None} for i in range(num_results)]
+
+class AsyncSearcher:
+    """Fans a batch of queries out concurrently on a shared background event loop.
+
+    Every caller, from any thread, goes through the same loop, so the provider's connection
+    pool and the global concurrency limit are shared across sections and reports. With a `cache`,
+    fresh results for the same (or, with semantic lookup, a near-identical) query skip the provider.
+    """
+    def __init__(self, provider: SearchProvider, config: AgentConfig, cache: Optional[SearchCache] = None):
+        self.provider = provider
+        self.cache = cache
+        self.timeout = config.SEARCH_TIMEOUT_SECONDS
+        self.max_retries = config.SEARCH_MAX_RETRIES
+        self.backoff = config.SEARCH_BACKOFF_SECONDS
+        self.max_concurrency = config.MAX_CONCURRENT_SEARCH_REQUESTS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="search-loop", daemon=True).start()
+            return self._loop
+
+    async def _search_one(self, query: str, num_results: int, span: Optional[tracing.Span] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        if self.cache is None: return await self._fetch(query, num_results)
+        loop = asyncio.get_running_loop()
+        settings = SearchCache.make_settings(provider=type(self.provider).__name__, depth=getattr(self.provider, "search_depth", None), num_results=num_results)
+        # Cache lookups may embed the query, so they run off the event loop. Without use_cache the fresh results still refresh the entry.
+        cached = await loop.run_in_executor(None, self.cache.get, query, settings) if use_cache else None
+        if cached is not None:
+            if span is not None: span.add(cache_hits=1, semantic_cache_hits=int(cached[1]), cache_seconds_saved=cached[2])
+            return cached[0]
+        started = time.perf_counter()
+        results = await self._fetch(query, num_results)
+        if results: # Empty answers are often transient; ask again next time
+            await loop.run_in_executor(None, self.cache.put, query, settings, results, time.perf_counter() - started)
+        return results
+
+    async def _fetch(self, query: str, num_results: int) -> List[Dict[str, Any]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(self.provider.search(query, num_results), self.timeout)
+            except RateLimitError:
+                if attempt == self.max_retries: raise
+                delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+                print(f"-> Search rate limited, retrying '{query[:60]}' in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def _gather(self, queries: List[str], num_results: int, span: Optional[tracing.Span] = None, use_cache: bool = True) -> List[Dict[str, str]]:
+        # Runs on the background loop, which is single-threaded, so lazy creation is race-free.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        outcomes = await asyncio.gather(*(self._search_one(q, num_results, span, use_cache) for q in queries), return_exceptions=True)
+        research = []
+        for query, outcome in zip(queries, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"Tavily search failed for '{query}': {outcome!r}")
+                if span is not None: span.add(errors=1)
+                continue
+            for result in outcome:
+                if result.get('content') and result.get('url'):
+                    research.append({"content": result['content'], "source": result['url'], "raw_content": result.get('raw_content')})
+        return research
+
+    async def asearch(self, queries: List[str], num_results: int, use_cache: bool = True) -> List[Dict[str, str]]:
+        """Searches all non-empty queries at once. Awaitable from any event loop. use_cache=False skips cache lookups."""
+        queries = [q for q in queries if q]
+        future = asyncio.run_coroutine_threadsafe(self._gather(queries, num_results, tracing.current_span(), use_cache), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def search(self, queries: List[str], num_results: int, use_cache: bool = True) -> List[Dict[str, str]]:
+        """Blocking wrapper around asearch for synchronous callers."""
+        queries = [q for q in queries if q]
+        return asyncio.run_coroutine_threadsafe(self._gather(queries, num_results, tracing.current_span(), use_cache), self._ensure_loop()).result()
+
+    def close(self) -> None:
+        if self._loop is None: return
+        asyncio.run_coroutine_threadsafe(self.provider.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PUNCTUATION = "\"'`.,;:!?()[]{}<>*_~-\u2013\u2014\u2022"
+
+def normalize_query(query: str) -> str:
+    """Case, surrounding punctuation, bullets and whitespace do not change what a search returns ("gpt-4", "4.5" and "c++" stay intact)."""
+    tokens = (token.strip(TOKEN_PUNCTUATION) for token in unicodedata.normalize("NFKC", query).lower().split())
+    return " ".join(token for token in tokens if token)
+
+class SearchCache:
+    """SQLite-backed cache of search results keyed by normalized query and result settings.
+
+    Entries expire after `ttl_seconds`; past `max_entries` the least recently used rows are evicted. With an
+    `embed` function, a query with no exact entry can reuse the results of the most similar earlier query
+    under the same settings, if their embeddings have a cosine similarity of at least `similarity_threshold`. The time
+    each entry's original search took is stored, so hits can report the latency they saved. Safe to share
+    across threads.
+    """
+    EVICT_EVERY = 100 # Puts between eviction sweeps
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, embed: Optional[Callable[[List[str]], np.ndarray]] = None, similarity_threshold: float = 0.95):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.hits = self.semantic_hits = self.misses = 0
+        self.seconds_saved = 0.0
+        self._puts = 0
+        self._vectors: Dict[str, Tuple[List[str], np.ndarray]] = {} # settings -> (keys, unit vectors), loaded on first semantic lookup
+        self._query_vectors: Dict[str, np.ndarray] = {} # So a miss's put does not embed the query a second time
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, query TEXT NOT NULL, settings TEXT NOT NULL, results TEXT NOT NULL, "
+                               "seconds REAL NOT NULL, embedding BLOB, created_at REAL NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    @staticmethod
+    def make_settings(**settings: Any) -> str:
+        return json.dumps(settings, sort_keys=True)
+
+    @staticmethod
+    def make_key(query: str, settings: str) -> str:
+        return hashlib.sha256(f"{settings}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def _embed(self, query: str) -> np.ndarray:
+        query = normalize_query(query)
+        vector = self._query_vectors.get(query)
+        if vector is None:
+            vector = np.asarray(self.embed([query]), dtype=np.float32)[0]
+            vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            if len(self._query_vectors) >= 1024: self._query_vectors.clear()
+            self._query_vectors[query] = vector
+        return vector
+
+    def _fresh_row(self, key: str, now: float):
+        row = self._conn.execute("SELECT results, seconds, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[2] > self.ttl_seconds: return None
+        self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return row
+
+    def get(self, query: str, settings: str) -> Optional[Tuple[List[Dict[str, Any]], bool, float]]:
+        """Returns (results, semantic, seconds the original search took) for a fresh entry, or None."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._fresh_row(self.make_key(query, settings), now)
+            if row is not None:
+                self.hits += 1
+                self.seconds_saved += row[1]
+                return json.loads(row[0]), False, row[1]
+        if self.embed is None:
+            with self._lock: self.misses += 1
+            return None
+
+        vector = self._embed(query) # Outside the lock: the encoder is the slow part
+        with self._lock, self._conn:
+            keys, matrix = self._load_vectors(settings, len(vector))
+            if keys:
+                similarities = matrix @ vector
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.similarity_threshold: break
+                    row = self._fresh_row(keys[i], now)
+                    if row is None: continue
+                    self.semantic_hits += 1
+                    self.seconds_saved += row[1]
+                    return json.loads(row[0]), True, row[1]
+            self.misses += 1
+            return None
+
+    def _load_vectors(self, settings: str, dim: int) -> Tuple[List[str], np.ndarray]:
+        if settings not in self._vectors:
+            rows = self._conn.execute("SELECT key, embedding FROM results WHERE settings = ? AND embedding IS NOT NULL", (settings,)).fetchall()
+            rows = [(key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows if len(blob) == 4 * dim] # Skip vectors from another embedding model
+            self._vectors[settings] = ([key for key, _ in rows], np.stack([v for _, v in rows]) if rows else np.zeros((0, dim), dtype=np.float32))
+        return self._vectors[settings]
+
+    def put(self, query: str, settings: str, results: List[Dict[str, Any]], seconds: float):
+        now = time.time()
+        key = self.make_key(query, settings)
+        vector = self._embed(query) if self.embed is not None else None
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO results (key, query, settings, results, seconds, embedding, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, normalize_query(query), settings, json.dumps(results), seconds, vector.tobytes() if vector is not None else None, now, now))
+            if vector is not None and settings in self._vectors:
+                keys, matrix = self._vectors[settings]
+                if len(vector) == matrix.shape[1] and key not in keys:
+                    self._vectors[settings] = (keys + [key], np.vstack([matrix, vector]))
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._vectors.clear() # Reloaded without the evicted rows on the next semantic lookup
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0, "seconds_saved": self.seconds_saved}
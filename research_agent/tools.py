@@ -1,50 +1,133 @@
 import json
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterator, Optional
 
 import google.generativeai as genai
 from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
-from tavily import TavilyClient
 
+from . import tracing
 from .config import AgentConfig
+from .context import estimate_tokens
+from .llm_cache import LLMResponseCache
+from .search import AsyncSearcher, SearchProvider, TavilySearchProvider
+from .search_cache import SearchCache
+
+SAFETY_SETTINGS = [
+    {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+    {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
+]
 
 class AITools:
-    def __init__(self, config: AgentConfig, api_keys: Dict[str, str]):
+    def __init__(self, config: AgentConfig, api_keys: Dict[str, str], search_provider: Optional[SearchProvider] = None):
         self.config = config
         genai.configure(api_key=api_keys['google'])
-        self.tavily = TavilyClient(api_key=api_keys['tavily'])
-
-    def text_completion(self, prompt: str, temperature: float) -> str:
-        model = genai.GenerativeModel(self.config.WRITER_MODEL)
-        generation_config = GenerationConfig(temperature=temperature)
-        safety_settings = [
-            {"category": HarmCategory.HARM_CATEGORY_HATE_SPEECH, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-            {"category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-            {"category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-            {"category": HarmCategory.HARM_CATEGORY_HARASSMENT, "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH},
-        ]
-        try:
-            response = model.generate_content(prompt, generation_config=generation_config, safety_settings=safety_settings)
-            return response.text
-        except Exception as e: return f"[Error: LLM call failed. {e}]"
+        if search_provider is None:
+            search_provider = TavilySearchProvider(api_keys['tavily'], search_depth=config.SEARCH_DEPTH, max_connections=config.MAX_CONCURRENT_SEARCH_REQUESTS)
+        search_cache = None
+        if config.SEARCH_CACHE_ENABLED:
+            search_cache = SearchCache(config.SEARCH_CACHE_PATH, config.SEARCH_CACHE_TTL_SECONDS, config.SEARCH_CACHE_MAX_ENTRIES, similarity_threshold=config.SEARCH_CACHE_SIMILARITY)
+        self.searcher = AsyncSearcher(search_provider, config, search_cache)
+        self._models: Dict[tuple, genai.GenerativeModel] = {}
+        self._models_lock = threading.Lock()
+        self.llm_cache = None
+        if config.LLM_CACHE_ENABLED:
+            self.llm_cache = LLMResponseCache(config.LLM_CACHE_PATH, config.LLM_CACHE_TTL_SECONDS, config.LLM_CACHE_MAX_ENTRIES)
+
+    def _get_model(self, json_mode: bool = False) -> genai.GenerativeModel:
+        """Returns the shared model client, built once per model name and mode."""
+        key = (self.config.WRITER_MODEL, json_mode)
+        with self._models_lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(self.config.WRITER_MODEL, safety_settings=None if json_mode else SAFETY_SETTINGS)
+            return self._models[key]
+
+    def _cache_key(self, prompt: str, temperature: float, json_mode: bool = False) -> Optional[str]:
+        if self.llm_cache is None: return None
+        if temperature > 0 and self.config.LLM_CACHE_SKIP_NONZERO_TEMPERATURE: return None
+        return LLMResponseCache.make_key(self.config.WRITER_MODEL, prompt, {"temperature": temperature, "json": json_mode})
+
+    def _record_usage(self, prompt: str, text: str, response=None, cached: bool = False):
+        """Adds prompt/response sizes to the current trace span. Token counts come from Gemini when it reports them."""
+        usage = getattr(response, "usage_metadata", None)
+        tracing.record(
+            calls=1, cache_hits=int(cached), prompt_chars=len(prompt), response_chars=len(text),
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt),
+            response_tokens=getattr(usage, "candidates_token_count", 0) or estimate_tokens(text),
+        )
+
+    def text_completion(self, prompt: str, temperature: float, use_cache: bool = True) -> str:
+        """With use_cache=False the model is always called; its answer still replaces the cached one."""
+        with tracing.span("llm", mode="text"):
+            cache_key = self._cache_key(prompt, temperature)
+            if cache_key is not None and use_cache:
+                cached = self.llm_cache.get(cache_key)
+                if cached is not None:
+                    self._record_usage(prompt, cached, cached=True)
+                    return cached
+            try:
+                response = self._get_model().generate_content(prompt, generation_config=GenerationConfig(temperature=temperature))
+                text = response.text
+            except Exception as e:
+                tracing.record(errors=1)
+                return f"[Error: LLM call failed. {e}]"
+            self._record_usage(prompt, text, response)
+            if cache_key is not None: self.llm_cache.put(cache_key, text)
+            return text
+
+    def stream_completion(self, prompt: str, temperature: float, use_cache: bool = True) -> Iterator[str]:
+        """Like text_completion, but yields text chunks as Gemini produces them."""
+        with tracing.span("llm", mode="stream"):
+            cache_key = self._cache_key(prompt, temperature)
+            if cache_key is not None and use_cache:
+                cached = self.llm_cache.get(cache_key)
+                if cached is not None:
+                    self._record_usage(prompt, cached, cached=True)
+                    yield cached
+                    return
+            pieces, chunk = [], None
+            try:
+                for chunk in self._get_model().generate_content(prompt, generation_config=GenerationConfig(temperature=temperature), stream=True):
+                    if chunk.text:
+                        pieces.append(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                tracing.record(errors=1)
+                yield f"[Error: LLM call failed. {e}]"
+                return
+            self._record_usage(prompt, "".join(pieces), chunk) # The last chunk carries the usage totals
+            if cache_key is not None: self.llm_cache.put(cache_key, "".join(pieces))
 
     def json_completion(self, prompt: str) -> Dict[str, Any]:
-        model = genai.GenerativeModel(self.config.WRITER_MODEL)
-        try:
-            response = model.generate_content(prompt, generation_config=GenerationConfig(response_mime_type="application/json", temperature=self.config.PLANNER_TEMPERATURE))
-            return json.loads(response.text)
-        except Exception as e:
-            print(f"Warning: Failed to parse JSON. Error: {e}")
-            return {}
-
-    def search(self, queries: List[str], num_results: int) -> List[Dict[str, str]]:
-        research = []
-        print(f"-> Gathering research for {len(queries)} queries...")
-        for query in queries:
-            if not query: continue # Skip empty queries
+        with tracing.span("llm", mode="json"):
+            temperature = self.config.PLANNER_TEMPERATURE
+            cache_key = self._cache_key(prompt, temperature, json_mode=True)
+            cached = self.llm_cache.get(cache_key) if cache_key is not None else None
             try:
-                response = self.tavily.search(query=query, search_depth="advanced", max_results=num_results, include_raw_content=True)
-                for result in response['results']:
-                    if result.get('content') and result.get('url'):
-                        research.append({"content": result['content'], "source": result['url']})
-            except Exception as e: print(f"Tavily search failed for '{query}': {e}")
-        return research 
\ No newline at end of file
+                if cached is not None:
+                    self._record_usage(prompt, cached, cached=True)
+                    return json.loads(cached)
+                response = self._get_model(json_mode=True).generate_content(prompt, generation_config=GenerationConfig(response_mime_type="application/json", temperature=temperature))
+                self._record_usage(prompt, response.text, response)
+                parsed = json.loads(response.text)
+            except Exception as e:
+                tracing.record(errors=1)
+                print(f"Warning: Failed to parse JSON. Error: {e}")
+                return {}
+            if cache_key is not None: self.llm_cache.put(cache_key, response.text)
+            return parsed
+
+    def search(self, queries: List[str], num_results: int, use_cache: bool = True) -> List[Dict[str, str]]:
+        print(f"-> Gathering research for {len(queries)} queries...")
+        with tracing.span("search", queries=len(queries)):
+            results = self.searcher.search(queries, num_results, use_cache)
+            tracing.record(queries=len(queries), results=len(results))
+            return results
+
+    async def asearch(self, queries: List[str], num_results: int, use_cache: bool = True) -> List[Dict[str, str]]:
+        print(f"-> Gathering research for {len(queries)} queries...")
+        with tracing.span("search", queries=len(queries)):
+            results = await self.searcher.asearch(queries, num_results, use_cache)
+            tracing.record(queries=len(queries), results=len(results))
+            return results
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Buckets (seconds) for the stage latency histograms.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+class Span:
+    """One timed stage of a report. `counts` holds additive numbers (tokens, chunks, errors), `attributes` descriptive ones."""
+    __slots__ = ("name", "attributes", "counts", "children", "start", "end", "trace")
+
+    def __init__(self, name: str, trace: "Trace", attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace = trace
+        self.attributes = attributes or {}
+        self.counts: Dict[str, float] = {}
+        self.children: List[Span] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.started) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "counts": self.counts,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+class Trace:
+    """Span tree for one report run. Spans may be opened from several threads at once."""
+    def __init__(self, name: str, metrics: Optional["Metrics"] = None, **attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.created_at = time.time()
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self.root = Span(name, self, attributes)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        span = Span(name, self, attributes)
+        with self._lock:
+            (parent or self.root).children.append(span)
+        return span
+
+    def finish(self):
+        self.root.end = time.perf_counter()
+        if self.metrics is not None: self.metrics.observe(self.root)
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Per span name: number of spans, total seconds and summed counts."""
+        totals: Dict[str, Dict[str, float]] = {}
+        stack = [self.root]
+        while stack:
+            span = stack.pop()
+            entry = totals.setdefault(span.name, {"spans": 0, "seconds": 0.0})
+            entry["spans"] += 1
+            entry["seconds"] += span.duration
+            for key, value in span.counts.items():
+                entry[key] = entry.get(key, 0) + value
+            stack.extend(span.children)
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"trace_id": self.id, "created_at": self.created_at, "stages": self.stage_totals(), "root": self.root.to_dict()}
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.created_at))}-{self.id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, parent: Optional[Span] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Opens a child of `parent` (default: the current span) and makes it current for the block.
+
+    Outside of a trace this is a no-op that yields None, so library code can be instrumented unconditionally.
+    """
+    parent = parent or _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.start_span(name, parent, **attributes)
+    previous = _current_span.get()
+    _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            child.add(errors=1)
+            child.set(error=repr(e))
+        raise
+    finally:
+        child.end = time.perf_counter()
+        # set() rather than reset(): a span held open across a generator's yields may close in another context.
+        _current_span.set(previous)
+        if parent.trace.metrics is not None: parent.trace.metrics.observe(child)
+
+@contextmanager
+def activate(trace_or_span) -> Iterator[Span]:
+    """Makes a trace's root (or a given span) current for the block."""
+    target = trace_or_span.root if isinstance(trace_or_span, Trace) else trace_or_span
+    previous = _current_span.get()
+    _current_span.set(target)
+    try:
+        yield target
+    finally:
+        _current_span.set(previous)
+
+def record(**counts):
+    """Adds counts to the current span, if any."""
+    current = _current_span.get()
+    if current is not None: current.add(**counts)
+
+def bind(fn: Callable) -> Callable:
+    """Wraps fn so that, in whatever thread it runs, its spans nest under the span current right now."""
+    parent = _current_span.get()
+    if parent is None: return fn
+    def bound(*args, **kwargs):
+        with activate(parent):
+            return fn(*args, **kwargs)
+    return bound
+
+class Metrics:
+    """Process-wide aggregates of finished spans, rendered in the Prometheus text format."""
+    def __init__(self, prefix: str = "research_agent"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {} # stage -> [bucket counts..., sum, count]
+        self._counts: Dict[tuple, float] = {} # (stage, count name) -> total
+
+    def observe(self, span: Span):
+        duration = span.duration
+        with self._lock:
+            stats = self._durations.setdefault(span.name, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound: stats[i] += 1
+            stats[-2] += duration
+            stats[-1] += 1
+            for key, value in span.counts.items():
+                self._counts[(span.name, key)] = self._counts.get((span.name, key), 0) + value
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [f"# HELP {p}_stage_duration_seconds Time spent per report stage.", f"# TYPE {p}_stage_duration_seconds histogram"]
+        with self._lock:
+            for stage, stats in sorted(self._durations.items()):
+                for bound, count in zip(LATENCY_BUCKETS, stats):
+                    lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{p}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats[-1]}')
+                lines.append(f'{p}_stage_duration_seconds_sum{{stage="{stage}"}} {stats[-2]:.6f}')
+                lines.append(f'{p}_stage_duration_seconds_count{{stage="{stage}"}} {stats[-1]}')
+            names = sorted({key for _, key in self._counts})
+            for key in names:
+                lines.append(f"# TYPE {p}_{key}_total counter")
+                for (stage, name), value in sorted(self._counts.items()):
+                    if name == key: lines.append(f'{p}_{key}_total{{stage="{stage}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serves /metrics for a Prometheus scraper on a daemon thread."""
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args): pass
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+metrics = Metrics()
@@ -0,0 +1,127 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import tracing
+from .citations import CITATION_PATTERN
+
+# A sentence ends at terminal punctuation (plus any trailing citations) that is followed by a capitalised
+# word or the end of the line, so "e.g. 10" or "vs. last" do not split it. A period right after a known
+# abbreviation or an initial ("Dr. Smith", "the U.S. Treasury") does not end one either, unless a citation follows.
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*((?:\s*\[Source \d+\])*)(?=\s+[A-Z\"'(*#\[-]|[ \t]*$)", re.MULTILINE)
+ABBREVIATION = re.compile(r"(?<![\w.])(?:Dr|Mr|Mrs|Ms|Prof|Sr|Jr|St|Mt|Gen|Gov|Sen|Rep|Rev|vs|etc|approx|Inc|Ltd|Co|Corp|Dept|No|Fig|Vol|"
+                          r"Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec|[A-Za-z](?:\.[A-Za-z])*)$")
+NON_SPACE = re.compile(r"\S")
+UNVERIFIED_MARKER = " *(unverified)*"
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Returns the (start, end) offsets of every sentence in text. Sentences never span lines."""
+    spans = []
+    for line in re.finditer(r"[^\n]+", text):
+        start = line.start()
+        for end in SENTENCE_END.finditer(text, line.start(), line.end()):
+            if not end.group(1) and end.group().startswith(".") and ABBREVIATION.search(text, line.start(), end.start()): continue
+            first = NON_SPACE.search(text, start, end.end())
+            if first is not None: spans.append((first.start(), end.end()))
+            start = end.end()
+        rest = NON_SPACE.search(text, start, line.end())
+        if rest is not None: spans.append((rest.start(), line.end()))
+    return spans
+
+def split_cited_sentences(text: str) -> List[Tuple[int, int, List[int]]]:
+    """Returns (start, end, cited source numbers) for every sentence in text that cites a source."""
+    sentences = []
+    for start, end in split_sentences(text):
+        cited = list(dict.fromkeys(int(num) for num in CITATION_PATTERN.findall(text, start, end)))
+        if cited: sentences.append((start, end, cited))
+    return sentences
+
+class CitationVerifier:
+    """Checks that every cited sentence of a draft is supported by the chunks it cites.
+
+    Each (claim, cited chunk) pair is scored in one batch by a local cross-encoder (`score_pairs` returns a
+    support probability per pair); a claim takes its best score over the chunks it cites. Claims at or
+    above `support_threshold` pass. Claims below
+    `reject_threshold` are unsupported and get flagged or removed. Claims in between are escalated to
+    `escalate` (at most `max_escalations` per draft), which returns None if the claim is fine or a
+    corrected sentence; if it raises, the claim is treated as unsupported.
+    """
+    def __init__(self, score_pairs: Callable[[List[Tuple[str, str]]], np.ndarray], support_threshold: float, reject_threshold: float,
+                 action: str = "flag", escalate: Optional[Callable[[str, str], Optional[str]]] = None, max_escalations: int = 3):
+        if action not in ("flag", "remove"):
+            raise ValueError(f"Unsupported verification action: {action}")
+        self.score_pairs = score_pairs
+        self.support_threshold = support_threshold
+        self.reject_threshold = reject_threshold
+        self.action = action
+        self.escalate = escalate
+        self.max_escalations = max_escalations
+
+    def verify(self, draft: str, sources: Dict[int, str]) -> Tuple[str, Dict[str, int]]:
+        """Returns the checked draft and counts of checked, supported, escalated, corrected and unsupported claims."""
+        sentences = [s for s in split_cited_sentences(draft) if any(num in sources for num in s[2])]
+        stats = {"checked": len(sentences), "supported": 0, "escalated": 0, "corrected": 0, "unsupported": 0}
+        if not sentences: return draft, stats
+
+        claims = [re.sub(r"\s+([.,;:!?])", r"\1", CITATION_PATTERN.sub("", draft[start:end])).strip() for start, end, _ in sentences]
+        pairs, owners = [], []
+        for i, (_, _, cited) in enumerate(sentences):
+            for num in cited:
+                if num in sources:
+                    pairs.append((claims[i], sources[num]))
+                    owners.append(i)
+        pair_scores = np.asarray(self.score_pairs(pairs), dtype=np.float32)
+        scores = np.zeros(len(sentences), dtype=np.float32)
+        np.maximum.at(scores, owners, pair_scores)
+
+        replacements: Dict[int, str] = {}
+        uncertain = [int(i) for i in np.argsort(scores) if self.reject_threshold <= scores[i] < self.support_threshold]
+        escalated = uncertain[:self.max_escalations] if self.escalate is not None else []
+        for i, score in enumerate(scores):
+            if score >= self.support_threshold:
+                stats["supported"] += 1
+            elif score < self.reject_threshold or i not in escalated:
+                stats["unsupported"] += 1
+                replacements[i] = "" if self.action == "remove" else draft[sentences[i][0]:sentences[i][1]] + UNVERIFIED_MARKER
+
+        if escalated:
+            stats["escalated"] = len(escalated)
+            def check(i: int):
+                context = "\n\n".join(f"Source [{num}]: {sources[num]}" for num in sentences[i][2] if num in sources)
+                try:
+                    return self.escalate(draft[sentences[i][0]:sentences[i][1]], context)
+                except Exception as e:
+                    print(f"Warning: Claim verification failed, flagging the claim. Error: {e}")
+                    return e
+            with ThreadPoolExecutor(max_workers=len(escalated), thread_name_prefix="verify") as executor:
+                corrections = list(executor.map(tracing.bind(check), escalated))
+            for i, correction in zip(escalated, corrections):
+                if isinstance(correction, Exception):
+                    stats["unsupported"] += 1
+                    replacements[i] = "" if self.action == "remove" else draft[sentences[i][0]:sentences[i][1]] + UNVERIFIED_MARKER
+                    continue
+                if correction is None:
+                    stats["supported"] += 1
+                    continue
+                stats["corrected"] += 1
+                if not CITATION_PATTERN.search(correction): # Keep the sentence attributed to its sources
+                    body, end = re.match(r"(.*?)([.!?]*)$", correction.strip(), re.DOTALL).groups()
+                    correction = f"{body} {' '.join(f'[Source {num}]' for num in sentences[i][2])}{end}"
+                replacements[i] = correction
+
+        # Rebuild back to front so earlier offsets stay valid.
+        checked = draft
+        for i in sorted(replacements, reverse=True):
+            start, end, _ = sentences[i]
+            checked = checked[:start] + replacements[i] + checked[end:]
+        if self.action == "remove": checked = re.sub(r"(?<=\S)[ \t]{2,}(?=\S)", " ", checked) # Close the gaps left by removed sentences
+        return checked, stats
+
+def parse_verification_response(response: str) -> Optional[str]:
+    """Interprets a VERIFICATION_PROMPT reply: None when the claim checks out, else the corrected text."""
+    text = response.strip()
+    if text.startswith("[Error"): raise RuntimeError(text)
+    if not text or re.match(r"^\W*OK\W*$", text, re.IGNORECASE): return None
+    return re.sub(r"^(?:Verification Result|Corrected(?: version| sentence)?)\s*:\s*", "", text, flags=re.IGNORECASE)
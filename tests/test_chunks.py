@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from research_agent.chunks import ChunkStore, SentenceSplitter
+
+def random_text(seed: int) -> str:
+    rng = random.Random(seed)
+    words = ["battery", "grid", "storage", "cost", "a", "supercalifragilistic" * rng.randint(1, 3), "policy", "x" * 1200]
+    lines = []
+    for _ in range(rng.randint(1, 30)):
+        sentences = [" ".join(rng.choice(words[:-1]) for _ in range(rng.randint(1, 60))) + rng.choice(".!?") for _ in range(rng.randint(1, 8))]
+        if rng.random() < 0.05: sentences.append(words[-1]) # A "word" longer than a chunk
+        lines.append(" ".join(sentences) if rng.random() < 0.9 else "")
+    return "\n".join(lines)
+
+def check_invariants(splitter: SentenceSplitter, text: str):
+    spans = splitter.split_offsets(text)
+    for start, end in spans:
+        assert 0 <= start < end <= len(text)
+        assert end - start <= splitter.chunk_size
+        assert not text[start].isspace() and not text[end - 1].isspace()
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert start < next_start and end < next_end # Never the same or a contained window
+        assert end - next_start <= splitter.chunk_overlap
+    covered = bytearray(len(text))
+    for start, end in spans: covered[start:end] = b"\1" * (end - start)
+    assert all(covered[n] or char.isspace() for n, char in enumerate(text))
+    return spans
+
+def test_window_that_cannot_advance_with_overlap_starts_at_previous_end():
+    # Cuts at 186 and 282: from 186 the 953-character line does not fit, so the overlap window would end at 282 again.
+    text = "a" * 185 + "\n" + "b" * 95 + "\n" + "c " * 476 + "\n"
+    spans = SentenceSplitter(1000, 150).split_offsets(text)
+    assert spans == [(0, 281), (282, 1233)]
+
+def test_overlap_keeps_the_last_line_when_it_fits():
+    text = "\n".join(f"Line {n} " + "word " * 30 for n in range(20))
+    spans = check_invariants(SentenceSplitter(400, 200), text)
+    assert len(spans) > 1
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert next_start < end # Each window repeats the previous one's last line
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 150), (200, 50), (120, 100), (50, 0)])
+def test_invariants_on_random_text(chunk_size, chunk_overlap):
+    splitter = SentenceSplitter(chunk_size, chunk_overlap)
+    for seed in range(50):
+        check_invariants(splitter, random_text(seed))
+
+def test_empty_and_blank_text():
+    splitter = SentenceSplitter(100, 20)
+    assert splitter.split_offsets("") == []
+    assert splitter.split_offsets(" \n\n ") == []
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        SentenceSplitter(100, 100)
+
+def test_chunk_store_round_trips_spans():
+    store = ChunkStore()
+    text = "First sentence. Second sentence."
+    assert store.add_document("https://a", text, [(0, 15), (16, 32)]) == [0, 1]
+    assert store.add_document("https://a", "Again.", [(0, 6)]) == [2]
+    assert list(store) == [{"source": "https://a", "content": "First sentence."}, {"source": "https://a", "content": "Second sentence."},
+                           {"source": "https://a", "content": "Again."}]
+    assert store.sources == ["https://a"]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from research_agent.context import ReportContext, estimate_tokens
+
+def encode(texts):
+    return np.array([[len(text), text.count("e") + 1.0] for text in texts], dtype=np.float32)
+
+def test_net_saving_subtracts_what_the_summaries_cost():
+    context = ReportContext("Grid storage", ["Costs", "Policy"], token_budget=1000, encode=encode)
+    section = "## Costs\n\n" + "Battery pack prices fell sharply over the decade as cell chemistry and manufacturing scale improved. " * 3
+    summary = "Prices fell."
+    context.add_section("Costs", section, summary, summary_tokens=estimate_tokens(section) + estimate_tokens(summary))
+    context.build("Policy", "Subsidies and mandates.", section)
+    assert context.tokens_saved == 0 # The whole short report fits the budget anyway
+    assert context.net_tokens_saved == -context.summary_tokens < 0
+
+def test_long_reports_save_tokens_net():
+    context = ReportContext("Grid storage", ["Costs", "Policy"], token_budget=200, encode=encode)
+    report = "\n\n".join(f"Paragraph {n} about battery costs, supply chains and the regional policy outlook for storage." for n in range(200))
+    context.add_section("Costs", report, "Prices fell.", summary_tokens=estimate_tokens(report) + 3)
+    for section in ("Policy", "Outlook", "Risks"):
+        context.build(section, "Next section.", report)
+    assert context.net_tokens_saved == context.tokens_saved - context.summary_tokens > 0
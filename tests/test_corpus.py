@@ -0,0 +1,65 @@
+import threading
+
+import numpy as np
+
+from research_agent.corpus import ReportCorpus, SectionScopes
+from research_agent.ingest import DocumentIngestor
+
+def vector(text: str, dim: int = 8) -> np.ndarray:
+    return np.random.default_rng(len(text)).random(dim, dtype=np.float32)
+
+def test_repeated_chunks_keep_their_ids():
+    corpus = ReportCorpus(ann_threshold=1000, lexical=True)
+    text = "Battery prices fell. Grid storage grew."
+    first = corpus.add_document("https://a", text, [(0, 20), (21, 39)])
+    assert corpus.add_document("https://a", text, [(21, 39), (0, 20), (0, 20)]) == [first[1], first[0], first[0]]
+    assert corpus.add_document("https://b", text, [(0, 20)]) == [2] # Same text from another source is its own chunk
+    assert len(corpus) == 3 and len(corpus.chunks.documents) == 2
+
+def test_scoped_search_does_not_depend_on_other_chunks():
+    query = "battery storage prices"
+    own = [("https://a", "Battery storage prices fell sharply last year."), ("https://b", "Storage prices depend on lithium supply.")]
+    others = [("https://c", f"Battery storage report number {n} on prices and battery storage.") for n in range(20)]
+
+    def ranking(before, after):
+        corpus = ReportCorpus(ann_threshold=1000, lexical=True)
+        for source, text in before: corpus.add_document(source, text, [(0, len(text))])
+        scope = [i for source, text in own for i in corpus.add_document(source, text, [(0, len(text))])]
+        for source, text in after: corpus.add_document(source, text, [(0, len(text))])
+        corpus.set_embeddings(list(range(len(corpus))), np.stack([vector(corpus.chunks.text(i)) for i in range(len(corpus))]))
+        lexical = corpus.lexical.search(query, 5, scope)
+        dense = corpus.search(vector(query), 5, ids=scope)
+        return [(corpus.chunks.text(i), round(score, 9)) for i, score in lexical], [corpus.chunks.text(i) for i in dense]
+
+    assert ranking([], others) == ranking(others, []) == ranking([], [])
+
+def test_forked_ingestors_only_share_what_came_before():
+    ingestor = DocumentIngestor(use_raw_content=False, max_bytes=10_000, near_duplicate_distance=3, min_chars=1)
+    planning = {"source": "https://plan", "content": "Planning research about grid batteries and their costs."}
+    page = {"source": "https://page", "content": "A page both sections found, about lithium supply chains."}
+    assert list(ingestor.ingest([planning])) == [planning]
+    first, second = ingestor.fork(), ingestor.fork()
+    assert list(first.ingest([planning, page])) == [page]
+    assert list(second.ingest([page])) == [page] # The other section's copy does not hide it
+    assert (first.duplicates_skipped, second.duplicates_skipped, ingestor.duplicates_skipped) == (1, 0, 1)
+
+def test_large_scopes_are_searched_through_the_hnsw_graph():
+    corpus = ReportCorpus(ann_threshold=50)
+    texts = [f"chunk {n}" for n in range(200)]
+    corpus.add([{"source": "https://a", "content": text} for text in texts], np.random.default_rng(0).random((200, 8), dtype=np.float32))
+    scope = list(range(0, 200, 2))
+    found = corpus.search(np.random.default_rng(7).random(8, dtype=np.float32), 10, ids=scope)
+    assert len(found) == 10 and set(found) <= set(scope)
+
+def test_section_scopes_are_passed_on_in_section_order():
+    scopes = SectionScopes([1, 2], sections=3)
+    taken = {}
+    second = threading.Thread(target=lambda: taken.setdefault(1, scopes.take(1)))
+    second.start()
+    second.join(0.05)
+    assert second.is_alive() # Waits for the first section
+    first = scopes.take(0) + [3]
+    scopes.pass_on(0, first)
+    scopes.pass_on(0, first + [4]) # Only the first hand-off counts
+    second.join(1)
+    assert taken[1] == [1, 2, 3]
@@ -0,0 +1,44 @@
+import numpy as np
+
+from research_agent.embedding_cache import EmbeddingCache
+
+def vectors(*values: float) -> np.ndarray:
+    return np.array([[value] * 4 for value in values], dtype=np.float32)
+
+def test_round_trip_and_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", 4, max_entries=2)
+    cache.put_many(["a", "b"], vectors(1, 2))
+    assert cache.get_many(["a"])["a"].tolist() == [1, 1, 1, 1] # "a" is now the most recently used
+    cache.put_many(["c"], vectors(3))
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_survive_reopening(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", 4, max_entries=8)
+    cache.put_many(["a"], vectors(1))
+    reopened = EmbeddingCache(str(tmp_path), "model", 4, max_entries=8)
+    assert reopened.get_many(["a"])["a"].tolist() == [1, 1, 1, 1]
+    assert EmbeddingCache(str(tmp_path), "model", 4, max_entries=4).get_many(["a"]) == {} # Another layout starts over
+
+def test_hits_do_not_write_the_index(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", 4, max_entries=8)
+    cache.put_many(["a"], vectors(1))
+    changes = cache._conn.total_changes
+    cache.get_many(["a"] * 3)
+    assert cache._conn.total_changes == changes
+    cache.flush()
+    assert cache._conn.total_changes == changes + 1
+
+def test_slot_reused_by_another_process_reads_as_a_miss(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "model", 4, max_entries=1)
+    second = EmbeddingCache(str(tmp_path), "model", 4, max_entries=1)
+    first.put_many(["a"], vectors(1))
+    second.put_many(["b"], vectors(2)) # Evicts "a" and rewrites its slot
+    assert first.get_many(["a"]) == {}
+    assert first.get_many(["b"])["b"].tolist() == [2, 2, 2, 2]
+
+def test_keys_ending_in_a_zero_byte_still_hit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", 4, max_entries=8)
+    text = next(f"chunk {n}" for n in range(10_000) if cache._key(f"chunk {n}").endswith("00"))
+    cache.put_many([text], vectors(1))
+    assert text in cache.get_many([text])
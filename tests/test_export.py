@@ -0,0 +1,53 @@
+import asyncio
+import os
+import time
+import zipfile
+from concurrent.futures import Future
+
+from research_agent.export import ExportService, prune_download_dirs
+
+REPORT = "# Report\n\nBody.\n\n## Master Bibliography\n\n[1] https://example.com/a\n"
+
+def test_export_re_renders_when_the_cached_file_was_pruned(tmp_path, monkeypatch):
+    service = ExportService(str(tmp_path / "cache"))
+    cached = service.export(REPORT, "md")["path"]
+    # Pruning can delete the cached file between the cache lookup and the copy.
+    monkeypatch.setattr(service, "submit", lambda *args, **kwargs: _done({"path": cached, "format": "md", "cached": True, "seconds": 0.0}))
+    os.remove(cached)
+    output = str(tmp_path / "report.zip")
+    result = service.export(REPORT, "md", output)
+    assert result["path"] == output and not result["cached"]
+    with zipfile.ZipFile(output) as bundle:
+        assert bundle.read("report.md").decode() == REPORT
+
+def test_aexport_copies_to_the_output_path(tmp_path):
+    service = ExportService(str(tmp_path / "cache"))
+    output = str(tmp_path / "report.zip")
+    result = asyncio.run(service.aexport(REPORT, "md", output))
+    assert result["path"] == output and os.path.exists(output)
+
+def test_prune_download_dirs_removes_only_old_directories(tmp_path):
+    old, new = tmp_path / "old", tmp_path / "new"
+    for directory in (old, new):
+        directory.mkdir()
+        (directory / "report.pdf").write_bytes(b"%PDF")
+    stale = time.time() - 7200
+    os.utime(old, (stale, stale))
+    prune_download_dirs(str(tmp_path), 3600)
+    assert not old.exists() and new.exists()
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def test_a_cache_file_pruned_during_lookup_is_a_miss(tmp_path, monkeypatch):
+    service = ExportService(str(tmp_path / "cache"))
+    cached = service.export(REPORT, "md")["path"]
+    def pruned(path, *args, **kwargs):
+        os.remove(path)
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(os, "utime", pruned)
+    result = service.export(REPORT, "md")
+    assert not result["cached"] and os.path.exists(cached)
+    assert (service.hits, service.misses) == (0, 2)
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from research_agent import inference
+from research_agent.config import AgentConfig
+from research_agent.inference import OnnxReranker, TorchReranker, as_probabilities, check_backend, compare_rankings
+
+class Identity:
+    pass
+
+class Sigmoid:
+    pass
+
+def cross_encoder(num_labels, activation, id2label=None):
+    return SimpleNamespace(num_labels=num_labels, activation_fn=activation, config=SimpleNamespace(num_labels=num_labels, id2label=id2label or {}))
+
+def onnx_reranker(outputs, **meta):
+    reranker = object.__new__(OnnxReranker)
+    reranker.model = SimpleNamespace(meta=meta, run=lambda *texts, batch_size: [(outputs, None)])
+    reranker.batch_size = 8
+    return reranker
+
+def test_probability_does_not_depend_on_the_rest_of_the_batch():
+    logits = np.array([0.2, 0.9, 3.0], dtype=np.float32)
+    together = as_probabilities(logits, "sigmoid")
+    alone = np.concatenate([as_probabilities(logits[i:i + 1], "sigmoid") for i in range(3)])
+    assert np.allclose(together, alone)
+    assert np.allclose(as_probabilities(together, "identity"), together)
+
+def test_label_logits_use_softmax_and_the_positive_column():
+    logits = np.array([[2.0, 0.0, 0.0], [0.0, 0.0, 2.0]], dtype=np.float32)
+    probabilities = as_probabilities(logits, "softmax", positive_label=2)
+    assert probabilities.shape == (2,)
+    assert probabilities[1] > 0.5 > probabilities[0]
+
+def test_torch_reranker_reads_the_activation_from_the_model():
+    assert TorchReranker(cross_encoder(1, Sigmoid()), 8).activation == "identity" # CrossEncoder already applied a sigmoid
+    assert TorchReranker(cross_encoder(1, Identity()), 8).activation == "sigmoid"
+    nli = TorchReranker(cross_encoder(3, Identity(), {0: "contradiction", 1: "neutral", 2: "entailment"}), 8)
+    assert (nli.activation, nli.positive_label) == ("softmax", 2)
+
+def test_onnx_reranker_returns_every_label():
+    logits = np.array([[3.0, -1.0, 0.5], [-2.0, 0.0, 4.0]], dtype=np.float32)
+    reranker = onnx_reranker(logits, num_labels=3, activation="identity", positive_label=2)
+    scores = reranker.predict([["claim", "a"], ["claim", "b"]])
+    assert np.array_equal(scores, logits)
+    assert reranker.predict([]).shape == (0, 3)
+
+def test_onnx_reranker_applies_the_exported_activation():
+    logits = np.array([[0.0], [2.0]], dtype=np.float32)
+    scores = onnx_reranker(logits, num_labels=1, activation="sigmoid", positive_label=0).predict([["q", "a"], ["q", "b"]])
+    assert np.allclose(scores, 1 / (1 + np.exp(-logits[:, 0])))
+
+class StubEmbedder:
+    """Bag-of-letters embeddings; `noise` perturbs them like a lossy backend would."""
+    def __init__(self, noise=0.0, backend="torch"):
+        self.noise, self.backend = noise, backend
+
+    def encode(self, texts, show_progress_bar=False):
+        vectors = np.array([[text.lower().count(c) for c in "abcdefghijklmnopqrstuvwxyz"] for text in texts], dtype=np.float32) + 1e-3
+        return vectors + self.noise * np.random.default_rng(0).random(vectors.shape, dtype=np.float32)
+
+class StubReranker:
+    """Word-overlap logits, returned as a single column or as (no, yes) label logits."""
+    def __init__(self, labels=1, backend="torch"):
+        self.backend = backend
+        self.activation, self.positive_label = ("sigmoid", 0) if labels == 1 else ("softmax", 1)
+        self.labels = labels
+
+    def predict(self, pairs, show_progress_bar=False):
+        logits = np.array([len(set(q.lower().split()) & set(d.lower().split())) - 1.0 for q, d in pairs], dtype=np.float32)
+        return logits if self.labels == 1 else np.stack([np.zeros_like(logits), logits], axis=1)
+
+def test_compare_rankings_of_matching_backends():
+    result = compare_rankings(StubEmbedder(), StubEmbedder(), StubReranker(), StubReranker(labels=2))
+    assert result == {"retrieval_topk_overlap": 1.0, "rerank_topk_overlap": 1.0, "rerank_max_abs_diff": pytest.approx(0.0, abs=1e-6)}
+
+def test_compare_rankings_notices_a_lossy_backend():
+    result = compare_rankings(StubEmbedder(), StubEmbedder(noise=50.0), StubReranker(), StubReranker())
+    assert result["retrieval_topk_overlap"] < 1.0
+
+def test_check_backend_refuses_a_silent_fallback(monkeypatch):
+    def onnx_unavailable(*args, **kwargs):
+        raise ImportError("onnxruntime")
+    monkeypatch.setattr(inference, "OnnxEmbedder", onnx_unavailable)
+    monkeypatch.setattr(inference, "OnnxReranker", onnx_unavailable)
+    monkeypatch.setattr(inference, "TorchEmbedder", lambda model, batch_size, backend="torch": StubEmbedder(backend=backend))
+    monkeypatch.setattr(inference, "TorchReranker", lambda model, batch_size, backend="torch": StubReranker(backend=backend))
+    monkeypatch.setattr(inference, "_load_torch_embedder", lambda name, quantize: None)
+    monkeypatch.setattr(inference, "_load_torch_reranker", lambda name, quantize: None)
+    monkeypatch.setattr(inference, "_set_threads", lambda threads: None)
+    with pytest.raises(RuntimeError, match="onnx backend is unavailable"):
+        check_backend("onnx", AgentConfig())
+    assert check_backend("torch-int8", AgentConfig())["rerank_topk_overlap"] == 1.0
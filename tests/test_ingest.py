@@ -0,0 +1,25 @@
+import hashlib
+
+from benchmarks.fakes import synthetic_page
+from research_agent.ingest import WORD, simhash
+
+def reference_simhash(text: str, bits: int = 64) -> int:
+    words = WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * bits
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+def test_simhash_matches_the_bitwise_definition():
+    for text in ["", "one", "a b c d", synthetic_page("simhash", paragraphs=40)]:
+        assert simhash(text) == reference_simhash(text)
+    assert simhash("a b c d e", bits=16) == reference_simhash("a b c d e", bits=16)
+
+def test_near_duplicates_differ_in_few_bits():
+    page = synthetic_page("near-duplicate", paragraphs=40)
+    edited = page.replace("market", "markets", 1)
+    assert bin(simhash(page) ^ simhash(edited)).count("1") <= 3
+    assert bin(simhash(page) ^ simhash(synthetic_page("other", paragraphs=40))).count("1") > 10
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from research_agent.jobs import JobScheduler
+
+def test_stream_reports_idle_while_a_running_job_is_quiet():
+    resume = threading.Event()
+    def report():
+        yield "partial"
+        resume.wait(5)
+        yield "full"
+    scheduler = JobScheduler(max_workers=1)
+    job = scheduler.submit(report)
+    events = []
+    for kind, payload in scheduler.stream(job.id, poll_interval=0.01):
+        events.append((kind, payload))
+        if kind == "idle": resume.set()
+    assert events[0] == ("update", "partial")
+    assert ("idle", None) in events
+    assert events[-2:] == [("update", "full"), ("done", None)]
+    scheduler.shutdown()
+
+def blocking_report(started: threading.Event, release: threading.Event, updates=("one", "two")):
+    def report():
+        started.set()
+        release.wait(5)
+        yield from updates
+    return report
+
+def test_jobs_queue_in_order_and_report_their_position():
+    scheduler = JobScheduler(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    first = scheduler.submit(blocking_report(started, release))
+    second, third = scheduler.submit(lambda: iter(["second"])), scheduler.submit(lambda: iter(["third"]))
+    assert started.wait(5)
+    assert (scheduler.queue_position(first.id), scheduler.queue_position(second.id), scheduler.queue_position(third.id)) == (0, 1, 2)
+    events = scheduler.stream(third.id, poll_interval=0.01)
+    assert next(events) == ("queued", "2")
+    release.set()
+    assert [event for event in events if event[0] != "queued"] == [("update", "third"), ("done", None)]
+    assert list(scheduler.stream(first.id)) == [("update", "one"), ("update", "two"), ("done", None)]
+    assert scheduler.get(first.id) is None # Forgotten once followed to the end
+    scheduler.shutdown()
+
+def test_cancelling_a_queued_job_means_it_never_starts():
+    scheduler = JobScheduler(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    scheduler.submit(blocking_report(started, release))
+    calls = []
+    queued = scheduler.submit(lambda: calls.append("started") or iter(["never"]))
+    assert started.wait(5) and scheduler.cancel(queued.id)
+    release.set()
+    assert [kind for kind, _ in scheduler.stream(queued.id, poll_interval=0.01) if kind != "queued"] == ["cancelled"]
+    assert calls == [] and queued.status == "cancelled"
+    assert not scheduler.cancel(queued.id) # Already over
+    scheduler.shutdown()
+
+def test_cancelling_a_running_job_stops_it_at_the_next_update():
+    scheduler = JobScheduler(max_workers=1)
+    closed = threading.Event()
+    def report():
+        try:
+            for n in range(1000):
+                yield str(n)
+                time.sleep(0.001)
+        finally:
+            closed.set()
+    job = scheduler.submit(report)
+    events = scheduler.stream(job.id)
+    assert next(events) == ("update", "0")
+    assert scheduler.cancel(job.id)
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "cancelled" and len(kinds) < 1000
+    assert closed.wait(5) # The report generator was closed, so its cleanup ran
+    scheduler.shutdown()
+
+def test_a_consumer_that_goes_away_cancels_its_job():
+    scheduler = JobScheduler(max_workers=1)
+    closed = threading.Event()
+    def report():
+        try:
+            while True:
+                yield "tick"
+                time.sleep(0.001)
+        finally:
+            closed.set()
+    job = scheduler.submit(report)
+    events = scheduler.stream(job.id)
+    assert next(events) == ("update", "tick")
+    events.close() # e.g. the browser tab was closed
+    assert job.cancel_event.is_set() and closed.wait(5)
+    scheduler.shutdown()
+
+def test_failures_are_relayed_to_the_follower():
+    scheduler = JobScheduler(max_workers=2)
+    def report():
+        yield "partial"
+        raise ValueError("search backend down")
+    failing, healthy = scheduler.submit(report), scheduler.submit(lambda: iter(["fine"]))
+    def followed(job):
+        return [event for event in scheduler.stream(job.id) if event[0] != "queued"]
+    assert followed(failing) == [("update", "partial"), ("failed", "search backend down")]
+    assert followed(healthy) == [("update", "fine"), ("done", None)] # Each session only sees its own report
+    scheduler.shutdown()
@@ -0,0 +1,38 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from research_agent.models import ModelRegistry
+
+class OverlapDetector:
+    """A model that notes when two calls run at the same time."""
+    dim = 4
+
+    def __init__(self):
+        self.active = self.overlaps = 0
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.active += 1
+            self.overlaps += self.active > 1
+        time.sleep(0.01)
+        with self._lock: self.active -= 1
+
+    def encode(self, texts, show_progress_bar=False):
+        self._call()
+        return [[0.0] * self.dim for _ in texts]
+
+    def predict(self, pairs, show_progress_bar=False):
+        self._call()
+        return [0.0 for _ in pairs]
+
+def test_shared_models_never_run_inference_concurrently():
+    registry = ModelRegistry()
+    detector = OverlapDetector()
+    embedder = registry._get("embedding", "detector", lambda: detector)
+    reranker = registry._get("reranker", "detector", lambda: detector)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda n: embedder.encode(["text"]) if n % 2 else reranker.predict([["q", "p"]]), range(32)))
+    assert detector.overlaps == 0
+    assert embedder.dim == 4 # Other attributes pass through
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fakes import FakeModelRegistry, SyntheticSearchProvider
+from research_agent.agent import ResearchAgent, Section
+from research_agent.config import AgentConfig
+from research_agent.prompts import Prompts
+from research_agent.rag_pipeline import RAGPipeline
+from research_agent.tools import AITools
+
+SECTIONS = [Section(title="Storage Costs", description="Battery price trends.\n- cost per kWh\n- supply chain")]
+
+class CountingModel:
+    """Stands in for the Gemini model; every answer is new, so a cache hit is easy to tell apart from a call."""
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.prompts.append(prompt)
+        response = SimpleNamespace(text=f"Draft {len(self.prompts)} [Source 1].", usage_metadata=None)
+        return iter([response]) if stream else response
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    config = AgentConfig()
+    config.RUN_STORE_DIR = str(tmp_path / "runs")
+    config.LLM_CACHE_PATH = str(tmp_path / "llm.sqlite3")
+    config.SEARCH_CACHE_PATH = str(tmp_path / "search.sqlite3")
+    config.EMBEDDING_CACHE_ENABLED = False
+    config.WARM_UP_MODELS = False
+    config.VERIFY_CITATIONS = False
+    config.BOUNDED_WRITER_CONTEXT = False
+    provider = SyntheticSearchProvider()
+    tools = AITools(config, {"google": "test"}, search_provider=provider)
+    model = CountingModel()
+    monkeypatch.setattr(tools, "_get_model", lambda json_mode=False: model)
+    agent = ResearchAgent(config, tools, RAGPipeline(config, FakeModelRegistry()), Prompts())
+    run = agent.run_store.create("battery storage", "")
+    run.update(brief="The Economics of Grid-Scale Battery Storage", sections=[s.model_dump() for s in SECTIONS])
+    yield agent, run, model, provider
+    tools.searcher.close()
+
+def writer_calls(model):
+    return [prompt for prompt in model.prompts if "Source [1]" in prompt]
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_regenerate_section_calls_the_writer_again(setup, stream):
+    agent, run, model, provider = setup
+    agent.config.STREAM_WRITER = stream
+    list(agent.resume(run.id))
+    assert len(writer_calls(model)) == 1
+    searches = len(provider.calls)
+
+    list(agent.regenerate_section(run.id, 0))
+    assert len(writer_calls(model)) == 2
+    assert writer_calls(model)[0] == writer_calls(model)[1] # Same prompt: only the cache bypass gets a new draft
+    assert len(provider.calls) == searches # Research was kept
+    assert agent.load_run(run.id).section(0)["draft"] == f"Draft {len(model.prompts)} [Source 1]."
+
+    list(agent.resume(run.id)) # A plain resume still reuses everything
+    assert len(writer_calls(model)) == 2
+
+def test_refresh_research_bypasses_the_search_cache(setup):
+    agent, run, model, provider = setup
+    list(agent.resume(run.id))
+    searches = len(provider.calls)
+    assert searches
+
+    list(agent.regenerate_section(run.id, 0, refresh_research=True))
+    assert len(provider.calls) == 2 * searches
+    assert len(writer_calls(model)) == 2
+
+def test_adaptive_retrieval_needs_a_round(setup):
+    agent, *_ = setup
+    agent.config.ADAPTIVE_MAX_ROUNDS = 0
+    with pytest.raises(ValueError):
+        ResearchAgent(agent.config, agent.tools, agent.rag, agent.prompts)
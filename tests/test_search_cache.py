@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from research_agent import search_cache
+from research_agent.search_cache import SearchCache, normalize_query
+
+RESULTS = [{"url": "https://example.com/a", "content": "Battery prices fell."}]
+SETTINGS = SearchCache.make_settings(num_results=3, depth="advanced")
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, "time", clock.time)
+    return clock
+
+VECTORS = {"battery costs": [1.0, 0.0, 0.0], "costs of battery": [1.0, 0.0, 0.0], "battery cost trend": [1.0, 0.1, 0.0], "grid policy": [0.0, 0.0, 1.0]}
+
+def embed(texts):
+    """Stub encoder: "battery cost trend" has a cosine of ~0.995 with "battery costs"."""
+    return np.array([VECTORS[text] for text in texts], dtype=np.float32)
+
+def test_normalize_query():
+    assert normalize_query("  Grid-scale   BATTERY costs?! ") == "grid-scale battery costs"
+    assert normalize_query("• “GPT-4” vs. C++ (4.5)") == "“gpt-4” vs c++ 4.5"
+    assert normalize_query("ｆｕｌｌｗｉｄｔｈ") == "fullwidth"
+
+def test_hits_ignore_case_and_punctuation_but_not_settings(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl_seconds=60, max_entries=10)
+    cache.put("Battery costs", SETTINGS, RESULTS, seconds=1.5)
+    assert cache.get("battery costs?", SETTINGS) == (RESULTS, False, 1.5)
+    assert cache.get("battery costs", SearchCache.make_settings(num_results=5, depth="advanced")) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["seconds_saved"]) == (1, 1, 1.5)
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl_seconds=60, max_entries=10)
+    cache.put("battery costs", SETTINGS, RESULTS, seconds=1.0)
+    clock.now += 59
+    assert cache.get("battery costs", SETTINGS) is not None
+    clock.now += 2
+    assert cache.get("battery costs", SETTINGS) is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(SearchCache, "EVICT_EVERY", 1)
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl_seconds=600, max_entries=2)
+    for query in ("first", "second"):
+        clock.now += 1
+        cache.put(query, SETTINGS, RESULTS, seconds=1.0)
+    clock.now += 1
+    assert cache.get("first", SETTINGS) is not None # "second" is now the least recently used
+    clock.now += 1
+    cache.put("third", SETTINGS, RESULTS, seconds=1.0)
+    assert [cache.get(q, SETTINGS) is not None for q in ("first", "second", "third")] == [True, False, True]
+
+@pytest.mark.parametrize("threshold, near_hit", [(0.99, True), (0.999, False)])
+def test_semantic_matches_respect_the_threshold(tmp_path, clock, threshold, near_hit):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl_seconds=60, max_entries=10, embed=embed, similarity_threshold=threshold)
+    cache.put("battery costs", SETTINGS, RESULTS, seconds=2.0)
+    assert cache.get("Costs of battery", SETTINGS) == (RESULTS, True, 2.0)
+    assert (cache.get("battery cost trend", SETTINGS) is not None) == near_hit
+    assert cache.get("grid policy", SETTINGS) is None
+    assert cache.get("costs of battery", SearchCache.make_settings(num_results=5)) is None # Never across settings
+    assert cache.stats()["semantic_hits"] == 1 + near_hit
+
+def test_semantic_matches_skip_expired_entries(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"), ttl_seconds=60, max_entries=10, embed=embed, similarity_threshold=0.9)
+    cache.put("battery costs", SETTINGS, RESULTS, seconds=2.0)
+    clock.now += 61
+    assert cache.get("costs of battery", SETTINGS) is None
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeAITools, FakeModelRegistry
+from research_agent.agent import ResearchAgent
+from research_agent.config import AgentConfig
+from research_agent.prompts import Prompts
+from research_agent.rag_pipeline import RAGPipeline
+from research_agent.search import AsyncSearcher, FakeSearchProvider
+
+PLANNING = "https://example.com/planning"
+
+def page(url: str, topic: str) -> dict:
+    sentences = [f"Analysts covered the {topic} dimension of the topic in report {n}." for n in range(8)]
+    return {"url": url, "content": sentences[0], "raw_content": " ".join(sentences)}
+
+class PagesProvider(FakeSearchProvider):
+    """Serves the page whose marker appears in the query (after its delay), else the planning page."""
+    def __init__(self, pages: dict, delays: dict = None):
+        super().__init__()
+        self.pages = pages
+        self.delays = delays or {}
+
+    async def search(self, query, num_results):
+        self.calls.append(query)
+        for marker, result in self.pages.items():
+            if marker in query:
+                await asyncio.sleep(self.delays.get(marker, 0.0))
+                return [result]
+        return [page(PLANNING, "market growth")]
+
+@pytest.fixture
+def make_agent(tmp_path):
+    made = []
+    def make(provider, **settings):
+        config = AgentConfig()
+        config.EMBEDDING_CACHE_DIR = str(tmp_path / "embeddings")
+        config.RUN_STORE_ENABLED = False
+        config.WARM_UP_MODELS = False
+        for name, value in settings.items(): setattr(config, name, value)
+        tools = FakeAITools(config, num_sections=2)
+        tools.searcher = AsyncSearcher(provider, config)
+        agent = ResearchAgent(config, tools, RAGPipeline(config, FakeModelRegistry()), Prompts())
+        researched = {}
+        research_section = agent._research_section
+        def record(detailed_topic, section, *args, **kwargs):
+            researched[section.title] = research_section(detailed_topic, section, *args, **kwargs)[1]
+            return detailed_topic, researched[section.title]
+        agent._research_section = record
+        made.append(tools)
+        return agent, researched
+    yield make
+    for tools in made: tools.searcher.close()
+
+def test_restricted_sections_keep_pages_the_planning_search_found(make_agent):
+    agent, researched = make_agent(PagesProvider({}), RESTRICT_RETRIEVAL_TO_SECTION_SOURCES=True)
+    list(agent.run("grid batteries", ""))
+    assert researched and all(chunks and {c['source'] for c in chunks} == {PLANNING} for chunks in researched.values())
+
+def test_later_sections_retrieve_what_earlier_sections_found(make_agent):
+    # Section 1's search is the slowest, yet section 2 still sees its page and never the other way round.
+    pages = {"Section 1": page("https://example.com/one", "growth"), "Section 2": page("https://example.com/two", "market")}
+    agent, researched = make_agent(PagesProvider(pages, {"Section 1": 0.3}))
+    list(agent.run("grid batteries", ""))
+    first, second = (researched[title] for title in sorted(researched))
+    assert "https://example.com/one" in {c['source'] for c in second}
+    assert "https://example.com/two" not in {c['source'] for c in first}
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from research_agent.verification import UNVERIFIED_MARKER, CitationVerifier, parse_verification_response, split_cited_sentences
+
+DRAFT = "Prices fell [Source 1]. Dr. Smith said growth was strong [Source 2][Source 3]. Uncited sentence here."
+SOURCES = {1: "Prices fell by a third.", 2: "Smith expects strong growth.", 3: "Growth was weak."}
+
+def scorer(scores):
+    """score_pairs stub: each claim gets the score of the first key it contains."""
+    def score_pairs(pairs):
+        return np.array([next(score for key, score in scores.items() if key in claim) for claim, _ in pairs], dtype=np.float32)
+    return score_pairs
+
+def test_abbreviations_do_not_split_sentences():
+    sentences = split_cited_sentences(DRAFT)
+    assert [(DRAFT[start:end], cited) for start, end, cited in sentences] == [
+        ("Prices fell [Source 1].", [1]), ("Dr. Smith said growth was strong [Source 2][Source 3].", [2, 3])]
+    text = "The U.S. Treasury agreed [Source 1]. Prices rose, e.g. 10% in J. Smith's data [Source 2].\n- A bullet [Source 3]"
+    assert [text[start:end] for start, end, _ in split_cited_sentences(text)] == [
+        "The U.S. Treasury agreed [Source 1].", "Prices rose, e.g. 10% in J. Smith's data [Source 2].", "- A bullet [Source 3]"]
+
+def test_a_citation_after_an_abbreviation_still_ends_the_sentence():
+    text = "Output grew in the U.S. [Source 1] Exports fell [Source 2]."
+    assert [cited for _, _, cited in split_cited_sentences(text)] == [[1], [2]]
+
+def test_flag_marks_unsupported_claims():
+    verifier = CitationVerifier(scorer({"Prices": 0.9, "Smith": 0.1}), support_threshold=0.7, reject_threshold=0.3)
+    checked, stats = verifier.verify(DRAFT, SOURCES)
+    assert checked == DRAFT.replace("[Source 3].", "[Source 3]." + UNVERIFIED_MARKER)
+    assert stats == {"checked": 2, "supported": 1, "escalated": 0, "corrected": 0, "unsupported": 1}
+
+def test_a_claim_takes_its_best_score_over_the_cited_sources():
+    def score_pairs(pairs):
+        return np.array([0.9 if "strong growth" in source else 0.1 for _, source in pairs], dtype=np.float32)
+    _, stats = CitationVerifier(score_pairs, support_threshold=0.7, reject_threshold=0.3).verify(DRAFT, SOURCES)
+    assert stats["supported"] == 1 and stats["unsupported"] == 1 # Source 1 has no match; Smith's claim is backed by Source 2
+
+def test_remove_drops_the_whole_unsupported_sentence():
+    verifier = CitationVerifier(scorer({"Prices": 0.9, "Smith": 0.1}), support_threshold=0.7, reject_threshold=0.3, action="remove")
+    checked, _ = verifier.verify(DRAFT, SOURCES)
+    assert checked == "Prices fell [Source 1]. Uncited sentence here."
+
+def test_uncertain_claims_are_escalated():
+    escalated = []
+    def escalate(sentence, context):
+        escalated.append((sentence, context))
+        return "Dr. Smith said growth was mixed."
+    verifier = CitationVerifier(scorer({"Prices": 0.5, "Smith": 0.4}), support_threshold=0.7, reject_threshold=0.3, escalate=escalate, max_escalations=1)
+    checked, stats = verifier.verify(DRAFT, SOURCES)
+    # Only the weakest uncertain claim is escalated; its correction keeps the original citations.
+    assert escalated == [("Dr. Smith said growth was strong [Source 2][Source 3].", f"Source [2]: {SOURCES[2]}\n\nSource [3]: {SOURCES[3]}")]
+    assert checked == f"Prices fell [Source 1].{UNVERIFIED_MARKER} Dr. Smith said growth was mixed [Source 2] [Source 3]. Uncited sentence here."
+    assert stats == {"checked": 2, "supported": 0, "escalated": 1, "corrected": 1, "unsupported": 1}
+
+def test_escalation_outcomes():
+    def escalate(sentence, context):
+        if "Prices" in sentence: return None
+        raise RuntimeError("LLM unavailable")
+    verifier = CitationVerifier(scorer({"Prices": 0.5, "Smith": 0.5}), support_threshold=0.7, reject_threshold=0.3, escalate=escalate)
+    checked, stats = verifier.verify(DRAFT, SOURCES)
+    assert checked == DRAFT.replace("[Source 3].", "[Source 3]." + UNVERIFIED_MARKER) # A failed check counts as unsupported
+    assert (stats["supported"], stats["unsupported"], stats["escalated"]) == (1, 1, 2)
+
+def test_claims_citing_unknown_sources_are_not_checked():
+    verifier = CitationVerifier(scorer({}), support_threshold=0.7, reject_threshold=0.3)
+    assert verifier.verify("Prices fell [Source 9].", SOURCES) == ("Prices fell [Source 9].", {"checked": 0, "supported": 0, "escalated": 0, "corrected": 0, "unsupported": 0})
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        CitationVerifier(scorer({}), 0.7, 0.3, action="delete")
+
+@pytest.mark.parametrize("response, expected", [
+    ("OK", None), (" ok. ", None), ("", None), ("**OK**", None),
+    ("Corrected sentence: Prices fell by a third [Source 1].", "Prices fell by a third [Source 1]."),
+    ("Verification Result: Prices rose.", "Prices rose."),
+    ("Prices rose.", "Prices rose."),
+])
+def test_parse_verification_response(response, expected):
+    assert parse_verification_response(response) == expected
+
+def test_parse_verification_response_raises_on_llm_errors():
+    with pytest.raises(RuntimeError):
+        parse_verification_response("[Error: LLM call failed. timeout]")